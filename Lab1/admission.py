@@ -0,0 +1,136 @@
+"""
+Admission control: caps the requests in flight per route class.
+
+Every request is classified as "reads" (GET/HEAD), "auth" (the login form)
+or "writes" (everything else). A class admits at most MAX_IN_FLIGHT requests
+at once. Further requests wait in a FIFO queue of at most MAX_QUEUE entries
+for up to ADMISSION_QUEUE_TIMEOUT seconds. A request that finds the queue
+full, or whose deadline passes while it waits, gets an immediate 503 with
+Retry-After instead of piling onto the database. Admitted requests then
+never wait longer than the deadline before they start, which keeps their
+latency bounded during a spike.
+
+A slot is held until the response body has been sent, so a streamed page
+counts as in flight until its last chunk. Limits are per process.
+"""
+import asyncio
+import math
+import os
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+import database
+
+ADMISSION_CONTROL = os.getenv("LAB1_ADMISSION_CONTROL", "1") == "1"
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("LAB1_ADMISSION_QUEUE_TIMEOUT", "1.0"))
+ADMISSION_RETRY_AFTER = int(os.getenv("LAB1_ADMISSION_RETRY_AFTER", str(math.ceil(ADMISSION_QUEUE_TIMEOUT))))
+# class -> (default max in flight, default max queue); LAB1_ADMISSION_<CLASS>_MAX_IN_FLIGHT
+# and LAB1_ADMISSION_<CLASS>_MAX_QUEUE override them. A read holds one pooled
+# connection at a time, so admitting more reads than the pool has connections
+# only moves the queue into the pool, where a wait blocks a worker thread.
+DEFAULT_LIMITS = {"reads": (database.READ_POOL_SIZE, 128), "writes": (8, 64), "auth": (4, 32)}
+AUTH_ROUTES = {("POST", "/")}
+# Monitoring must keep answering while the app sheds load.
+EXEMPT_PATHS = {"/admission/stats"}
+
+
+def route_class(method: str, path: str) -> str:
+    if (method, path) in AUTH_ROUTES:
+        return "auth"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    return "writes"
+
+
+class Gate:
+    """A counting semaphore with a bounded FIFO wait queue and counters."""
+
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters = deque()
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0,
+                      "max_queue_depth": 0}
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the deadline passed.
+            if not waiter.done() or waiter.cancelled():
+                self.stats["rejected_timeout"] += 1
+                return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.stats["admitted"] += 1
+        return True
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter that is still waiting.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, in_flight=self.in_flight, queue_depth=len(self._waiters),
+                    max_in_flight=self.max_in_flight, max_queue=self.max_queue)
+
+
+def _limit(route_class_name: str, setting: str, default: int) -> int:
+    return int(os.getenv(f"LAB1_ADMISSION_{route_class_name.upper()}_{setting}", str(default)))
+
+
+gates = {
+    name: Gate(_limit(name, "MAX_IN_FLIGHT", in_flight), _limit(name, "MAX_QUEUE", queue_size))
+    for name, (in_flight, queue_size) in DEFAULT_LIMITS.items()
+}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that runs each HTTP request through its class's Gate."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        gate = gates[route_class(scope["method"], scope["path"])]
+        if not await gate.acquire(ADMISSION_QUEUE_TIMEOUT):
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+
+def snapshot() -> dict:
+    return {name: gate.snapshot() for name, gate in gates.items()}
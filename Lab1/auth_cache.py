@@ -0,0 +1,67 @@
+"""
+In-process cache of authenticated principals for HTTP Basic auth.
+
+Entries are keyed by a digest of (username, password), so only credentials
+that already authenticated successfully can hit. Each entry holds a User
+detached from its session with its role loaded, and it expires after
+AUTH_CACHE_TTL seconds. crud.py drops entries when users or roles change.
+Other workers notice the change once their own entries expire.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+AUTH_CACHE_TTL = float(os.getenv("LAB1_AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("LAB1_AUTH_CACHE_SIZE", "1024"))
+
+_entries = OrderedDict()  # key -> (expires_at, user)
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def credentials_key(username: str, password: str) -> str:
+    return hashlib.sha256(f"{username}\0{password}".encode()).hexdigest()
+
+
+def get(key: str):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del _entries[key]
+            stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        stats["hits"] += 1
+        return entry[1]
+
+
+def put(key: str, user):
+    if AUTH_CACHE_TTL <= 0:
+        return
+    with _lock:
+        _entries[key] = (time.monotonic() + AUTH_CACHE_TTL, user)
+        _entries.move_to_end(key)
+        while len(_entries) > AUTH_CACHE_SIZE:
+            _entries.popitem(last=False)
+            stats["evictions"] += 1
+
+
+def invalidate_user(user_id: int):
+    with _lock:
+        for key in [key for key, (_, user) in _entries.items() if user.id == user_id]:
+            del _entries[key]
+            stats["invalidations"] += 1
+
+
+def clear():
+    with _lock:
+        stats["invalidations"] += len(_entries)
+        _entries.clear()
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(stats, size=len(_entries), ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE)
@@ -0,0 +1,112 @@
+"""
+Overload test for admission control. Starts uvicorn with admission control
+off and on, fires a burst of concurrent /items-lost requests at each, and
+prints how many were served and shed and the p50/p99 latency of the served
+ones. Usage: python bench_admission.py [concurrency] [requests] [rows]
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PORT = 8766
+BASE_URL = f"http://127.0.0.1:{PORT}"
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+# A client gives up after this long; such requests count as failed.
+CLIENT_TIMEOUT = 10.0
+
+
+def start_server(workdir, admission_control: bool):
+    env = dict(os.environ, PYTHONPATH=LAB_DIR, LAB1_ADMISSION_CONTROL="1" if admission_control else "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(BASE_URL + "/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def seed(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO lost_items (name, description) VALUES (?, ?)",
+        ((f"item {i}", f"lost near gate {i % 50}") for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def burst(concurrency, requests) -> tuple:
+    latencies, shed, failed = [], 0, 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=CLIENT_TIMEOUT) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal shed, failed
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get("/items-lost")
+                except httpx.HTTPError:
+                    # Client timeouts, and pages aborted mid-body by a pool timeout.
+                    failed += 1
+                    return
+                elapsed = time.perf_counter() - start
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            elif response.status_code == 503:
+                shed += 1
+            else:
+                failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        wall = time.perf_counter() - start
+    return latencies, shed, failed, wall
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    results = []
+    for admission_control in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_server(tmp, admission_control)
+            try:
+                seed(os.path.join(tmp, "test.db"), rows)
+                results.append((admission_control, *asyncio.run(burst(concurrency, requests))))
+            finally:
+                server.terminate()
+                try:
+                    server.wait(10)
+                except subprocess.TimeoutExpired:
+                    # An overloaded server may still be waiting on the pool.
+                    server.kill()
+                    server.wait()
+
+    print(f"\n{concurrency} concurrent clients, {requests} requests, {rows} rows")
+    print(f"{'admission':<10} {'served':>7} {'shed':>6} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8} {'wall s':>7}")
+    for admission_control, latencies, shed, failed, wall in results:
+        latencies.sort()
+        p50 = statistics.median(latencies) if latencies else 0.0
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+        print(f"{'on' if admission_control else 'off':<10} {len(latencies):>7} {shed:>6} {failed:>7} "
+              f"{p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {wall:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Uploads N found items (default 10k) through the form route, one POST
+/create-item per item, and through POST /api/items/batch in chunks, using the
+in-process test client against a scratch database.
+Usage: python bench_batch.py [items] [chunk_size]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ADMIN = ("bench_admin", "bench_password")
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    # main opens ./test.db at import time, so move to the scratch directory first.
+    os.chdir(tempfile.mkdtemp())
+    from fastapi.testclient import TestClient
+
+    import main
+
+    conn = sqlite3.connect("test.db")
+    conn.execute("INSERT INTO roles (id, name) VALUES (1, 'admin')")
+    conn.execute("INSERT INTO users (username, email, password, role_id) VALUES (?, 'bench@example.com', ?, 1)",
+                 ADMIN)
+    conn.commit()
+    conn.close()
+
+    payload = [{"name": f"item {i}", "description": f"found near gate {i % 50}"} for i in range(items)]
+    client = TestClient(main.app)
+
+    start = time.perf_counter()
+    for item in payload:
+        client.post("/create-item", data=item).raise_for_status()
+    form_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, items, chunk_size):
+        response = client.post("/api/items/batch", json={"create": payload[offset:offset + chunk_size]}, auth=ADMIN)
+        response.raise_for_status()
+    batch_seconds = time.perf_counter() - start
+
+    print(f"\n{items} items")
+    print(f"{'form POST per item':<28} {form_seconds:>8.2f}s {items / form_seconds:>10.0f} items/s")
+    print(f"{f'batch API, {chunk_size} per request':<28} {batch_seconds:>8.2f}s {items / batch_seconds:>10.0f} items/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Sustained item inserts per second from concurrent clients, committing each
+request on its own (crud.create_item in the threadpool, as the routes do)
+versus through the write_queue group commit. Runs against a scratch
+database in a temporary directory.
+Usage: python bench_group_commit.py [clients] [synchronous]
+(synchronous defaults to the profile's NORMAL; FULL fsyncs every commit.)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+import crud
+import database
+import schemas
+import write_queue
+
+DURATION_SECONDS = 5
+
+
+async def client(create, deadline: float, counts: list):
+    while time.perf_counter() < deadline:
+        await create()
+        counts[0] += 1
+
+
+async def measure(create, clients: int) -> float:
+    counts = [0]
+    deadline = time.perf_counter() + DURATION_SECONDS
+    await asyncio.gather(*(client(create, deadline, counts) for _ in range(clients)))
+    return counts[0] / DURATION_SECONDS
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    os.chdir(tempfile.mkdtemp())
+    if len(sys.argv) > 2:
+        database.SQLITE_PRAGMAS["synchronous"] = sys.argv[2]
+    database.init_db()
+    item = schemas.ItemCreate(name="bench item", description="written by bench_group_commit")
+
+    def create_direct():
+        db = database.SessionLocal()
+        try:
+            crud.create_item(db, item)
+        finally:
+            db.close()
+
+    async def create_per_request():
+        await run_in_threadpool(create_direct)
+
+    async def create_grouped():
+        await write_queue.create_item(item)
+
+    per_request = asyncio.run(measure(create_per_request, clients))
+    grouped = asyncio.run(measure(create_grouped, clients))
+    batches = write_queue.stats["batches"] or 1
+    print(f"\n{clients} clients, synchronous={database.SQLITE_PRAGMAS['synchronous']}, {DURATION_SECONDS}s each")
+    print(f"{'commit per request':<22} {per_request:>10.0f} writes/s")
+    print(f"{'group commit':<22} {grouped:>10.0f} writes/s "
+          f"({write_queue.stats['operations'] / batches:.1f} writes per batch)")
+
+
+if __name__ == "__main__":
+    main()
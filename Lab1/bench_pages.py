@@ -0,0 +1,101 @@
+"""
+Time-to-first-byte, total time and peak server RSS for /items-found and
+/items-lost at 1k and 100k rows. Each size gets a fresh uvicorn process in
+a scratch directory (the app opens ./test.db), so its peak RSS is not
+inflated by earlier runs. Usage: python bench_pages.py [rows ...]
+Peak RSS is read from /proc, so this is Linux-only.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+DEFAULT_SIZES = (1_000, 100_000)
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+ADMIN = ("bench_admin", "bench_password")
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_server(workdir):
+    env = dict(os.environ, PYTHONPATH=LAB_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(BASE_URL + "/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def seed(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT OR IGNORE INTO roles (id, name) VALUES (1, 'admin')")
+    conn.execute(
+        "INSERT OR IGNORE INTO users (username, email, password, role_id) VALUES (?, ?, ?, 1)",
+        (ADMIN[0], "bench@example.com", ADMIN[1]),
+    )
+    for table in ("items", "lost_items"):
+        conn.executemany(
+            f"INSERT INTO {table} (name, description) VALUES (?, ?)",
+            ((f"item {i}", f"found near gate {i % 50}") for i in range(rows)),
+        )
+    conn.commit()
+    conn.close()
+
+
+def memory_kb(pid, field):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(path):
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    with httpx.stream("GET", BASE_URL + path, auth=ADMIN, timeout=None) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+    return ttfb, time.perf_counter() - start, size
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_server(tmp)
+            try:
+                seed(os.path.join(tmp, "test.db"), rows)
+                for path in ("/items-found", "/items-lost"):
+                    baseline = memory_kb(server.pid, "VmRSS")
+                    ttfb, total, size = measure(path)
+                    peak = memory_kb(server.pid, "VmHWM")
+                    results.append((rows, path, ttfb, total, size, baseline, peak))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(f"\n{'rows':>8} {'page':<13} {'TTFB ms':>9} {'total ms':>9} {'body MB':>8} {'RSS MB':>7} {'peak MB':>8}")
+    for rows, path, ttfb, total, size, baseline, peak in results:
+        print(f"{rows:>8} {path:<13} {ttfb * 1000:>9.1f} {total * 1000:>9.1f} {size / 2 ** 20:>8.1f} "
+              f"{baseline / 1024:>7.1f} {peak / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Mixed read/write load against a scratch copy of the Lab1 schema, comparing
+the old bare engine ("default") with the WAL profile and reader/writer split
+from database.py ("tuned"). Several processes stand in for uvicorn workers.
+Each one runs several threads for DURATION_SECONDS, and every operation that
+fails with "database is locked" is counted.
+Usage: python bench_sqlite.py [processes] [threads] [write_ratio]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import database
+import models
+
+DURATION_SECONDS = 10
+SEED_ROWS = 10_000
+
+
+def make_sessions(profile, path):
+    if profile == "default":
+        bare = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=bare)
+        return session_factory, session_factory
+    return (sessionmaker(autocommit=False, autoflush=False, bind=database.create_reader_engine(path)),
+            sessionmaker(autocommit=False, autoflush=False, bind=database.create_writer_engine(path)))
+
+
+def client_thread(read_session, write_session, write_ratio, deadline, counters, lock):
+    reads = writes = locked = 0
+    while time.time() < deadline:
+        is_write = random.random() < write_ratio
+        db = write_session() if is_write else read_session()
+        try:
+            if is_write:
+                db.add(models.Item(name=f"bench {random.random()}", description="written by bench_sqlite"))
+                db.commit()
+                writes += 1
+            else:
+                item_id = random.randint(1, SEED_ROWS)
+                db.query(models.Item).filter(models.Item.id == item_id).first()
+                db.query(models.Item).offset(item_id).limit(20).all()
+                reads += 1
+        except OperationalError as e:
+            db.rollback()
+            if "locked" not in str(e):
+                raise
+            locked += 1
+        finally:
+            db.close()
+    with lock:
+        counters["reads"] += reads
+        counters["writes"] += writes
+        counters["locked"] += locked
+
+
+def worker_process(profile, path, threads, write_ratio, deadline, counters, lock):
+    read_session, write_session = make_sessions(profile, path)
+    pool = [threading.Thread(target=client_thread,
+                             args=(read_session, write_session, write_ratio, deadline, counters, lock))
+            for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def run(profile, processes, threads, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed_engine = create_engine(f"sqlite:///{path}")
+        database.Base.metadata.create_all(bind=seed_engine)
+        with seed_engine.begin() as connection:
+            connection.execute(models.Item.__table__.insert(),
+                               [{"name": f"item {i}", "description": "seed"} for i in range(SEED_ROWS)])
+        seed_engine.dispose()
+
+        manager = multiprocessing.Manager()
+        counters = manager.dict(reads=0, writes=0, locked=0)
+        lock = manager.Lock()
+        deadline = time.time() + DURATION_SECONDS
+        workers = [multiprocessing.Process(target=worker_process,
+                                           args=(profile, path, threads, write_ratio, deadline, counters, lock))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return dict(counters)
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    write_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    print(f"{processes} processes x {threads} threads, {write_ratio:.0%} writes, {DURATION_SECONDS}s per profile")
+    print(f"\n{'profile':<8} {'reads/s':>10} {'writes/s':>10} {'locked errors':>14}")
+    for profile in ("default", "tuned"):
+        counters = run(profile, processes, threads, write_ratio)
+        print(f"{profile:<8} {counters['reads'] / DURATION_SECONDS:>10.0f} "
+              f"{counters['writes'] / DURATION_SECONDS:>10.0f} {counters['locked']:>14}")
+
+
+if __name__ == "__main__":
+    main()
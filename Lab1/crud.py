@@ -1,20 +1,27 @@
 from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
 
+import auth_cache
 import models
 import schemas
+from single_flight import coalesced
 
 
 def create_item(db: Session, item: schemas.ItemCreate):
     db_item = models.Item(name=item.name, description=item.description)
     db.add(db_item)
     db.commit()
-    db.refresh(db_item)
     return schemas.Item.from_orm(db_item)
 
 def get_items(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Item).offset(skip).limit(limit).all()
 
+def stream_items(db: Session, batch_size: int = 1000):
+    """Every item as (id, name, description) rows, fetched batch_size rows at a time."""
+    return (db.query(models.Item.id, models.Item.name, models.Item.description)
+            .order_by(models.Item.id).yield_per(batch_size))
+
 def get_item(db: Session, item_id: int):
     db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if db_item is None:
@@ -28,7 +35,6 @@ def update_item(db: Session, item_id: int, item: schemas.ItemCreate):
         db_item.name = item.name
         db_item.description = item.description
         db.commit()
-        db.refresh(db_item)
     return db_item
 
 
@@ -43,12 +49,16 @@ def create_lost_item(db: Session, item: schemas.ItemCreate):
     db_lost_item = models.LostItem(name=item.name, description=item.description)
     db.add(db_lost_item)
     db.commit()
-    db.refresh(db_lost_item)
     return schemas.Item.from_orm(db_lost_item)
 
 def get_lost_items(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.LostItem).offset(skip).limit(limit).all()
 
+def stream_lost_items(db: Session, batch_size: int = 1000):
+    """Every lost item as (id, name, description) rows, fetched batch_size rows at a time."""
+    return (db.query(models.LostItem.id, models.LostItem.name, models.LostItem.description)
+            .order_by(models.LostItem.id).yield_per(batch_size))
+
 def get_lost_item(db: Session, item_id: int):
     db_item = db.query(models.LostItem).filter(models.LostItem.id == item_id).first()
     if db_item is None:
@@ -62,7 +72,6 @@ def update_lost_item(db: Session, item_id: int, item: schemas.ItemCreate):
         db_item.name = item.name
         db_item.description = item.description
         db.commit()
-        db.refresh(db_item)
     return db_item
 
 def delete_lost_item(db: Session, item_id: int):
@@ -73,11 +82,95 @@ def delete_lost_item(db: Session, item_id: int):
     return db_item
 
 
+def _update_returning(db: Session, model, item_id: int, item: schemas.ItemCreate):
+    row = db.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(name=item.name, description=item.description)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+def _delete_returning(db: Session, model, item_id: int):
+    row = db.execute(
+        delete(model)
+        .where(model.id == item_id)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+# Single-statement mutations: one UPDATE/DELETE ... RETURNING instead of
+# load, modify, commit and refresh. They return None for a missing id.
+def update_item_returning(db: Session, item_id: int, item: schemas.ItemCreate):
+    return _update_returning(db, models.Item, item_id, item)
+
+
+def delete_item_returning(db: Session, item_id: int):
+    return _delete_returning(db, models.Item, item_id)
+
+
+def update_lost_item_returning(db: Session, item_id: int, item: schemas.ItemCreate):
+    return _update_returning(db, models.LostItem, item_id, item)
+
+
+def delete_lost_item_returning(db: Session, item_id: int):
+    return _delete_returning(db, models.LostItem, item_id)
+
+
+def _apply_item_batch(db: Session, model, batch: schemas.ItemBatch) -> schemas.ItemBatchResult:
+    """
+    Applies creates, updates and deletes in one transaction: one multi-row
+    INSERT ... RETURNING, one SELECT plus an executemany UPDATE, and one
+    DELETE ... RETURNING. Updates and deletes of missing ids report False.
+    """
+    created = []
+    if batch.create:
+        created = db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            [item.model_dump() for item in batch.create],
+        ).all()
+
+    updated = []
+    if batch.update:
+        update_ids = [item.id for item in batch.update]
+        existing = set(db.scalars(select(model.id).where(model.id.in_(update_ids))))
+        rows = [item.model_dump() for item in batch.update if item.id in existing]
+        if rows:
+            db.execute(update(model), rows)
+        updated = [item_id in existing for item_id in update_ids]
+
+    deleted = []
+    if batch.delete:
+        removed = set(db.scalars(delete(model).where(model.id.in_(batch.delete)).returning(model.id)))
+        deleted = [item_id in removed for item_id in batch.delete]
+
+    db.commit()
+    return schemas.ItemBatchResult(created=created, updated=updated, deleted=deleted)
+
+
+def batch_items(db: Session, batch: schemas.ItemBatch) -> schemas.ItemBatchResult:
+    return _apply_item_batch(db, models.Item, batch)
+
+
+def batch_lost_items(db: Session, batch: schemas.ItemBatch) -> schemas.ItemBatchResult:
+    return _apply_item_batch(db, models.LostItem, batch)
+
+
+@coalesced
+def get_table_version(db: Session, table: str) -> int:
+    return db.query(models.TableVersion.version).filter(models.TableVersion.name == table).scalar() or 0
+
+
 def create_user(db: Session, user: schemas.UserCreate):
     db_user = models.User(username=user.username, email=user.email, role_id=user.role_id)
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
@@ -99,7 +192,7 @@ def update_user(db: Session, user_id: int, user: schemas.UserCreate):
         db_user.email = user.email
         db_user.role_id = user.role_id
         db.commit()
-        db.refresh(db_user)
+        auth_cache.invalidate_user(user_id)
     return db_user
 
 
@@ -108,6 +201,7 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        auth_cache.invalidate_user(user_id)
     return db_user
 
 
@@ -115,7 +209,6 @@ def create_role(db: Session, role: schemas.RoleCreate):
     db_role = models.Role(name=role.name)
     db.add(db_role)
     db.commit()
-    db.refresh(db_role)
     return db_role
 
 
@@ -135,7 +228,7 @@ def update_role(db: Session, role_id: int, role: schemas.RoleCreate):
     if db_role:
         db_role.name = role.name
         db.commit()
-        db.refresh(db_role)
+        auth_cache.clear()
     return db_role
 
 
@@ -144,6 +237,7 @@ def delete_role(db: Session, role_id: int):
     if db_role:
         db.delete(db_role)
         db.commit()
+        auth_cache.clear()
     return db_role
 
 
@@ -1,27 +1,146 @@
-from sqlalchemy import create_engine, text
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLITE_PATH = "./test.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+
+# Applied to every connection, reader or writer. WAL lets readers run
+# alongside the writer; synchronous=NORMAL is durable across application
+# crashes under WAL and only fsyncs at checkpoints.
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+READ_POOL_SIZE = int(os.getenv("LAB1_READ_POOL_SIZE", "8"))
+OPTIMIZE_INTERVAL = float(os.getenv("LAB1_SQLITE_OPTIMIZE_INTERVAL", "3600"))
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _configure_writer(dbapi_connection, connection_record):
+    _apply_pragmas(dbapi_connection, connection_record)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+    # Let SQLAlchemy's begin event issue BEGIN IMMEDIATE instead of pysqlite's
+    # deferred BEGIN, so a write transaction takes the lock up front (waiting
+    # up to busy_timeout) rather than failing when it upgrades from a read.
+    dbapi_connection.isolation_level = None
+
+
+def create_writer_engine(path: str = SQLITE_PATH):
+    """
+    Single-connection engine for all writes to the database at path. A
+    session holds the connection from its first statement until commit or
+    rollback, so requests do their reads and auth on the reader pool and use
+    a writer session only for the write transaction itself.
+    """
+    writer = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+    )
+    event.listen(writer, "connect", _configure_writer)
+    event.listen(writer, "begin", lambda connection: connection.exec_driver_sql("BEGIN IMMEDIATE"))
+    return writer
+
+
+def create_reader_engine(path: str = SQLITE_PATH, pool_size: int = READ_POOL_SIZE):
+    """Pool of read-only connections to the database at path."""
+    reader = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    event.listen(reader, "connect", _apply_pragmas)
+    return reader
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+engine = create_writer_engine()
+read_engine = create_reader_engine()
+# Objects stay loaded after commit: reading one back must not begin another
+# (IMMEDIATE) transaction that keeps the writer until the session closes.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
 
+def optimize():
+    """Lets SQLite refresh the planner statistics that have gone stale."""
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA optimize"))
+
+
+def start_optimizer(interval: float = OPTIMIZE_INTERVAL):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                optimize()
+            except Exception as e:
+                print(f"PRAGMA optimize failed: {e}")
+
+    if interval > 0:
+        threading.Thread(target=run, daemon=True).start()
+
+
+# Tables whose listings are served with version-based ETags.
+VERSIONED_TABLES = ("items", "lost_items")
+
+
+def create_table_versions(connection):
+    """
+    Seeds a table_versions row per versioned table and installs triggers that
+    bump it on every insert, update and delete, in the writing transaction.
+    Counters start at a random value so a recreated database does not reuse
+    ETags a client may still hold.
+    """
+    for table in VERSIONED_TABLES:
+        connection.execute(
+            text("INSERT OR IGNORE INTO table_versions (name, version) VALUES (:name, :version)"),
+            {"name": table, "version": random.getrandbits(30)},
+        )
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()} AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END"""))
+
+
 def init_db():
     print("Initializing the database...")
 
     try:
 
         from models import Item, User, Role
+        from search import create_fts
 
         Base.metadata.create_all(bind=engine)
 
-        with engine.connect() as connection:
+        with engine.begin() as connection:
+            create_fts(connection)
+            create_table_versions(connection)
             result = connection.execute(text("SELECT name FROM sqlite_master WHERE type='table';"))
             tables = result.fetchall()
             print("Tables in the database:", tables)
+            connection.execute(text("ANALYZE"))
 
         print("Database tables created successfully.")
     except Exception as e:
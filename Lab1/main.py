@@ -1,19 +1,29 @@
-from http.client import HTTPException
+from html import escape
+from typing import Optional
 
-from fastapi import FastAPI, Depends, Form, status
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, Form, HTTPException, Query, Request, Response, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import RedirectResponse
 
+import admission
+import auth_cache
 import crud
 import database
 import schemas
+import search
+import single_flight
+import write_queue
 from models import User
 
 app = FastAPI()
+if admission.ADMISSION_CONTROL:
+    app.add_middleware(admission.AdmissionMiddleware)
 security = HTTPBasic()
+optional_security = HTTPBasic(auto_error=False)
 database.init_db()
 
 
@@ -25,6 +35,21 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    db = database.ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def startup_event():
+    database.start_optimizer()
+    if write_queue.GROUP_COMMIT:
+        write_queue.start()
+
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 '''
@@ -61,7 +86,7 @@ async def login_page():
 
 
 @app.post("/", response_class=HTMLResponse)
-async def login(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+async def login(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.username == username).first()
 
     if user is None:
@@ -73,13 +98,22 @@ async def login(username: str = Form(...), password: str = Form(...), db: Sessio
         return RedirectResponse(url="/items-lost", status_code=303)
 
 
-def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)):
+def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_read_db)):
     if credentials is None:
         guest_user = User(username="guest", password="", role_id=2)
         return guest_user
+    return authenticate(credentials, db)
+
+
+def authenticate(credentials: HTTPBasicCredentials, db: Session) -> User:
+    cache_key = auth_cache.credentials_key(credentials.username, credentials.password)
+    cached_user = auth_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
 
     try:
-        user = db.query(User).filter(User.username == credentials.username).first()
+        user = (db.query(User).options(joinedload(User.role))
+                .filter(User.username == credentials.username).first())
     except:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -94,6 +128,12 @@ def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db:
             headers={"WWW-Authenticate": "Basic"},
         )
 
+    # Detach the user and its role so the cached copies are not expired by
+    # a later commit in this request's session.
+    if user.role is not None:
+        db.expunge(user.role)
+    db.expunge(user)
+    auth_cache.put(cache_key, user)
     return user
 
 
@@ -106,14 +146,27 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-@app.get("/items-found", response_class=HTMLResponse)
-async def items_found(db: Session = Depends(get_db), user: User = Depends(get_admin_user)):
-    if user.role.name != "admin":
-        raise HTTPException(status_code=403, detail="You do not have access to this resource")
+def get_search_user(scope: str = "lost", credentials: Optional[HTTPBasicCredentials] = Depends(optional_security),
+                    db: Session = Depends(get_read_db)) -> Optional[User]:
+    """
+    Lost items are public. Found items are admin-only, as on /items-found, so
+    scope=found needs an admin's credentials. Returns that admin, or None.
+    """
+    if scope != "found":
+        return None
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return get_admin_user(authenticate(credentials, db))
 
-    items = crud.get_items(db)
 
-    html_content = """
+# Rows rendered per chunk written to the response.
+STREAM_BATCH_SIZE = 1000
+
+FOUND_ITEMS_HEADER = """
     <html>
         <head><title>Found Items</title></head>
         <body>
@@ -121,26 +174,25 @@ async def items_found(db: Session = Depends(get_db), user: User = Depends(get_ad
             <ul>
     """
 
-    for item in items:
-        html_content += f"""
+FOUND_ITEM_ROW = """
             <li>
-                {item.id} -{item.name} - {item.description}
+                {id} -{name} - {description}
 
                 <!-- Update Form -->
-                <form action="/update-item/{item.id}" method="post" style="display:inline;">
+                <form action="/update-item/{id}" method="post" style="display:inline;">
                     <input type="text" name="new_name" placeholder="New Name" />
                     <input type="text" name="new_description" placeholder="New Description" />
                     <input type="submit" value="Update" />
                 </form>
 
                 <!-- Delete Form -->
-                <form action="/delete-item/{item.id}" method="post" style="display:inline;">
+                <form action="/delete-item/{id}" method="post" style="display:inline;">
                     <input type="submit" value="Delete" />
                 </form>
             </li>
-        """
+        """.format
 
-    html_content += """
+FOUND_ITEMS_FOOTER = """
             </ul>
             <h2>Create a New Item</h2>
             <form action="/create-item" method="post">
@@ -152,14 +204,7 @@ async def items_found(db: Session = Depends(get_db), user: User = Depends(get_ad
     </html>
     """
 
-    return HTMLResponse(content=html_content)
-
-
-@app.get("/items-lost", response_class=HTMLResponse)
-async def items_lost(db: Session = Depends(get_db)):
-    items = crud.get_lost_items(db)
-
-    html_content = """
+LOST_ITEMS_HEADER = """
     <html>
         <head><title>Lost Items</title></head>
         <body>
@@ -167,26 +212,25 @@ async def items_lost(db: Session = Depends(get_db)):
             <ul>
     """
 
-    for item in items:
-        html_content += f"""
+LOST_ITEM_ROW = """
             <li>
-                {item.name} - {item.description}
+                {name} - {description}
 
                 <!-- Update Form -->
-                <form action="/update-lost-item/{item.id}" method="post" style="display:inline;">
+                <form action="/update-lost-item/{id}" method="post" style="display:inline;">
                     <input type="text" name="new_name" placeholder="New Name" />
                     <input type="text" name="new_description" placeholder="New Description" />
                     <input type="submit" value="Update" />
                 </form>
 
                 <!-- Delete Form -->
-                <form action="/delete-lost-item/{item.id}" method="post" style="display:inline;">
+                <form action="/delete-lost-item/{id}" method="post" style="display:inline;">
                     <input type="submit" value="Delete" />
                 </form>
             </li>
-        """
+        """.format
 
-    html_content += """
+LOST_ITEMS_FOOTER = """
             </ul>
             <h2>Create a New Item</h2>
             <form action="/create-lost-item" method="post">
@@ -198,13 +242,139 @@ async def items_lost(db: Session = Depends(get_db)):
     </html>
     """
 
+
+def render_item_list(rows: list, header: str, row_template, footer: str):
+    """Yields the page in chunks of STREAM_BATCH_SIZE rows."""
+    yield header
+    for start in range(0, len(rows), STREAM_BATCH_SIZE):
+        yield "".join(
+            row_template(id=item_id, name=escape(str(name)), description=escape(str(description)))
+            for item_id, name, description in rows[start:start + STREAM_BATCH_SIZE]
+        )
+    yield footer
+
+
+@app.get("/auth-cache/stats")
+async def auth_cache_stats(user: User = Depends(get_admin_user)):
+    return auth_cache.snapshot()
+
+
+@app.get("/single-flight/stats")
+async def single_flight_stats(user: User = Depends(get_admin_user)):
+    return single_flight.snapshot()
+
+
+@app.get("/admission/stats")
+async def admission_stats(user: User = Depends(get_admin_user)):
+    return admission.snapshot()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def item_list_response(request: Request, db: Session, table: str, page: tuple, stream_rows):
+    """
+    304 when the client's ETag still names the table's current version,
+    otherwise the page. The version is read before the rows, so a concurrent
+    write can only make the ETag older than the page, never newer.
+
+    Concurrent requests for the same version share one read of the rows
+    (single_flight), so a burst of pollers after a write costs one table scan.
+    The rows are plain tuples, and the page is rendered from them after the
+    connection is back in the pool.
+    """
+    try:
+        version = crud.get_table_version(db, table)
+    finally:
+        # Never hold a connection while waiting for another request's read:
+        # the waiters could drain the read pool before the leader gets one.
+        db.close()
+    headers = {"ETag": f'"{table}-{version}"', "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        rows = single_flight.do(
+            (table, version), lambda: [tuple(row) for row in stream_rows(db, STREAM_BATCH_SIZE)])
+    finally:
+        db.close()
+    return StreamingResponse(render_item_list(rows, *page), media_type="text/html", headers=headers)
+
+
+@app.get("/items-found", response_class=HTMLResponse)
+def items_found(request: Request, db: Session = Depends(get_read_db), user: User = Depends(get_admin_user)):
+    if user.role.name != "admin":
+        raise HTTPException(status_code=403, detail="You do not have access to this resource")
+
+    return item_list_response(
+        request, db, "items", (FOUND_ITEMS_HEADER, FOUND_ITEM_ROW, FOUND_ITEMS_FOOTER), crud.stream_items)
+
+
+@app.get("/items-lost", response_class=HTMLResponse)
+def items_lost(request: Request, db: Session = Depends(get_read_db)):
+    return item_list_response(
+        request, db, "lost_items", (LOST_ITEMS_HEADER, LOST_ITEM_ROW, LOST_ITEMS_FOOTER), crud.stream_lost_items)
+
+
+SEARCH_SCOPES = {"lost": ("lost_items", "Lost Items"), "found": ("items", "Found Items")}
+
+SEARCH_RESULT_ROW = """
+            <li>{id} - {name}<br/><small>{snippet}</small></li>""".format
+
+
+@app.get("/search", response_class=HTMLResponse)
+def search_items(q: str = "", scope: str = "lost", limit: int = Query(20, ge=1, le=100),
+                 offset: int = Query(0, ge=0),
+                 user: Optional[User] = Depends(get_search_user),
+                 db: Session = Depends(get_read_db)):
+    if scope not in SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail="scope must be 'lost' or 'found'")
+    table, title = SEARCH_SCOPES[scope]
+
+    rows = search.search(db, table, q, limit, offset)
+    results = "".join(
+        SEARCH_RESULT_ROW(id=item_id, name=escape(str(name)), snippet=snippet)
+        for item_id, name, description, snippet in rows
+    )
+    html_content = f"""
+    <html>
+        <head><title>Search {title}</title></head>
+        <body>
+            <h1>Search {title}</h1>
+            <form action="/search" method="get">
+                <input type="text" name="q" value="{escape(q)}" placeholder="Search" />
+                <input type="hidden" name="scope" value="{scope}" />
+                <input type="submit" value="Search" />
+            </form>
+            <ul>{results}
+            </ul>
+        </body>
+    </html>
+    """
     return HTMLResponse(content=html_content)
 
 
+@app.post("/api/items/batch", response_model=schemas.ItemBatchResult)
+def batch_items(batch: schemas.ItemBatch, db: Session = Depends(get_db), user: User = Depends(get_admin_user)):
+    return crud.batch_items(db, batch)
+
+
+@app.post("/api/lost-items/batch", response_model=schemas.ItemBatchResult)
+def batch_lost_items(batch: schemas.ItemBatch, db: Session = Depends(get_db),
+                     user: User = Depends(get_current_user)):
+    return crud.batch_lost_items(db, batch)
+
+
 @app.post("/create-item")
 async def create_item(name: str = Form(...), description: str = Form(...), db: Session = Depends(get_db)):
     new_item = schemas.ItemCreate(name=name, description=description)
-    created_item = crud.create_item(db, new_item)
+    if write_queue.GROUP_COMMIT:
+        created_item = await write_queue.create_item(new_item)
+    else:
+        created_item = await run_in_threadpool(crud.create_item, db, new_item)
 
     return HTMLResponse(content="<h2>Item created successfully!</h2><a href='/items-found'>Back</a>")
 
@@ -212,20 +382,24 @@ async def create_item(name: str = Form(...), description: str = Form(...), db: S
 @app.post("/update-item/{item_id}")
 async def update_item(item_id: int, new_name: str = Form(...), new_description: str = Form(...),
                       db: Session = Depends(get_db)):
-    item = crud.get_item(db, item_id)
+    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
+    if write_queue.GROUP_COMMIT:
+        item = await write_queue.update_item(item_id, updated_item)
+    else:
+        item = await run_in_threadpool(crud.update_item_returning, db, item_id, updated_item)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
-    crud.update_item(db, item_id, updated_item)
-
     return HTMLResponse(content="<h2>Item updated successfully!</h2><a href='/items-found'>Back</a>")
 
 
 @app.post("/delete-item/{item_id}")
 async def delete_item(item_id: int, db: Session = Depends(get_db)):
-    item = crud.delete_item(db, item_id)
+    if write_queue.GROUP_COMMIT:
+        item = await write_queue.delete_item(item_id)
+    else:
+        item = await run_in_threadpool(crud.delete_item_returning, db, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -236,7 +410,10 @@ async def delete_item(item_id: int, db: Session = Depends(get_db)):
 @app.post("/create-lost-item")
 async def create_lost_item(name: str = Form(...), description: str = Form(...), db: Session = Depends(get_db)):
     new_item = schemas.ItemCreate(name=name, description=description)
-    created_item = crud.create_lost_item(db, new_item)
+    if write_queue.GROUP_COMMIT:
+        created_item = await write_queue.create_lost_item(new_item)
+    else:
+        created_item = await run_in_threadpool(crud.create_lost_item, db, new_item)
 
     return HTMLResponse(content="<h2>Item created successfully!</h2><a href='/items-lost'>Back</a>")
 
@@ -244,20 +421,24 @@ async def create_lost_item(name: str = Form(...), description: str = Form(...),
 @app.post("/update-lost-item/{item_id}")
 async def update_lost_item(item_id: int, new_name: str = Form(...), new_description: str = Form(...),
                            db: Session = Depends(get_db)):
-    item = crud.get_lost_item(db, item_id)
+    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
+    if write_queue.GROUP_COMMIT:
+        item = await write_queue.update_lost_item(item_id, updated_item)
+    else:
+        item = await run_in_threadpool(crud.update_lost_item_returning, db, item_id, updated_item)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
-    crud.update_lost_item(db, item_id, updated_item)
-
     return HTMLResponse(content="<h2>Item updated successfully!</h2><a href='/items-lost'>Back</a>")
 
 
 @app.post("/delete-lost-item/{item_id}")
 async def delete_lost_item(item_id: int, db: Session = Depends(get_db)):
-    item = crud.delete_item(db, item_id)
+    if write_queue.GROUP_COMMIT:
+        item = await write_queue.delete_lost_item(item_id)
+    else:
+        item = await run_in_threadpool(crud.delete_lost_item_returning, db, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
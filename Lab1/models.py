@@ -38,4 +38,12 @@ class LostItem(Base):
     description = Column(String, index=True)
 
 
+class TableVersion(Base):
+    """Change counter per table, bumped by database triggers on every write."""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 Role.users = relationship("User", back_populates="role")
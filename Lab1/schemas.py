@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 class RoleBase(BaseModel):
@@ -47,3 +49,20 @@ class Item(ItemBase):
 
     class Config:
         from_attributes = True
+
+
+class ItemUpdate(ItemBase):
+    id: int
+
+
+class ItemBatch(BaseModel):
+    create: List[ItemCreate] = []
+    update: List[ItemUpdate] = []
+    delete: List[int] = []
+
+
+class ItemBatchResult(BaseModel):
+    # One entry per request element, in request order.
+    created: List[int]
+    updated: List[bool]
+    deleted: List[bool]
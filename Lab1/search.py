@@ -0,0 +1,118 @@
+"""
+SQLite FTS5 search over found items (items) and lost items (lost_items).
+
+Each table gets an external-content FTS5 index (<table>_fts) that stores only
+the inverted index; the rows stay in the base table. Triggers keep the index
+in sync on insert, update and delete. create_fts() is idempotent and is run
+by database.init_db(); it rebuilds an index the first time it is created, so
+existing rows become searchable. `python search.py --rebuild` rebuilds both
+indexes from scratch, e.g. after rows were written with triggers disabled.
+"""
+import re
+import sys
+from html import escape
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from single_flight import coalesced
+
+SEARCHABLE_TABLES = ("items", "lost_items")
+# Name matches rank above description matches.
+NAME_WEIGHT = 4.0
+DESCRIPTION_WEIGHT = 1.0
+SNIPPET_TOKENS = 12
+# Control characters can't come from the tokenizer, so they are safe snippet
+# markers to swap for <mark> after HTML-escaping the snippet text.
+_MARK_START, _MARK_END = "\x02", "\x03"
+_TERM = re.compile(r"\w+")
+
+
+def _fts_statements(table: str) -> list:
+    fts = f"{table}_fts"
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            name, description, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END""",
+    ]
+
+
+def create_fts(connection):
+    for table in SEARCHABLE_TABLES:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": f"{table}_fts"},
+        ).first()
+        for statement in _fts_statements(table):
+            connection.execute(text(statement))
+        if not exists:
+            rebuild(connection, table)
+
+
+def rebuild(connection, table: str):
+    connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+    connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('optimize')"))
+
+
+def match_expression(query: str) -> str:
+    """
+    Turns free text into an FTS5 query: every word must match, each as a
+    prefix, and user input never reaches the FTS5 query syntax.
+    """
+    return " ".join(f'"{term}"*' for term in _TERM.findall(query))
+
+
+@coalesced
+def search(db: Session, table: str, query: str, limit: int = 20, offset: int = 0) -> list:
+    """(id, name, description, snippet_html) rows of table best matching query."""
+    if table not in SEARCHABLE_TABLES:
+        raise ValueError(f"'{table}' is not searchable")
+    expression = match_expression(query)
+    if not expression:
+        return []
+    fts = f"{table}_fts"
+    rows = db.execute(
+        text(f"""
+            SELECT {table}.id, {table}.name, {table}.description,
+                   snippet({fts}, -1, :start, :end, '...', :tokens)
+            FROM {fts} JOIN {table} ON {table}.id = {fts}.rowid
+            WHERE {fts} MATCH :expression
+            ORDER BY bm25({fts}, :name_weight, :description_weight)
+            LIMIT :limit OFFSET :offset
+        """),
+        {
+            "start": _MARK_START, "end": _MARK_END, "tokens": SNIPPET_TOKENS,
+            "expression": expression, "name_weight": NAME_WEIGHT, "description_weight": DESCRIPTION_WEIGHT,
+            "limit": limit, "offset": offset,
+        },
+    )
+    return [
+        (item_id, name, description,
+         escape(snippet or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+        for item_id, name, description, snippet in rows
+    ]
+
+
+if __name__ == "__main__":
+    import database
+
+    if "--rebuild" in sys.argv:
+        with database.engine.begin() as conn:
+            create_fts(conn)
+            for searchable_table in SEARCHABLE_TABLES:
+                rebuild(conn, searchable_table)
+                print(f"Rebuilt {searchable_table}_fts")
+    else:
+        print("Usage: python search.py --rebuild")
@@ -0,0 +1,59 @@
+"""
+Single-flight coalescing for read-only crud calls.
+
+Decorating a function `f(db, *args)` with @coalesced makes concurrent calls
+with the same arguments (ignoring the session) wait for one execution and
+share its result. A caller can get a result from a query that started
+shortly before it arrived, so only reads that return plain values are
+coalesced. ORM objects are never coalesced, because they belong to the
+leader's session.
+
+Callers must run in worker threads (plain def routes). A call made on the
+event loop blocks it, so no second caller can arrive while it runs.
+"""
+import functools
+import threading
+from concurrent.futures import Future
+
+_lock = threading.Lock()
+_in_flight = {}
+stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+
+def do(key, call):
+    """Runs call() once per key at a time; concurrent callers share its result."""
+    with _lock:
+        stats["calls"] += 1
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+            stats["executed"] += 1
+        else:
+            stats["coalesced"] += 1
+    if not leader:
+        return future.result()
+    try:
+        result = call()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _in_flight[key]
+    future.set_result(result)
+    return result
+
+
+def coalesced(func):
+    @functools.wraps(func)
+    def wrapper(db, *args, **kwargs):
+        key = (func.__module__, func.__name__, args, tuple(sorted(kwargs.items())))
+        return do(key, lambda: func(db, *args, **kwargs))
+
+    return wrapper
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(stats, in_flight=len(_in_flight))
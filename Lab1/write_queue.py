@@ -0,0 +1,180 @@
+"""
+Optional group-commit path for item mutations (LAB1_GROUP_COMMIT=1).
+
+Requests hand their create/update/delete to a single writer thread and await
+a future. The thread collects up to GROUP_COMMIT_MAX_BATCH operations, or
+whatever arrives within GROUP_COMMIT_DELAY_MS of the first one. It stages the
+whole batch, flushes it once and commits once, so N concurrent writes share
+one transaction and one sync. A future resolves only after its batch has
+committed. If the batch fails, it is replayed with one savepoint per
+operation, so only the failing requests get the error.
+
+An operation stages its change on the session and returns a callable that
+builds the result after the flush. The async functions at the bottom mirror
+crud.py's item mutations without the db argument. They return schemas rather
+than ORM objects because the batch session is closed by the time the caller
+sees the result.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import database
+import models
+import schemas
+
+GROUP_COMMIT = os.getenv("LAB1_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("LAB1_GROUP_COMMIT_MAX_BATCH", "128"))
+GROUP_COMMIT_DELAY_MS = float(os.getenv("LAB1_GROUP_COMMIT_DELAY_MS", "2"))
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+stats = {"batches": 0, "operations": 0, "replayed_batches": 0, "failed_batches": 0}
+
+
+def _next_batch(first) -> list:
+    batch = [first]
+    deadline = time.monotonic() + GROUP_COMMIT_DELAY_MS / 1000
+    while len(batch) < GROUP_COMMIT_MAX_BATCH:
+        try:
+            batch.append(_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _apply(db, batch: list, isolate: bool) -> list:
+    """
+    Stages every operation and returns (future, result, error) triples. With
+    isolate, each operation gets its own savepoint and flush so a failure is
+    confined to it; otherwise the batch is flushed once, which lets SQLAlchemy
+    send the INSERTs together.
+    """
+    results = []
+    if not isolate:
+        finishers = [(future, operation(db)) for operation, future in batch]
+        db.flush()
+        return [(future, finish(), None) for future, finish in finishers]
+    for operation, future in batch:
+        try:
+            with db.begin_nested():
+                finish = operation(db)
+                db.flush()
+            results.append((future, finish(), None))
+        except Exception as e:
+            results.append((future, None, e))
+    return results
+
+
+def _commit_batch(batch: list):
+    batch = [(operation, future) for operation, future in batch if future.set_running_or_notify_cancel()]
+    db = database.SessionLocal()
+    try:
+        try:
+            results = _apply(db, batch, isolate=False)
+            db.commit()
+        except Exception:
+            # Some operation failed; replay the batch one savepoint at a time
+            # so that only the failing requests see an error.
+            db.rollback()
+            stats["replayed_batches"] += 1
+            results = _apply(db, batch, isolate=True)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        stats["failed_batches"] += 1
+        for _, future in batch:
+            future.set_exception(e)
+        return
+    finally:
+        db.close()
+
+    stats["batches"] += 1
+    stats["operations"] += len(results)
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+
+def _run_writer():
+    while True:
+        _commit_batch(_next_batch(_queue.get()))
+
+
+def start():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run_writer, name="group-commit-writer", daemon=True)
+            _writer.start()
+
+
+async def submit(operation):
+    """Queues operation(db) for the next batch and waits until that batch commits."""
+    start()
+    future = Future()
+    _queue.put((operation, future))
+    return await asyncio.wrap_future(future)
+
+
+def _create(model, item: schemas.ItemCreate):
+    def operation(db):
+        db_item = model(name=item.name, description=item.description)
+        db.add(db_item)
+        return lambda: schemas.Item.from_orm(db_item)
+
+    return operation
+
+
+def _update(model, item_id: int, item: schemas.ItemCreate):
+    def operation(db):
+        db_item = db.query(model).filter(model.id == item_id).first()
+        if db_item is None:
+            return lambda: None
+        db_item.name = item.name
+        db_item.description = item.description
+        return lambda: schemas.Item.from_orm(db_item)
+
+    return operation
+
+
+def _delete(model, item_id: int):
+    def operation(db):
+        db_item = db.query(model).filter(model.id == item_id).first()
+        if db_item is None:
+            return lambda: None
+        deleted = schemas.Item.from_orm(db_item)
+        db.delete(db_item)
+        return lambda: deleted
+
+    return operation
+
+
+async def create_item(item: schemas.ItemCreate):
+    return await submit(_create(models.Item, item))
+
+
+async def update_item(item_id: int, item: schemas.ItemCreate):
+    return await submit(_update(models.Item, item_id, item))
+
+
+async def delete_item(item_id: int):
+    return await submit(_delete(models.Item, item_id))
+
+
+async def create_lost_item(item: schemas.ItemCreate):
+    return await submit(_create(models.LostItem, item))
+
+
+async def update_lost_item(item_id: int, item: schemas.ItemCreate):
+    return await submit(_update(models.LostItem, item_id, item))
+
+
+async def delete_lost_item(item_id: int):
+    return await submit(_delete(models.LostItem, item_id))
@@ -0,0 +1,298 @@
+"""
+Async mirror of crud.py for SQLAlchemy's AsyncSession on psycopg 3. Every
+function has the same name, arguments and return value as its crud.py
+counterpart but awaits the driver, so concurrent requests overlap their
+database I/O instead of blocking the event loop. Relationships that callers
+read (User.role) are loaded eagerly, as an AsyncSession cannot lazy-load.
+"""
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import matching
+import models
+import reference_cache
+import schemas
+import search
+import statements
+
+INTAKE_CHUNK_SIZE = 1000
+
+
+async def _first(db: AsyncSession, statement, **params):
+    return (await db.scalars(statement, params)).first()
+
+
+async def create_item(db: AsyncSession, item: schemas.ItemCreate):
+    db_item = models.Item(name=item.name, description=item.description)
+    db.add(db_item)
+    await db.commit()
+    await run_in_threadpool(matching.found_item_saved, db_item.id, db_item.name, db_item.description)
+    return schemas.Item.from_orm(db_item)
+
+
+async def get_items(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(statements.ITEMS_PAGE, {"skip": skip, "limit": limit})).all()
+
+
+async def get_item(db: AsyncSession, item_id: int):
+    db_item = await _first(db, statements.ITEM_BY_ID, id=item_id)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return db_item
+
+
+async def update_item(db: AsyncSession, item_id: int, item: schemas.ItemCreate):
+    db_item = await _first(db, statements.ITEM_BY_ID, id=item_id)
+    if db_item:
+        db_item.name = item.name
+        db_item.description = item.description
+        await db.commit()
+        await run_in_threadpool(matching.found_item_saved, db_item.id, db_item.name, db_item.description)
+    return db_item
+
+
+async def delete_item(db: AsyncSession, item_id: int):
+    db_item = await _first(db, statements.ITEM_BY_ID, id=item_id)
+    if db_item:
+        await db.delete(db_item)
+        await db.commit()
+        await run_in_threadpool(matching.found_item_deleted, item_id)
+    return db_item
+
+
+async def create_lost_item(db: AsyncSession, item: schemas.ItemCreate):
+    db_lost_item = models.LostItem(name=item.name, description=item.description)
+    db.add(db_lost_item)
+    await db.commit()
+    return schemas.Item.from_orm(db_lost_item)
+
+
+async def get_lost_items(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(statements.LOST_ITEMS_PAGE, {"skip": skip, "limit": limit})).all()
+
+
+async def get_lost_item(db: AsyncSession, item_id: int):
+    db_item = await _first(db, statements.LOST_ITEM_BY_ID, id=item_id)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return db_item
+
+
+async def update_lost_item(db: AsyncSession, item_id: int, item: schemas.ItemCreate):
+    db_item = await _first(db, statements.LOST_ITEM_BY_ID, id=item_id)
+    if db_item:
+        db_item.name = item.name
+        db_item.description = item.description
+        await db.commit()
+    return db_item
+
+
+async def delete_lost_item(db: AsyncSession, item_id: int):
+    db_item = await _first(db, statements.LOST_ITEM_BY_ID, id=item_id)
+    if db_item:
+        await db.delete(db_item)
+        await db.commit()
+    return db_item
+
+
+async def _update_returning(db: AsyncSession, model, item_id: int, item: schemas.ItemCreate):
+    row = (await db.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(name=item.name, description=item.description)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    )).first()
+    await db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+async def _delete_returning(db: AsyncSession, model, item_id: int):
+    row = (await db.execute(
+        delete(model)
+        .where(model.id == item_id)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    )).first()
+    await db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+async def update_item_returning(db: AsyncSession, item_id: int, item: schemas.ItemCreate):
+    updated = await _update_returning(db, models.Item, item_id, item)
+    if updated:
+        await run_in_threadpool(matching.found_item_saved, updated.id, updated.name, updated.description)
+    return updated
+
+
+async def delete_item_returning(db: AsyncSession, item_id: int):
+    deleted = await _delete_returning(db, models.Item, item_id)
+    if deleted:
+        await run_in_threadpool(matching.found_item_deleted, item_id)
+    return deleted
+
+
+async def update_lost_item_returning(db: AsyncSession, item_id: int, item: schemas.ItemCreate):
+    return await _update_returning(db, models.LostItem, item_id, item)
+
+
+async def delete_lost_item_returning(db: AsyncSession, item_id: int):
+    return await _delete_returning(db, models.LostItem, item_id)
+
+
+async def _create_many(db: AsyncSession, model, items: List[schemas.ItemCreate]) -> List[int]:
+    """
+    Inserts INTAKE_CHUNK_SIZE items per statement, each chunk passed as two
+    arrays and unnested server-side, and sends all the chunks through a libpq
+    pipeline: they go out back to back and the replies are read once the
+    pipeline syncs, so a large intake costs about one round trip. Everything
+    runs in the session's transaction; if a chunk fails, the error surfaces on
+    leaving the pipeline and nothing is committed.
+    """
+    if not items:
+        return []
+    connection = await db.connection()
+    pg_connection = (await connection.get_raw_connection()).driver_connection
+    # Rows are inserted in input order, so sorting a chunk's serial ids
+    # restores that order; RETURNING itself guarantees none.
+    statement = (
+        f"INSERT INTO {model.__tablename__} (name, description) "
+        "SELECT name, description FROM unnest(%s::text[], %s::text[]) "
+        "WITH ORDINALITY AS batch(name, description, position) ORDER BY position "
+        "RETURNING id"
+    )
+    async with pg_connection.pipeline():
+        cursors = []
+        for start in range(0, len(items), INTAKE_CHUNK_SIZE):
+            chunk = items[start:start + INTAKE_CHUNK_SIZE]
+            cursors.append(await pg_connection.execute(
+                statement, ([item.name for item in chunk], [item.description for item in chunk])
+            ))
+    ids = []
+    for cursor in cursors:
+        ids.extend(sorted(item_id for item_id, in await cursor.fetchall()))
+    await db.commit()
+    return ids
+
+
+async def create_items(db: AsyncSession, items: List[schemas.ItemCreate]) -> List[int]:
+    ids = await _create_many(db, models.Item, items)
+    await run_in_threadpool(
+        matching.found_items_saved, [(item_id, item.name, item.description) for item_id, item in zip(ids, items)]
+    )
+    return ids
+
+
+async def create_lost_items(db: AsyncSession, items: List[schemas.ItemCreate]) -> List[int]:
+    return await _create_many(db, models.LostItem, items)
+
+
+async def get_items_by_ids(db: AsyncSession, item_ids: List[int]):
+    items = {item.id: item for item in await db.scalars(select(models.Item).where(models.Item.id.in_(item_ids)))}
+    return [items[item_id] for item_id in item_ids if item_id in items]
+
+
+async def _search(db: AsyncSession, table: str, query: str, limit: int, offset: int) -> list:
+    if not query.strip():
+        return []
+    rows = await db.execute(search.search_statement(table), search.search_params(query, limit, offset))
+    return search.search_results(rows)
+
+
+async def search_items(db: AsyncSession, query: str, limit: int = 20, offset: int = 0) -> list:
+    return await _search(db, "items", query, limit, offset)
+
+
+async def search_lost_items(db: AsyncSession, query: str, limit: int = 20, offset: int = 0) -> list:
+    return await _search(db, "lost_items", query, limit, offset)
+
+
+async def get_table_version(db: AsyncSession, table: str) -> int:
+    version = await db.scalar(statements.TABLE_VERSION, {"name": table})
+    return version or 0
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    db_user = models.User(username=user.username, email=user.email, role_id=user.role_id)
+    db.add(db_user)
+    await db.commit()
+    reference_cache.invalidate("users")
+    await db.refresh(db_user, ["role"])
+    return db_user
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(statements.USERS_WITH_ROLE_PAGE, {"skip": skip, "limit": limit})).all()
+
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await _first(db, statements.USER_WITH_ROLE_BY_USERNAME, username=username)
+
+
+async def get_user(db: AsyncSession, user_id: int):
+    db_user = await _first(db, statements.USER_WITH_ROLE_BY_ID, id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
+
+async def update_user(db: AsyncSession, user_id: int, user: schemas.UserCreate):
+    db_user = await _first(db, statements.USER_BY_ID, id=user_id)
+    if db_user:
+        db_user.username = user.username
+        db_user.email = user.email
+        db_user.role_id = user.role_id
+        await db.commit()
+        reference_cache.invalidate("users")
+        await db.refresh(db_user, ["role"])
+    return db_user
+
+
+async def delete_user(db: AsyncSession, user_id: int):
+    db_user = await _first(db, statements.USER_BY_ID, id=user_id)
+    if db_user:
+        await db.delete(db_user)
+        await db.commit()
+        reference_cache.invalidate("users")
+    return db_user
+
+
+async def create_role(db: AsyncSession, role: schemas.RoleCreate):
+    db_role = models.Role(name=role.name)
+    db.add(db_role)
+    await db.commit()
+    reference_cache.invalidate("roles")
+    return db_role
+
+
+async def get_roles(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(statements.ROLES_PAGE, {"skip": skip, "limit": limit})).all()
+
+
+async def get_role(db: AsyncSession, role_id: int):
+    db_role = await _first(db, statements.ROLE_BY_ID, id=role_id)
+    if db_role is None:
+        raise HTTPException(status_code=404, detail="Role not found")
+    return db_role
+
+
+async def update_role(db: AsyncSession, role_id: int, role: schemas.RoleCreate):
+    db_role = await _first(db, statements.ROLE_BY_ID, id=role_id)
+    if db_role:
+        db_role.name = role.name
+        await db.commit()
+        reference_cache.invalidate("roles")
+    return db_role
+
+
+async def delete_role(db: AsyncSession, role_id: int):
+    db_role = await _first(db, statements.ROLE_BY_ID, id=role_id)
+    if db_role:
+        await db.delete(db_role)
+        await db.commit()
+        reference_cache.invalidate("roles")
+    return db_role
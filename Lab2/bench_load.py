@@ -0,0 +1,94 @@
+"""
+Load test for the Lab2 app. Start the server in the mode to measure, e.g.
+
+    LAB2_PG_DRIVER=sync  uvicorn main:app --port 8000
+    LAB2_PG_DRIVER=async uvicorn main:app --port 8000
+
+then run `python bench_load.py [base_url] [scenario]` against each and compare.
+Scenarios: "read" (GET /items-lost), "write" (POST /create-lost-item, one
+item per request) and "intake" (POST /api/lost-items/intake, INTAKE_BATCH
+items per request). The write scenarios leave their rows behind, so point
+the server at a scratch database. The intake endpoint needs a user:
+LAB2_BENCH_USER and LAB2_BENCH_PASSWORD give its credentials.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+CONCURRENCY_LEVELS = (1, 10, 100, 200)
+DURATION_SECONDS = 10
+INTAKE_BATCH = 100
+BENCH_AUTH = (os.getenv("LAB2_BENCH_USER", "admin"), os.getenv("LAB2_BENCH_PASSWORD", "admin"))
+
+
+def read_request(client: httpx.AsyncClient, base_url: str):
+    return client.get(base_url + "/items-lost")
+
+
+def write_request(client: httpx.AsyncClient, base_url: str):
+    return client.post(base_url + "/create-lost-item", data={"name": "bench item", "description": "bench_load"})
+
+
+def intake_request(client: httpx.AsyncClient, base_url: str):
+    items = [{"name": f"bench item {i}", "description": "bench_load"} for i in range(INTAKE_BATCH)]
+    return client.post(base_url + "/api/lost-items/intake", json=items, auth=BENCH_AUTH)
+
+
+# scenario -> (request factory, items written per request)
+SCENARIOS = {
+    "read": (read_request, 0),
+    "write": (write_request, 1),
+    "intake": (intake_request, INTAKE_BATCH),
+}
+
+
+async def worker(client: httpx.AsyncClient, request, base_url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await request(client, base_url)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_level(base_url: str, scenario: str, concurrency: int):
+    request, items_per_request = SCENARIOS[scenario]
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + DURATION_SECONDS
+        await asyncio.gather(
+            *(worker(client, request, base_url, deadline, latencies, errors) for _ in range(concurrency))
+        )
+
+    latencies.sort()
+    throughput = len(latencies) / DURATION_SECONDS
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    items = f"  items/s: {throughput * items_per_request:9.1f}" if items_per_request else ""
+    print(
+        f"clients: {concurrency:>3}  req/s: {throughput:8.1f}{items}  "
+        f"p50: {p50:7.2f} ms  p99: {p99:7.2f} ms  errors: {len(errors)}"
+    )
+
+
+async def main():
+    base_url = (sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8000").rstrip("/")
+    scenario = sys.argv[2] if len(sys.argv) > 2 else "read"
+    if scenario not in SCENARIOS:
+        sys.exit(f"Unknown scenario '{scenario}', expected one of {', '.join(SCENARIOS)}")
+    print(f"--- {scenario} against {base_url}, {DURATION_SECONDS}s per level ---")
+    for concurrency in CONCURRENCY_LEVELS:
+        await run_level(base_url, scenario, concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
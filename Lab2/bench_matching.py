@@ -0,0 +1,69 @@
+"""
+Microbenchmark for the matching index, without a database. Builds the index
+from synthetic found items and reports the build time, the matrix memory,
+the latency of adding one item, and the latency of scoring lost items one
+at a time and in batches.
+Usage: python bench_matching.py [found_items] [queries]
+"""
+import random
+import statistics
+import sys
+import time
+
+import matching
+
+OBJECTS = ["wallet", "umbrella", "phone", "backpack", "keys", "jacket", "laptop", "scarf", "glasses", "bottle",
+           "headphones", "charger", "notebook", "watch", "ring", "passport", "camera", "gloves", "hat", "badge"]
+ADJECTIVES = ["black", "red", "blue", "green", "leather", "small", "large", "old", "new", "silver",
+              "wool", "plastic", "striped", "grey", "white", "brown", "gold", "torn", "folding", "waterproof"]
+PLACES = ["cafeteria", "library", "gym", "parking lot", "lecture hall", "bus stop", "lobby", "lab", "park", "station"]
+BATCH_SIZES = (1, 16, 64)
+
+
+def random_item(rng: random.Random) -> tuple:
+    name = f"{rng.choice(ADJECTIVES)} {rng.choice(ADJECTIVES)} {rng.choice(OBJECTS)}"
+    # A few rare words per item, so document frequencies spread out as in real text.
+    rare = " ".join(f"w{rng.randrange(200000)}" for _ in range(3))
+    description = f"Found at the {rng.choice(PLACES)} near room {rng.randrange(500)}, {rare}"
+    return name, description
+
+
+def main():
+    found_items = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    rng = random.Random(42)
+    index = matching.FoundItemIndex()
+
+    start = time.perf_counter()
+    for first in range(0, found_items, matching.BUILD_BATCH_SIZE):
+        last = min(first + matching.BUILD_BATCH_SIZE, found_items)
+        index.add_many((item_id, *random_item(rng)) for item_id in range(first + 1, last + 1))
+    build = time.perf_counter() - start
+    nbytes = sum(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes for matrix, _, _ in index._blocks())
+    print(f"{found_items} found items: built in {build:.1f}s, {len(index._segments)} segments, "
+          f"{nbytes / 2 ** 20:.0f} MiB of matrix data")
+
+    adds = []
+    for item_id in range(found_items + 1, found_items + 1001):
+        name, description = random_item(rng)
+        start = time.perf_counter()
+        index.add(item_id, name, description)
+        adds.append(time.perf_counter() - start)
+    print(f"add one item: median {statistics.median(adds) * 1e6:.0f} us")
+
+    lost_items = [random_item(rng) for _ in range(queries)]
+    for batch_size in BATCH_SIZES:
+        timings = []
+        for first in range(0, queries, batch_size):
+            start = time.perf_counter()
+            index.top_matches(lost_items[first:first + batch_size], k=10)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        per_query = sum(timings) / queries
+        print(f"batch {batch_size:>3}: p50 {statistics.median(timings) * 1000:8.1f} ms per batch, "
+              f"p99 {timings[int(len(timings) * 0.99) - 1 if len(timings) > 1 else 0] * 1000:8.1f} ms, "
+              f"{per_query * 1000:6.2f} ms per lost item")
+
+
+if __name__ == "__main__":
+    main()
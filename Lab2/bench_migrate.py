@@ -0,0 +1,74 @@
+"""
+Compares the executemany loader (migrate_table) with the COPY loader
+(copy_table) on a generated SQLite table of N rows loaded into a scratch
+PostgreSQL table. Usage: python bench_migrate.py [rows ...]
+(defaults to 10k, 1M and 10M; executemany at 10M takes a long time).
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+from database import PG_USER, PG_PASSWORD, PG_HOST, PG_PORT, PG_DB_NAME
+from migrate import copy_table, migrate_table
+
+BENCH_TABLE = "bench_items"
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+
+
+def build_sqlite(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE {BENCH_TABLE} (id INTEGER PRIMARY KEY, name VARCHAR, description VARCHAR)")
+    conn.executemany(
+        f"INSERT INTO {BENCH_TABLE} VALUES (?, ?, ?)",
+        ((i, f"item {i}", f"found near gate {i % 50}\twith a\nnote") for i in range(1, rows + 1)),
+    )
+    conn.commit()
+    return conn
+
+
+def timed_load(loader, sqlite_conn, pg_conn, rows):
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+        start = time.perf_counter()
+        loader(sqlite_conn.cursor(), pg_cursor, BENCH_TABLE)
+        pg_conn.commit()
+        elapsed = time.perf_counter() - start
+        pg_cursor.execute(f"SELECT count(*) FROM {BENCH_TABLE}")
+        assert pg_cursor.fetchone()[0] == rows
+    return elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    pg_conn = psycopg2.connect(user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=PG_PORT, dbname=PG_DB_NAME)
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        pg_cursor.execute(f"CREATE TABLE {BENCH_TABLE} (id SERIAL PRIMARY KEY, name VARCHAR, description VARCHAR)")
+    pg_conn.commit()
+
+    results = []
+    try:
+        for rows in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                sqlite_conn = build_sqlite(os.path.join(tmp, "bench.db"), rows)
+                executemany_seconds = timed_load(migrate_table, sqlite_conn, pg_conn, rows)
+                copy_seconds = timed_load(copy_table, sqlite_conn, pg_conn, rows)
+                sqlite_conn.close()
+            results.append((rows, rows / executemany_seconds, rows / copy_seconds))
+    finally:
+        with pg_conn.cursor() as pg_cursor:
+            pg_cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        pg_conn.commit()
+        pg_conn.close()
+
+    print(f"\n{'rows':>12} {'executemany rows/s':>20} {'COPY rows/s':>14} {'speedup':>8}")
+    for rows, executemany_rate, copy_rate in results:
+        print(f"{rows:>12} {executemany_rate:>20.0f} {copy_rate:>14.0f} {copy_rate / executemany_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
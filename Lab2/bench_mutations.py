@@ -0,0 +1,88 @@
+"""
+Counts the SQL statements and time per item update/delete for the old
+load-modify-commit-refresh path and the single-statement RETURNING path,
+against the configured PostgreSQL database, and fails if a RETURNING
+mutation issues more than one statement. Every item it creates is deleted
+again. Usage: python bench_mutations.py [repetitions]
+"""
+import sys
+import time
+
+from sqlalchemy import event
+
+import crud
+import database
+import schemas
+
+# Transaction control is not a round trip we can remove.
+TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def old_update(db, item_id, item):
+    crud.get_item(db, item_id)
+    return crud.update_item(db, item_id, item)
+
+
+def old_update_lost(db, item_id, item):
+    crud.get_lost_item(db, item_id)
+    return crud.update_lost_item(db, item_id, item)
+
+
+# (label, create, old path, RETURNING path, cleanup after an update)
+PATHS = [
+    ("update item", crud.create_item, old_update, crud.update_item_returning, crud.delete_item_returning),
+    ("delete item", crud.create_item, crud.delete_item, crud.delete_item_returning, None),
+    ("update lost item", crud.create_lost_item, old_update_lost, crud.update_lost_item_returning,
+     crud.delete_lost_item_returning),
+    ("delete lost item", crud.create_lost_item, crud.delete_lost_item, crud.delete_lost_item_returning, None),
+]
+
+
+def measure(create, mutation, cleanup, repetitions: int, statements: list) -> tuple:
+    item = schemas.ItemCreate(name="bench item", description="written by bench_mutations")
+    elapsed = 0.0
+    counts = []
+    for _ in range(repetitions):
+        db = database.SessionLocal()
+        try:
+            item_id = create(db, item).id
+            statements.clear()
+            start = time.perf_counter()
+            if cleanup:
+                mutation(db, item_id, item)
+            else:
+                mutation(db, item_id)
+            elapsed += time.perf_counter() - start
+            counts.append(len(statements))
+            if cleanup:
+                cleanup(db, item_id)
+        finally:
+            db.close()
+    return max(counts), elapsed / repetitions
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    database.init_db()
+
+    statements = []
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(TRANSACTION_CONTROL):
+            statements.append(statement)
+
+    print(f"\n{'mutation':<18} {'old stmts':>10} {'old ms':>8} {'new stmts':>10} {'new ms':>8}")
+    failed = False
+    for label, create, old, new, cleanup in PATHS:
+        old_statements, old_seconds = measure(create, old, cleanup, repetitions, statements)
+        new_statements, new_seconds = measure(create, new, cleanup, repetitions, statements)
+        failed |= new_statements != 1
+        print(f"{label:<18} {old_statements:>10} {old_seconds * 1000:>8.3f} "
+              f"{new_statements:>10} {new_seconds * 1000:>8.3f}")
+    if failed:
+        sys.exit("A RETURNING mutation issued more than one statement")
+
+
+if __name__ == "__main__":
+    main()
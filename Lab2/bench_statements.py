@@ -0,0 +1,111 @@
+"""
+Per-call cost of the hot crud lookups against the configured PostgreSQL
+database, three ways:
+
+- "query": the old per-call db.query(...).filter(...) constructs
+- "prebuilt": the statements.py versions with server-side prepares off
+- "prepared": the same statements with prepares on (database.PREPARE_THRESHOLD)
+
+It prints the client CPU time and the wall time per call. The wall time
+includes the server's parse and plan work. Lookups whose table is empty are
+skipped. Usage: python bench_statements.py [calls]
+"""
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload, sessionmaker
+
+import crud
+import database
+import models
+
+
+def old_get_item(db, item_id):
+    return db.query(models.Item).filter(models.Item.id == item_id).first()
+
+
+def old_get_items(db, _):
+    return db.query(models.Item).offset(0).limit(100).all()
+
+
+def old_get_user(db, user_id):
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+
+def old_get_user_by_username(db, username):
+    return db.query(models.User).options(joinedload(models.User.role)).filter(models.User.username == username).first()
+
+
+def old_get_role(db, role_id):
+    return db.query(models.Role).filter(models.Role.id == role_id).first()
+
+
+def old_get_table_version(db, table):
+    return db.query(models.TableVersion.version).filter(models.TableVersion.name == table).scalar() or 0
+
+
+# (label, old function, crud function, how to pick an argument)
+LOOKUPS = [
+    ("get_item", old_get_item, crud.get_item, lambda db: db.query(models.Item.id).limit(1).scalar()),
+    ("get_items", old_get_items, lambda db, _: crud.get_items(db), lambda db: "first page"),
+    ("get_user", old_get_user, crud.get_user, lambda db: db.query(models.User.id).limit(1).scalar()),
+    ("get_user_by_username", old_get_user_by_username, crud.get_user_by_username,
+     lambda db: db.query(models.User.username).limit(1).scalar()),
+    ("get_role", old_get_role, crud.get_role, lambda db: db.query(models.Role.id).limit(1).scalar()),
+    ("get_table_version", old_get_table_version, crud.get_table_version, lambda db: "items"),
+]
+
+
+def measure(session_factory, function, argument, calls: int) -> tuple:
+    db = session_factory()
+    try:
+        # Warm up: fill SQLAlchemy's compiled cache and let psycopg prepare.
+        for _ in range(10):
+            function(db, argument)
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(calls):
+            function(db, argument)
+            # Drop the loaded objects, as a request's session would.
+            db.expunge_all()
+        return (time.process_time() - cpu) / calls, (time.perf_counter() - wall) / calls
+    finally:
+        db.close()
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Only psycopg 3 prepares; with another driver the "prepared" column would
+    # repeat "prebuilt".
+    can_prepare = bool(database.connect_args(database.SQLALCHEMY_DATABASE_URL))
+    # prepare_threshold=None turns psycopg's server-side prepares off.
+    no_prepares = {"prepare_threshold": None} if can_prepare else {}
+    unprepared = sessionmaker(
+        autoflush=False, bind=create_engine(database.SQLALCHEMY_DATABASE_URL, connect_args=no_prepares)
+    )
+    # (label, session factory or None if not applicable, whether to run the old query constructs)
+    ways = [("query", unprepared, True), ("prebuilt", unprepared, False),
+            ("prepared", database.SessionLocal if can_prepare else None, False)]
+
+    print(f"{calls} calls per lookup, microseconds per call (CPU / wall), "
+          f"driver {database.engine.dialect.driver}")
+    print(f"{'lookup':<22}" + "".join(f"{label:>20}" for label, _, _ in ways))
+    for label, old, new, pick in LOOKUPS:
+        db = database.SessionLocal()
+        argument = pick(db)
+        db.close()
+        if argument is None:
+            print(f"{label:<22} skipped: no rows")
+            continue
+        row = f"{label:<22}"
+        for _, session_factory, use_old in ways:
+            if session_factory is None:
+                row += f"{'n/a':>20}"
+                continue
+            cpu, wall = measure(session_factory, old if use_old else new, argument, calls)
+            row += f"{cpu * 1e6:>11.0f} /{wall * 1e6:>6.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
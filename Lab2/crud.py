@@ -1,8 +1,15 @@
+from typing import List
+
 from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 
+import matching
 import models
+import reference_cache
 import schemas
+import search
+import statements
 
 
 def create_item(db: Session, item: schemas.ItemCreate):
@@ -10,33 +17,36 @@ def create_item(db: Session, item: schemas.ItemCreate):
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    matching.found_item_saved(db_item.id, db_item.name, db_item.description)
     return schemas.Item.from_orm(db_item)
 
 def get_items(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Item).offset(skip).limit(limit).all()
+    return db.scalars(statements.ITEMS_PAGE, {"skip": skip, "limit": limit}).all()
 
 def get_item(db: Session, item_id: int):
-    db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
+    db_item = db.scalars(statements.ITEM_BY_ID, {"id": item_id}).first()
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_item
 
 
 def update_item(db: Session, item_id: int, item: schemas.ItemCreate):
-    db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
+    db_item = db.scalars(statements.ITEM_BY_ID, {"id": item_id}).first()
     if db_item:
         db_item.name = item.name
         db_item.description = item.description
         db.commit()
         db.refresh(db_item)
+        matching.found_item_saved(db_item.id, db_item.name, db_item.description)
     return db_item
 
 
 def delete_item(db: Session, item_id: int):
-    db_item = db.query(models.Item).filter(models.Item.id == item_id).first()
+    db_item = db.scalars(statements.ITEM_BY_ID, {"id": item_id}).first()
     if db_item:
         db.delete(db_item)
         db.commit()
+        matching.found_item_deleted(item_id)
     return db_item
 
 def create_lost_item(db: Session, item: schemas.ItemCreate):
@@ -47,17 +57,17 @@ def create_lost_item(db: Session, item: schemas.ItemCreate):
     return schemas.Item.from_orm(db_lost_item)
 
 def get_lost_items(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.LostItem).offset(skip).limit(limit).all()
+    return db.scalars(statements.LOST_ITEMS_PAGE, {"skip": skip, "limit": limit}).all()
 
 def get_lost_item(db: Session, item_id: int):
-    db_item = db.query(models.LostItem).filter(models.LostItem.id == item_id).first()
+    db_item = db.scalars(statements.LOST_ITEM_BY_ID, {"id": item_id}).first()
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_item
 
 
 def update_lost_item(db: Session, item_id: int, item: schemas.ItemCreate):
-    db_item = db.query(models.LostItem).filter(models.LostItem.id == item_id).first()
+    db_item = db.scalars(statements.LOST_ITEM_BY_ID, {"id": item_id}).first()
     if db_item:
         db_item.name = item.name
         db_item.description = item.description
@@ -66,48 +76,149 @@ def update_lost_item(db: Session, item_id: int, item: schemas.ItemCreate):
     return db_item
 
 def delete_lost_item(db: Session, item_id: int):
-    db_item = db.query(models.LostItem).filter(models.LostItem.id == item_id).first()
+    db_item = db.scalars(statements.LOST_ITEM_BY_ID, {"id": item_id}).first()
     if db_item:
         db.delete(db_item)
         db.commit()
     return db_item
 
 
+def _update_returning(db: Session, model, item_id: int, item: schemas.ItemCreate):
+    row = db.execute(
+        update(model)
+        .where(model.id == item_id)
+        .values(name=item.name, description=item.description)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+def _delete_returning(db: Session, model, item_id: int):
+    row = db.execute(
+        delete(model)
+        .where(model.id == item_id)
+        .returning(model.id, model.name, model.description)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return schemas.Item.model_validate(row._mapping) if row else None
+
+
+# Single-statement mutations: one UPDATE/DELETE ... RETURNING instead of
+# load, modify, commit and refresh. They return None for a missing id.
+def update_item_returning(db: Session, item_id: int, item: schemas.ItemCreate):
+    updated = _update_returning(db, models.Item, item_id, item)
+    if updated:
+        matching.found_item_saved(updated.id, updated.name, updated.description)
+    return updated
+
+
+def delete_item_returning(db: Session, item_id: int):
+    deleted = _delete_returning(db, models.Item, item_id)
+    if deleted:
+        matching.found_item_deleted(item_id)
+    return deleted
+
+
+def update_lost_item_returning(db: Session, item_id: int, item: schemas.ItemCreate):
+    return _update_returning(db, models.LostItem, item_id, item)
+
+
+def delete_lost_item_returning(db: Session, item_id: int):
+    return _delete_returning(db, models.LostItem, item_id)
+
+
+def _create_many(db: Session, model, items: List[schemas.ItemCreate]) -> List[int]:
+    if not items:
+        return []
+    ids = db.scalars(
+        insert(model).returning(model.id, sort_by_parameter_order=True),
+        [{"name": item.name, "description": item.description} for item in items],
+    ).all()
+    db.commit()
+    return list(ids)
+
+
+# Bulk intake: one transaction for all items; ids come back in input order.
+def create_items(db: Session, items: List[schemas.ItemCreate]) -> List[int]:
+    ids = _create_many(db, models.Item, items)
+    matching.found_items_saved((item_id, item.name, item.description) for item_id, item in zip(ids, items))
+    return ids
+
+
+def create_lost_items(db: Session, items: List[schemas.ItemCreate]) -> List[int]:
+    return _create_many(db, models.LostItem, items)
+
+
+# Found items in the order of item_ids, skipping ids that no longer exist.
+def get_items_by_ids(db: Session, item_ids: List[int]):
+    items = {item.id: item for item in db.query(models.Item).filter(models.Item.id.in_(item_ids))}
+    return [items[item_id] for item_id in item_ids if item_id in items]
+
+
+def _search(db: Session, table: str, query: str, limit: int, offset: int) -> list:
+    if not query.strip():
+        return []
+    return search.search_results(db.execute(search.search_statement(table), search.search_params(query, limit, offset)))
+
+
+# Ranked full-text and fuzzy name search; (id, name, description, snippet_html) rows.
+def search_items(db: Session, query: str, limit: int = 20, offset: int = 0) -> list:
+    return _search(db, "items", query, limit, offset)
+
+
+def search_lost_items(db: Session, query: str, limit: int = 20, offset: int = 0) -> list:
+    return _search(db, "lost_items", query, limit, offset)
+
+
+def get_table_version(db: Session, table: str) -> int:
+    return db.scalar(statements.TABLE_VERSION, {"name": table}) or 0
+
+
 def create_user(db: Session, user: schemas.UserCreate):
     db_user = models.User(username=user.username, email=user.email, role_id=user.role_id)
     db.add(db_user)
     db.commit()
+    reference_cache.invalidate("users")
     db.refresh(db_user)
     return db_user
 
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+    return db.scalars(statements.USERS_PAGE, {"skip": skip, "limit": limit}).all()
+
+
+def get_user_by_username(db: Session, username: str):
+    return db.scalars(statements.USER_WITH_ROLE_BY_USERNAME, {"username": username}).first()
 
 
 def get_user(db: Session, user_id: int):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.scalars(statements.USER_BY_ID, {"id": user_id}).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 
 def update_user(db: Session, user_id: int, user: schemas.UserCreate):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.scalars(statements.USER_BY_ID, {"id": user_id}).first()
     if db_user:
         db_user.username = user.username
         db_user.email = user.email
         db_user.role_id = user.role_id
         db.commit()
+        reference_cache.invalidate("users")
         db.refresh(db_user)
     return db_user
 
 
 def delete_user(db: Session, user_id: int):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = db.scalars(statements.USER_BY_ID, {"id": user_id}).first()
     if db_user:
         db.delete(db_user)
         db.commit()
+        reference_cache.invalidate("users")
     return db_user
 
 
@@ -115,35 +226,38 @@ def create_role(db: Session, role: schemas.RoleCreate):
     db_role = models.Role(name=role.name)
     db.add(db_role)
     db.commit()
+    reference_cache.invalidate("roles")
     db.refresh(db_role)
     return db_role
 
 
 def get_roles(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Role).offset(skip).limit(limit).all()
+    return db.scalars(statements.ROLES_PAGE, {"skip": skip, "limit": limit}).all()
 
 
 def get_role(db: Session, role_id: int):
-    db_role = db.query(models.Role).filter(models.Role.id == role_id).first()
+    db_role = db.scalars(statements.ROLE_BY_ID, {"id": role_id}).first()
     if db_role is None:
         raise HTTPException(status_code=404, detail="Role not found")
     return db_role
 
 
 def update_role(db: Session, role_id: int, role: schemas.RoleCreate):
-    db_role = db.query(models.Role).filter(models.Role.id == role_id).first()
+    db_role = db.scalars(statements.ROLE_BY_ID, {"id": role_id}).first()
     if db_role:
         db_role.name = role.name
         db.commit()
+        reference_cache.invalidate("roles")
         db.refresh(db_role)
     return db_role
 
 
 def delete_role(db: Session, role_id: int):
-    db_role = db.query(models.Role).filter(models.Role.id == role_id).first()
+    db_role = db.scalars(statements.ROLE_BY_ID, {"id": role_id}).first()
     if db_role:
         db.delete(db_role)
         db.commit()
+        reference_cache.invalidate("roles")
     return db_role
 
 
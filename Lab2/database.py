@@ -1,5 +1,8 @@
 # database.py
-from sqlalchemy import create_engine
+import os
+import random
+
+from sqlalchemy import create_engine, make_url, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # --- PostgreSQL Connection Parameters ---
@@ -10,22 +13,130 @@ PG_PORT = 5432 # This must be an integer, not a string
 PG_DB_NAME = "WEBPython"
 
 # Construct the URL using f-string for create_engine (or use connect_args)
-SQLALCHEMY_DATABASE_URL = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB_NAME}"
+# psycopg 3 for both engines, named explicitly: a bare postgresql:// means
+# psycopg2 before SQLAlchemy 2.1, and psycopg2 cannot prepare statements.
+SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB_NAME}"
+# psycopg 3 in asyncio mode; it also supports libpq pipeline mode.
+ASYNC_DATABASE_URL = f"postgresql+psycopg://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB_NAME}"
+
+# "sync" serves routes through blocking psycopg sessions run in the threadpool,
+# "async" through psycopg 3's asyncio driver so concurrent requests overlap their I/O.
+PG_DRIVER_MODE = os.getenv("LAB2_PG_DRIVER", "sync")
+# Per engine and per worker process: keep workers * (POOL_SIZE + MAX_OVERFLOW)
+# below the server's max_connections (100 by default).
+POOL_SIZE = int(os.getenv("LAB2_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("LAB2_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("LAB2_POOL_TIMEOUT", "10"))
+POOL_OPTIONS = {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW, "pool_timeout": POOL_TIMEOUT}
+# psycopg 3 prepares a query on the server once a connection has run its SQL
+# text this many times, then skips parsing and planning on later runs. Its
+# default is 5. The hot lookups in statements.py run thousands of times per
+# connection, so preparing on the second run costs nothing.
+PREPARE_THRESHOLD = int(os.getenv("LAB2_PREPARE_THRESHOLD", "1"))
+
+
+def connect_args(url: str) -> dict:
+    if make_url(url).get_dialect().driver == "psycopg":
+        return {"prepare_threshold": PREPARE_THRESHOLD}
+    return {}
+
 
 # SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args(SQLALCHEMY_DATABASE_URL), **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Set by connect_async(); only the "async" driver mode needs them.
+async_engine = None
+AsyncSessionLocal = None
+
 Base = declarative_base() # This is the single Base object all models use
 
+# Tables whose listings are served with version-based ETags.
+VERSIONED_TABLES = ("items", "lost_items")
+# Tables that NOTIFY NOTIFY_CHANNEL with their name on every change.
+NOTIFYING_TABLES = ("roles", "users")
+NOTIFY_CHANNEL = "lab2_reference_data"
+
+
+def create_table_versions(connection):
+    """
+    Seeds a table_versions row per versioned table and installs a statement-level
+    trigger that bumps it on every insert, update, delete and truncate, inside
+    the writing transaction. Counters start at a random value so a recreated
+    database does not reuse ETags a client may still hold.
+    """
+    connection.execute(text("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql"""))
+    for table in VERSIONED_TABLES:
+        connection.execute(
+            text("INSERT INTO table_versions (name, version) VALUES (:name, :version) ON CONFLICT (name) DO NOTHING"),
+            {"name": table, "version": random.getrandbits(30)},
+        )
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_version ON {table}"))
+        connection.execute(text(f"""
+            CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"""))
+
+
+def create_change_notifications(connection):
+    """
+    Installs statement-level triggers that NOTIFY NOTIFY_CHANNEL with the
+    table name on every insert, update, delete and truncate of a
+    NOTIFYING_TABLES table. PostgreSQL delivers the notification when the
+    writing transaction commits, once per table even if several statements
+    changed it, and never if it rolls back.
+    """
+    connection.execute(text(f"""
+        CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{NOTIFY_CHANNEL}', TG_TABLE_NAME);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql"""))
+    for table in NOTIFYING_TABLES:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_notify ON {table}"))
+        connection.execute(text(f"""
+            CREATE TRIGGER {table}_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()"""))
+
+
+def connect_async():
+    """Creates the asyncio engine and session factory."""
+    global async_engine, AsyncSessionLocal
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, connect_args=connect_args(ASYNC_DATABASE_URL), **POOL_OPTIONS
+    )
+    # Objects stay readable after commit, as routes render them afterwards
+    # and an expired attribute cannot be lazy-loaded outside the session.
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def close_async():
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 # You can keep your init_db function here if you use it for the main app
 def init_db():
     print("Initializing the database from database.py...")
     try:
         # Import models here if init_db is called independently
         from models import Item, User, Role, LostItem # Added LostItem
+        import search
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            create_table_versions(connection)
+            create_change_notifications(connection)
+        # Optional: without pg_trgm, search falls back to full text only.
+        search.create_trigram_search(engine)
         print("Database tables created successfully by database.py init_db.")
     except Exception as e:
         print(f"Error creating tables in database.py init_db: {e}")
\ No newline at end of file
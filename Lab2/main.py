@@ -1,21 +1,59 @@
-from fastapi import FastAPI, Depends, Form, status, HTTPException # Added HTTPException here
+import os
+from html import escape
+from typing import List, Optional, Union
+from urllib.parse import urlencode
+
+from fastapi import FastAPI, Depends, Form, Query, Request, Response, status, HTTPException # Added HTTPException here
 from fastapi.responses import HTMLResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import RedirectResponse
 
+import async_crud
 import crud
 import database
+import matching
+import reference_cache
 import schemas
 from models import User
 
 app = FastAPI()
 security = HTTPBasic()
+optional_security = HTTPBasic(auto_error=False)
 database.init_db()
 
+AnySession = Union[Session, AsyncSession]
+
+
+def _call_and_release(func, db: Session, *args, **kwargs):
+    # A request that kept its connection while waiting for its next thread
+    # could deadlock with requests holding every thread while waiting for a
+    # connection. Objects the call returned stay readable once detached.
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+class ThreadpoolCrud:
+    """
+    Exposes the synchronous crud module as coroutines run in the threadpool.
+    Each call is its own unit of work and hands its connection back when done.
+    """
 
-def get_db():
+    def __getattr__(self, name):
+        func = getattr(crud, name)
+
+        async def call(db: Session, *args, **kwargs):
+            return await run_in_threadpool(_call_and_release, func, db, *args, **kwargs)
+
+        return call
+
+
+def get_sync_db():
     db = database.SessionLocal()
     try:
         yield db
@@ -23,6 +61,36 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+
+if database.PG_DRIVER_MODE == "async":
+    crud_layer = async_crud
+    get_db = get_async_db
+else:
+    crud_layer = ThreadpoolCrud()
+    get_db = get_sync_db
+
+# Users and roles come from a process-local cache kept fresh by LISTEN/NOTIFY.
+crud_layer = reference_cache.CachingCrud(crud_layer)
+
+
+@app.on_event("startup")
+async def startup_event():
+    if database.PG_DRIVER_MODE == "async":
+        database.connect_async()
+    matching.start(database.SessionLocal)
+    reference_cache.start()
+    print(f"Serving PostgreSQL through the {database.PG_DRIVER_MODE} driver.")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await database.close_async()
+
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 '''
@@ -59,8 +127,8 @@ async def login_page():
 
 
 @app.post("/", response_class=HTMLResponse)
-async def login(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
+async def login(username: str = Form(...), password: str = Form(...), db: AnySession = Depends(get_db)):
+    user = await crud_layer.get_user_by_username(db, username)
 
     if user is None:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -71,13 +139,13 @@ async def login(username: str = Form(...), password: str = Form(...), db: Sessio
         return RedirectResponse(url="/items-lost", status_code=303)
 
 
-def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPBasicCredentials = Depends(security), db: AnySession = Depends(get_db)):
     if credentials is None:
         guest_user = User(username="guest", password="", role_id=2)
         return guest_user
 
     try:
-        user = db.query(User).filter(User.username == credentials.username).first()
+        user = await crud_layer.get_user_by_username(db, credentials.username)
     except:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -104,12 +172,38 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
+@app.get("/reference-cache/stats")
+async def reference_cache_stats(user: User = Depends(get_admin_user)):
+    return reference_cache.snapshot()
+
+
+async def table_etag(db: AnySession, table: str) -> str:
+    return f'"{table}-{await crud_layer.get_table_version(db, table)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
 @app.get("/items-found", response_class=HTMLResponse)
-async def items_found(db: Session = Depends(get_db), user: User = Depends(get_admin_user)):
+async def items_found(request: Request, db: AnySession = Depends(get_db), user: User = Depends(get_admin_user)):
     if user.role.name != "admin":
         raise HTTPException(status_code=403, detail="You do not have access to this resource")
 
-    items = crud.get_items(db)
+    # Read the version before the rows: a concurrent write can then only make
+    # the ETag older than the page, which costs a re-fetch, never a stale 304.
+    etag = await table_etag(db, "items")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+    items = await crud_layer.get_items(db)
 
     html_content = """
     <html>
@@ -150,12 +244,16 @@ async def items_found(db: Session = Depends(get_db), user: User = Depends(get_ad
     </html>
     """
 
-    return HTMLResponse(content=html_content)
+    return HTMLResponse(content=html_content, headers=etag_headers(etag))
 
 
 @app.get("/items-lost", response_class=HTMLResponse)
-async def items_lost(db: Session = Depends(get_db)):
-    items = crud.get_lost_items(db)
+async def items_lost(request: Request, db: AnySession = Depends(get_db)):
+    etag = await table_etag(db, "lost_items")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+    items = await crud_layer.get_lost_items(db)
 
     html_content = """
     <html>
@@ -169,6 +267,7 @@ async def items_lost(db: Session = Depends(get_db)):
         html_content += f"""
             <li>
                 {item.name} - {item.description}
+                <a href="/items-lost/{item.id}/matches">Matches</a>
 
                 <!-- Update Form -->
                 <form action="/update-lost-item/{item.id}" method="post" style="display:inline;">
@@ -196,34 +295,158 @@ async def items_lost(db: Session = Depends(get_db)):
     </html>
     """
 
+    return HTMLResponse(content=html_content, headers=etag_headers(etag))
+
+
+MATCH_RESULT_ROW = """
+            <li>{id} - {name} - {description} <small>({score:.0%} match)</small></li>""".format
+
+
+@app.get("/items-lost/{item_id}/matches", response_class=HTMLResponse)
+async def lost_item_matches(item_id: int, limit: int = Query(10, ge=1, le=100), db: AnySession = Depends(get_db),
+                            user: User = Depends(get_admin_user)):
+    # Admin-only: the candidates are found items.
+    if not matching.index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The matching index is still being built",
+            headers={"Retry-After": str(int(matching.MATCH_REFRESH_SECONDS))},
+        )
+    lost_item = await crud_layer.get_lost_item(db, item_id)
+    matches, = await run_in_threadpool(
+        matching.index.top_matches, [(lost_item.name, lost_item.description)], limit
+    )
+    scores = dict(matches)
+    found_items = await crud_layer.get_items_by_ids(db, list(scores))
+    results = "".join(
+        MATCH_RESULT_ROW(id=item.id, name=escape(str(item.name)), description=escape(str(item.description)),
+                         score=scores[item.id])
+        for item in found_items
+    )
+    html_content = f"""
+    <html>
+        <head><title>Matches</title></head>
+        <body>
+            <h1>Found items matching "{escape(str(lost_item.name))}"</h1>
+            <p>{escape(str(lost_item.description))}</p>
+            <ul>{results or "<li>No matches yet.</li>"}
+            </ul>
+            <a href='/items-lost'>Back</a>
+        </body>
+    </html>
+    """
+    return HTMLResponse(content=html_content)
+
+
+SEARCH_SCOPES = {"lost": ("search_lost_items", "Lost Items"), "found": ("search_items", "Found Items")}
+
+SEARCH_RESULT_ROW = """
+            <li>{id} - {name}<br/><small>{snippet}</small></li>""".format
+
+
+def search_page_link(q: str, scope: str, limit: int, offset: int, label: str) -> str:
+    query = urlencode({"q": q, "scope": scope, "limit": limit, "offset": offset})
+    return f"<a href='/search?{escape(query)}'>{label}</a>"
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_items(q: str = "", scope: str = "lost", limit: int = Query(20, ge=1, le=100),
+                       offset: int = Query(0, ge=0),
+                       credentials: Optional[HTTPBasicCredentials] = Depends(optional_security),
+                       db: AnySession = Depends(get_db)):
+    if scope not in SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail="scope must be 'lost' or 'found'")
+    search_function, title = SEARCH_SCOPES[scope]
+    if scope == "found":
+        # Found items are admin-only, as on /items-found.
+        if credentials is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid credentials",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        get_admin_user(await get_current_user(credentials, db))
+
+    # One extra row tells whether there is a next page.
+    rows = await getattr(crud_layer, search_function)(db, q, limit + 1, offset)
+    results = "".join(
+        SEARCH_RESULT_ROW(id=item_id, name=escape(str(name)), snippet=snippet)
+        for item_id, name, description, snippet in rows[:limit]
+    )
+    links = []
+    if offset > 0:
+        links.append(search_page_link(q, scope, limit, max(offset - limit, 0), "&laquo; Previous"))
+    if len(rows) > limit:
+        links.append(search_page_link(q, scope, limit, offset + limit, "Next &raquo;"))
+    html_content = f"""
+    <html>
+        <head><title>Search {title}</title></head>
+        <body>
+            <h1>Search {title}</h1>
+            <form action="/search" method="get">
+                <input type="text" name="q" value="{escape(q)}" placeholder="Search" />
+                <input type="hidden" name="scope" value="{scope}" />
+                <input type="submit" value="Search" />
+            </form>
+            <ul>{results}
+            </ul>
+            <p>{" | ".join(links)}</p>
+        </body>
+    </html>
+    """
     return HTMLResponse(content=html_content)
 
 
+# Items per intake request; larger loads are split by the client.
+INTAKE_MAX_ITEMS = int(os.getenv("LAB2_INTAKE_MAX_ITEMS", "10000"))
+
+
+def check_intake_size(items: List[schemas.ItemCreate]):
+    if len(items) > INTAKE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {INTAKE_MAX_ITEMS} items per request",
+        )
+
+
+# Found items are admin-only, as on /items-found; any user may report lost items.
+@app.post("/api/items/intake", response_model=List[int])
+async def intake_items(items: List[schemas.ItemCreate], db: AnySession = Depends(get_db),
+                       user: User = Depends(get_admin_user)):
+    check_intake_size(items)
+    return await crud_layer.create_items(db, items)
+
+
+@app.post("/api/lost-items/intake", response_model=List[int])
+async def intake_lost_items(items: List[schemas.ItemCreate], db: AnySession = Depends(get_db),
+                            user: User = Depends(get_current_user)):
+    check_intake_size(items)
+    return await crud_layer.create_lost_items(db, items)
+
+
 @app.post("/create-item")
-async def create_item(name: str = Form(...), description: str = Form(...), db: Session = Depends(get_db)):
+async def create_item(name: str = Form(...), description: str = Form(...), db: AnySession = Depends(get_db)):
     new_item = schemas.ItemCreate(name=name, description=description)
-    created_item = crud.create_item(db, new_item)
+    created_item = await crud_layer.create_item(db, new_item)
 
     return HTMLResponse(content="<h2>Item created successfully!</h2><a href='/items-found'>Back</a>")
 
 
 @app.post("/update-item/{item_id}")
 async def update_item(item_id: int, new_name: str = Form(...), new_description: str = Form(...),
-                      db: Session = Depends(get_db)):
-    item = crud.get_item(db, item_id)
+                      db: AnySession = Depends(get_db)):
+    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
+    item = await crud_layer.update_item_returning(db, item_id, updated_item)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
-    crud.update_item(db, item_id, updated_item)
-
     return HTMLResponse(content="<h2>Item updated successfully!</h2><a href='/items-found'>Back</a>")
 
 
 @app.post("/delete-item/{item_id}")
-async def delete_item(item_id: int, db: Session = Depends(get_db)):
-    item = crud.delete_item(db, item_id)
+async def delete_item(item_id: int, db: AnySession = Depends(get_db)):
+    item = await crud_layer.delete_item_returning(db, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -232,30 +455,28 @@ async def delete_item(item_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/create-lost-item")
-async def create_lost_item(name: str = Form(...), description: str = Form(...), db: Session = Depends(get_db)):
+async def create_lost_item(name: str = Form(...), description: str = Form(...), db: AnySession = Depends(get_db)):
     new_item = schemas.ItemCreate(name=name, description=description)
-    created_item = crud.create_lost_item(db, new_item)
+    created_item = await crud_layer.create_lost_item(db, new_item)
 
     return HTMLResponse(content="<h2>Item created successfully!</h2><a href='/items-lost'>Back</a>")
 
 
 @app.post("/update-lost-item/{item_id}")
 async def update_lost_item(item_id: int, new_name: str = Form(...), new_description: str = Form(...),
-                           db: Session = Depends(get_db)):
-    item = crud.get_lost_item(db, item_id)
+                           db: AnySession = Depends(get_db)):
+    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
+    item = await crud_layer.update_lost_item_returning(db, item_id, updated_item)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    updated_item = schemas.ItemCreate(name=new_name, description=new_description)
-    crud.update_lost_item(db, item_id, updated_item)
-
     return HTMLResponse(content="<h2>Item updated successfully!</h2><a href='/items-lost'>Back</a>")
 
 
 @app.post("/delete-lost-item/{item_id}")
-async def delete_lost_item(item_id: int, db: Session = Depends(get_db)):
-    item = crud.delete_lost_item(db, item_id)
+async def delete_lost_item(item_id: int, db: AnySession = Depends(get_db)):
+    item = await crud_layer.delete_lost_item_returning(db, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
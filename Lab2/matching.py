@@ -0,0 +1,307 @@
+"""
+Lost-to-found matching: ranks found items (items) by text similarity to a
+lost item.
+
+Each item's name and description become a sparse vector of hashed features:
+word unigrams from both fields plus character trigrams of the name words,
+which tolerate typos ("wallet" vs "walet"). Name features weigh more.
+Vectors are sublinear term frequencies scaled to unit length. Queries weight
+their features by IDF and are scaled to unit length too, so a score is a
+cosine in [0, 1] that favours rare shared terms.
+
+The found items live in CSC matrix segments. Scoring a batch of lost items
+slices the query columns out of each segment and multiplies them by the
+sparse query block, so the cost follows how many found items share a query
+feature, not the total count. Each query keeps only its rarest features, up
+to QUERY_POSTINGS_BUDGET items' worth, which bounds that cost for queries
+made of common words. New and changed items go to an open block of
+rows. The block is sealed into a segment every SEGMENT_ROWS rows, and
+segments are merged as they grow, so there are only about log2(n /
+SEGMENT_ROWS) of them. A change or delete marks the old row dead. A merge
+drops the dead rows. Until then they still count towards document
+frequencies. Merging the largest segments takes about a second at a million
+items and holds the index lock meanwhile. That happens each time the index
+doubles in size.
+
+The index is per process. start() builds it from the database in a
+background thread and then polls every MATCH_REFRESH_SECONDS for items it
+lacks. That poll also picks up items created by other workers. It reads
+from MATCH_RESCAN_WINDOW ids below the highest id any scan has returned.
+Ids are drawn at insert but become visible at commit, so a lower id can
+show up after a higher one. crud.py reports this process's creates,
+updates and deletes straight away. They do not move the scan's watermark,
+because other workers may still commit lower ids. Updates and deletes
+made by other workers are only seen after a restart. Callers re-read the
+candidates from the database, so a deleted item is never shown.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+
+import models
+
+N_FEATURES = 2 ** 20
+NAME_WEIGHT = 2.0
+SEGMENT_ROWS = 10000
+QUERY_POSTINGS_BUDGET = 250000
+BUILD_BATCH_SIZE = 10000
+MATCH_REFRESH_SECONDS = float(os.getenv("LAB2_MATCH_REFRESH_SECONDS", "5"))
+MATCH_RESCAN_WINDOW = int(os.getenv("LAB2_MATCH_RESCAN_WINDOW", "1000"))
+_WORD = re.compile(r"\w+")
+
+
+def _feature(token: str) -> int:
+    # crc32 rather than hash(): string hashes are salted per process.
+    return zlib.crc32(token.encode()) & (N_FEATURES - 1)
+
+
+def vectorize(name, description) -> tuple:
+    """(sorted feature indices, unit-length float32 values) for one item."""
+    weights = {}
+    for word in _WORD.findall((name or "").lower()):
+        padded = f"<{word}>"
+        for token in [f"w:{word}"] + [f"t:{padded[i:i + 3]}" for i in range(len(padded) - 2)]:
+            feature = _feature(token)
+            weights[feature] = weights.get(feature, 0.0) + NAME_WEIGHT
+    for word in _WORD.findall((description or "").lower()):
+        feature = _feature(f"w:{word}")
+        weights[feature] = weights.get(feature, 0.0) + 1.0
+    if not weights:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    indices = np.fromiter(sorted(weights), dtype=np.int32, count=len(weights))
+    values = np.log1p(np.fromiter((weights[i] for i in indices), dtype=np.float32, count=len(indices)))
+    return indices, values / np.linalg.norm(values)
+
+
+def _csr(rows: list) -> sparse.csr_matrix:
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(indices) for indices, _ in rows], out=indptr[1:])
+    indices = np.concatenate([indices for indices, _ in rows]) if rows else np.empty(0, dtype=np.int32)
+    values = np.concatenate([values for _, values in rows]) if rows else np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((values, indices, indptr), shape=(len(rows), N_FEATURES))
+
+
+class _Segment:
+    def __init__(self, matrix: sparse.csc_matrix, ids: np.ndarray):
+        self.matrix = matrix
+        self.ids = ids
+        self.live = np.ones(len(ids), dtype=bool)
+
+
+class FoundItemIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segments = []
+        self._open_rows = []
+        self._open_ids = []
+        self._open_live = []
+        self._open_matrix = None
+        # item id -> (segment number, row); segment None is the open block.
+        self._row_of = {}
+        self._document_frequency = np.zeros(N_FEATURES, dtype=np.int32)
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def add(self, item_id: int, name, description, replace: bool = True):
+        with self._lock:
+            self._add(item_id, vectorize(name, description), replace)
+
+    def add_many(self, rows, replace: bool = True):
+        """Adds (item_id, name, description) rows."""
+        if not replace:
+            # Skip vectorizing rows that are already in; _add checks again.
+            rows = [row for row in rows if row[0] not in self._row_of]
+        vectors = [(item_id, vectorize(name, description)) for item_id, name, description in rows]
+        with self._lock:
+            for item_id, vector in vectors:
+                self._add(item_id, vector, replace)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._remove(item_id)
+
+    def _add(self, item_id: int, vector: tuple, replace: bool):
+        if item_id in self._row_of:
+            if not replace:
+                return
+            self._remove(item_id)
+        self._row_of[item_id] = (None, len(self._open_ids))
+        self._open_rows.append(vector)
+        self._open_ids.append(item_id)
+        self._open_live.append(True)
+        self._open_matrix = None
+        self._document_frequency[vector[0]] += 1
+        if len(self._open_ids) >= SEGMENT_ROWS:
+            self._seal()
+
+    def _remove(self, item_id: int):
+        location = self._row_of.pop(item_id, None)
+        if location is None:
+            return
+        segment, row = location
+        if segment is None:
+            self._open_live[row] = False
+            self._open_matrix = None
+        else:
+            self._segments[segment].live[row] = False
+
+    def _seal(self):
+        segment = _Segment(_csr(self._open_rows).tocsc(), np.array(self._open_ids, dtype=np.int64))
+        segment.live[:] = self._open_live
+        self._segments.append(segment)
+        self._open_rows, self._open_ids, self._open_live, self._open_matrix = [], [], [], None
+        # Merge like a binary counter: a segment at least as large as the one
+        # before it is merged into it. That keeps O(log n) segments, and each
+        # row is copied O(log n) times over the life of the index.
+        while len(self._segments) > 1 and len(self._segments[-1].ids) >= len(self._segments[-2].ids):
+            self._segments[-2:] = [self._merge(*self._segments[-2:])]
+        number = len(self._segments) - 1
+        segment = self._segments[-1]
+        rows = np.flatnonzero(segment.live)
+        self._row_of.update(zip(segment.ids[rows].tolist(), ((number, row) for row in rows.tolist())))
+
+    def _merge(self, first: _Segment, second: _Segment) -> _Segment:
+        """One segment holding the live rows of both."""
+        before = np.diff(first.matrix.indptr) + np.diff(second.matrix.indptr)
+        matrix = sparse.vstack(
+            [first.matrix.tocsr()[first.live], second.matrix.tocsr()[second.live]], format="csr"
+        ).tocsc()
+        # The dropped dead rows stop counting towards document frequencies.
+        self._document_frequency -= (before - np.diff(matrix.indptr)).astype(np.int32)
+        return _Segment(matrix, np.concatenate([first.ids[first.live], second.ids[second.live]]))
+
+    def _blocks(self):
+        for segment in self._segments:
+            yield segment.matrix, segment.ids, segment.live
+        if self._open_ids:
+            if self._open_matrix is None:
+                self._open_matrix = _csr(self._open_rows).tocsc()
+            yield self._open_matrix, np.array(self._open_ids, dtype=np.int64), np.array(self._open_live)
+
+    def top_matches(self, queries: list, k: int = 10) -> list:
+        """
+        For each (name, description) query, up to k (item_id, score) pairs
+        with a positive score, best first. All queries are scored together.
+        """
+        vectors = [vectorize(name, description) for name, description in queries]
+        with self._lock:
+            size = len(self._row_of)
+            rows, columns, values = [], [], []
+            for query, (indices, tf) in enumerate(vectors):
+                frequency = self._document_frequency[indices]
+                weighted = tf * (np.log((size + 1) / (frequency + 1)) + 1)
+                norm = np.linalg.norm(weighted)
+                # A feature costs a multiply per item that has it, and the
+                # common ones add little to a score. Keep the rarest features
+                # within QUERY_POSTINGS_BUDGET, but always at least one. The
+                # dropped ones still count towards the norm.
+                order = np.argsort(frequency, kind="stable")
+                kept = order[:max(1, np.searchsorted(np.cumsum(frequency[order]), QUERY_POSTINGS_BUDGET, "right"))]
+                if norm:
+                    rows.append(indices[kept])
+                    columns.append(np.full(len(kept), query))
+                    values.append(weighted[kept] / norm)
+            if not rows:
+                return [[] for _ in queries]
+            rows, columns = np.concatenate(rows), np.concatenate(columns)
+            features = np.unique(rows)
+            weights = sparse.csc_matrix(
+                (np.concatenate(values).astype(np.float32), (np.searchsorted(features, rows), columns)),
+                shape=(len(features), len(vectors)),
+            )
+            candidates = [[] for _ in queries]
+            for matrix, ids, live in self._blocks():
+                # Sparse times sparse: only items sharing a feature with a
+                # query get a score, so this scales with the matches.
+                scores = sparse.csc_matrix(matrix[:, features] @ weights)
+                for query in range(len(vectors)):
+                    start, end = scores.indptr[query], scores.indptr[query + 1]
+                    hits, score = scores.indices[start:end], scores.data[start:end]
+                    alive = live[hits]
+                    hits, score = hits[alive], score[alive]
+                    if len(hits) > k:
+                        top = np.argpartition(score, -k)[-k:]
+                        hits, score = hits[top], score[top]
+                    candidates[query].extend(zip(ids[hits].tolist(), score.tolist()))
+        return [sorted(found, key=lambda match: -match[1])[:k] for found in candidates]
+
+
+index = FoundItemIndex()
+_started = False
+_start_lock = threading.Lock()
+
+
+def found_item_saved(item_id: int, name, description):
+    index.add(item_id, name, description)
+
+
+def found_items_saved(rows):
+    index.add_many(rows)
+
+
+def found_item_deleted(item_id: int):
+    index.remove(item_id)
+
+
+def _load_after(session_factory, item_id: int) -> tuple:
+    """
+    Adds found items with ids above item_id that the index lacks. Returns
+    (rows read, highest id read).
+    """
+    loaded, highest = 0, item_id
+    db = session_factory()
+    try:
+        rows = db.execute(
+            select(models.Item.id, models.Item.name, models.Item.description)
+            .where(models.Item.id > item_id)
+            .order_by(models.Item.id)
+            .execution_options(yield_per=BUILD_BATCH_SIZE)
+        )
+        for batch in rows.partitions():
+            # Rows from this snapshot must not overwrite a change crud.py
+            # reported while the snapshot was being read.
+            index.add_many(batch, replace=False)
+            loaded += len(batch)
+            highest = batch[-1][0]
+    finally:
+        db.close()
+    return loaded, highest
+
+
+def _run(session_factory):
+    start = time.perf_counter()
+    while True:
+        try:
+            # A retry keeps what an earlier attempt loaded (replace=False).
+            loaded, watermark = _load_after(session_factory, 0)
+            break
+        except Exception as e:
+            print(f"Matching index build failed, retrying in {MATCH_REFRESH_SECONDS:g}s: {e}")
+            time.sleep(MATCH_REFRESH_SECONDS)
+    index.ready = True
+    print(f"Matching index built: {loaded} found items in {time.perf_counter() - start:.1f}s")
+    while True:
+        time.sleep(MATCH_REFRESH_SECONDS)
+        try:
+            _, highest = _load_after(session_factory, max(watermark - MATCH_RESCAN_WINDOW, 0))
+            watermark = max(watermark, highest)
+        except Exception as e:
+            print(f"Matching index refresh failed: {e}")
+
+
+def start(session_factory):
+    """Builds the index in a daemon thread, then keeps polling for new items."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_run, args=(session_factory,), daemon=True, name="matching-index").start()
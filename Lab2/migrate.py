@@ -1,4 +1,19 @@
+"""
+Copies test.db (SQLite) into the PostgreSQL database from database.py.
+
+Usage: python migrate.py [--parallel]
+
+By default every table is copied in one transaction, so a failure leaves
+PostgreSQL as it was. --parallel commits roles first and then copies users,
+items and lost_items concurrently, each in its own transaction. It only
+starts when those four tables are empty in PostgreSQL, and if any copy
+fails it truncates them again, so the run can simply be repeated.
+"""
+import io
 import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import psycopg2
 
@@ -18,9 +33,12 @@ except ImportError as e:
     exit(1)
 
 SQLITE_DB_PATH = "test.db"
+# Rows buffered in memory per COPY ... FROM STDIN.
+COPY_CHUNK_SIZE = 50000
+MIGRATED_TABLES = ("roles", "users", "items", "lost_items")
 
 
-def migrate_data():
+def migrate_data(parallel: bool = False):
     sqlite_conn = None
     sqlite_cursor = None
     pg_conn = None
@@ -69,12 +87,34 @@ def migrate_data():
         sqlite_conn = sqlite3.connect(SQLITE_DB_PATH)
         sqlite_cursor = sqlite_conn.cursor()
 
-        migrate_table(sqlite_cursor, pg_cursor, "roles")
-        migrate_table(sqlite_cursor, pg_cursor, "users")
-        migrate_table(sqlite_cursor, pg_cursor, "items")
-        migrate_table(sqlite_cursor, pg_cursor, "lost_items")
-
-        pg_conn.commit()
+        if parallel:
+            # The tables are committed separately, so a failure can only be
+            # undone by emptying them; refuse to start unless they are empty.
+            loaded = non_empty_tables(pg_cursor)
+            if loaded:
+                raise Exception(
+                    f"--parallel needs empty target tables, but {', '.join(loaded)} already have rows in PostgreSQL")
+            try:
+                # users references roles, so roles are committed before the rest
+                # start; users, items and lost_items are then independent.
+                copy_table(sqlite_cursor, pg_cursor, "roles")
+                reset_sequence(pg_cursor, "roles")
+                pg_conn.commit()
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    futures = [executor.submit(copy_table_worker, table) for table in ("users", "items", "lost_items")]
+                    for future in futures:
+                        future.result()
+            except Exception:
+                pg_conn.rollback()
+                print("\nA parallel copy failed; emptying the target tables so the migration can be rerun.")
+                pg_cursor.execute(f"TRUNCATE {', '.join(MIGRATED_TABLES)} RESTART IDENTITY")
+                pg_conn.commit()
+                raise
+        else:
+            for table_name in MIGRATED_TABLES:
+                copy_table(sqlite_cursor, pg_cursor, table_name)
+                reset_sequence(pg_cursor, table_name)
+            pg_conn.commit()
         print("\nData migration completed successfully!")
 
     except (sqlite3.Error, psycopg2.Error) as e:
@@ -95,7 +135,100 @@ def migrate_data():
             pg_conn.close()
 
 
+def _copy_text(value) -> str:
+    """Formats one value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def copy_table(sqlite_cursor, pg_cursor, table_name, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Streams a SQLite table into PostgreSQL with COPY ... FROM STDIN, one
+    in-memory buffer of `chunk_size` rows at a time.
+    """
+    print(f"  Copying table: {table_name}")
+
+    sqlite_cursor.execute(f"PRAGMA table_info({table_name})")
+    columns_info = sqlite_cursor.fetchall()
+
+    if not columns_info:
+        print(
+            f"    Warning: No column info found for table '{table_name}' in SQLite. Skipping migration for this table.")
+        return 0
+
+    quoted_columns = [f'"{col[1]}"' for col in columns_info]
+    copy_query = f"COPY {table_name} ({', '.join(quoted_columns)}) FROM STDIN"
+
+    sqlite_cursor.execute(f"SELECT {', '.join(quoted_columns)} FROM {table_name}")
+    total = 0
+    start = time.perf_counter()
+    while True:
+        rows = sqlite_cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        buffer = io.StringIO()
+        buffer.writelines("\t".join(map(_copy_text, row)) + "\n" for row in rows)
+        buffer.seek(0)
+        pg_cursor.copy_expert(copy_query, buffer)
+        total += len(rows)
+
+    elapsed = time.perf_counter() - start
+    if total:
+        print(f"    Copied {total} rows to {table_name} ({total / elapsed:.0f} rows/sec)")
+    else:
+        print(f"    No data to migrate for {table_name}")
+    return total
+
+
+def non_empty_tables(pg_cursor) -> list:
+    """The MIGRATED_TABLES that already hold rows in PostgreSQL."""
+    loaded = []
+    for table_name in MIGRATED_TABLES:
+        pg_cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})")
+        if pg_cursor.fetchone()[0]:
+            loaded.append(table_name)
+    return loaded
+
+
+def reset_sequence(pg_cursor, table_name):
+    """
+    Points the table's id sequence past the copied ids; explicit ids in COPY
+    do not advance it, so the next INSERT would otherwise collide.
+    """
+    pg_cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+        f"FROM {table_name}",
+        (table_name,),
+    )
+
+
+def copy_table_worker(table_name):
+    """Copies one table on its own SQLite and PostgreSQL connections and commits it."""
+    sqlite_conn = sqlite3.connect(SQLITE_DB_PATH)
+    pg_conn = psycopg2.connect(
+        user=PG_USER,
+        password=PG_PASSWORD,
+        host=PG_HOST,
+        port=PG_PORT,
+        dbname=PG_DB_NAME
+    )
+    try:
+        with pg_conn.cursor() as pg_cursor:
+            copy_table(sqlite_conn.cursor(), pg_cursor, table_name)
+            reset_sequence(pg_cursor, table_name)
+        pg_conn.commit()
+    except Exception:
+        pg_conn.rollback()
+        raise
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
+
+
 def migrate_table(sqlite_cursor, pg_cursor, table_name):
+    """Row-by-row executemany loader; slower than copy_table, kept for comparison."""
     print(f"  Migrating table: {table_name}")
 
     sqlite_cursor.execute(f"PRAGMA table_info({table_name})")
@@ -130,4 +263,7 @@ def migrate_table(sqlite_cursor, pg_cursor, table_name):
 
 
 if __name__ == "__main__":
-    migrate_data()
+    if "--help" in sys.argv or "-h" in sys.argv:
+        print(__doc__)
+    else:
+        migrate_data(parallel="--parallel" in sys.argv)
@@ -1,7 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Index, Integer, String, ForeignKey
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 from database import Base
+from search import SEARCH_VECTOR_SQL
+
+
+def _search_indexes(table: str) -> tuple:
+    # The trigram index on name needs pg_trgm; search.create_trigram_search() adds it.
+    return (
+        Index(f"ix_{table}_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
 
 class Role(Base):
@@ -25,17 +34,30 @@ class User(Base):
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = _search_indexes("items")
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
+    # Maintained by PostgreSQL; deferred so listings do not load it.
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
 
 class LostItem(Base):
     __tablename__ = "lost_items"
+    __table_args__ = _search_indexes("lost_items")
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+
+class TableVersion(Base):
+    """Change counter per table, bumped by database triggers on every write."""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 
 Role.users = relationship("User", back_populates="role")
@@ -0,0 +1,187 @@
+"""
+Process-local cache of reference data: users by username (with their role)
+and roles by id. These are read on almost every request and rarely change.
+
+Statement triggers on users and roles (database.create_change_notifications)
+NOTIFY database.NOTIFY_CHANNEL with the table name when the transaction
+commits. Every worker on every node runs a listener thread on its own
+connection and drops the affected entries as soon as the notification
+arrives. There is no TTL. crud.py also invalidates right after its own
+commits, so a worker sees its own writes without waiting for the round trip.
+
+The cache is only used while the listener is connected. While it is
+disconnected, calls go straight to the database, because notifications
+could be missed. The cache is cleared on every (re)connect. A load that
+overlaps an invalidation is returned but not stored, so it cannot outlive
+the notification for the change it missed.
+
+Only rows that exist are cached, at most REFERENCE_CACHE_SIZE per
+namespace, least recently used first out. A cached object is detached from
+the session that loaded it, so that session's commits and close cannot
+expire it under other requests.
+
+Table versions are not cached. Notifying on every item write would take
+PostgreSQL's global notify lock at each commit, and the version read is a
+primary-key lookup anyway.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg
+
+import database
+
+REFERENCE_CACHE = os.getenv("LAB2_REFERENCE_CACHE", "1") == "1"
+REFERENCE_CACHE_SIZE = int(os.getenv("LAB2_REFERENCE_CACHE_SIZE", "10000"))
+RECONNECT_SECONDS = float(os.getenv("LAB2_REFERENCE_CACHE_RECONNECT_SECONDS", "1"))
+# The listener checks its connection when no notification arrived this long.
+HEARTBEAT_SECONDS = 10.0
+
+# crud function -> namespace; the first argument after db is the key.
+CACHED_READS = {"get_user_by_username": "users", "get_role": "roles"}
+# Changed table -> namespaces to drop. Users hold their role.
+INVALIDATES = {"users": ("users",), "roles": ("roles", "users")}
+
+_entries = {"users": OrderedDict(), "roles": OrderedDict()}
+_lock = threading.Lock()
+_generation = 0
+_listening = False
+_started = False
+stats = {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0, "notifications": 0, "invalidations": 0,
+         "connects": 0}
+
+
+def _drop(namespaces):
+    global _generation
+    with _lock:
+        _generation += 1
+        for namespace in namespaces:
+            stats["invalidations"] += len(_entries[namespace])
+            _entries[namespace].clear()
+
+
+def invalidate(table: str):
+    """Drops what depends on table, after a committed change to it."""
+    _drop(INVALIDATES.get(table, ()))
+
+
+def _set_listening(listening: bool):
+    global _listening, _generation
+    with _lock:
+        # Clear in both directions: notifications may have been missed.
+        _listening = listening
+        _generation += 1
+        for entries in _entries.values():
+            entries.clear()
+
+
+def _lookup(namespace: str, key) -> tuple:
+    """(hit, value, generation); store a loaded value under that generation."""
+    with _lock:
+        if not _listening:
+            stats["bypassed"] += 1
+            return False, None, None
+        entries = _entries[namespace]
+        if key in entries:
+            entries.move_to_end(key)
+            stats["hits"] += 1
+            return True, entries[key], _generation
+        stats["misses"] += 1
+        return False, None, _generation
+
+
+def _store(namespace: str, key, value, generation):
+    with _lock:
+        if not _listening or generation != _generation:
+            return
+        entries = _entries[namespace]
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > REFERENCE_CACHE_SIZE:
+            entries.popitem(last=False)
+            stats["evictions"] += 1
+
+
+def _detach(db, value):
+    """Expunges a loaded user, with its eagerly loaded role, or a role from db."""
+    for instance in (value, value.__dict__.get("role")):
+        if instance is not None and instance in db:
+            db.expunge(instance)
+
+
+def _count(stat: str):
+    with _lock:
+        stats[stat] += 1
+
+
+class CachingCrud:
+    """
+    Wraps a crud layer (async_crud or ThreadpoolCrud) so that the functions
+    in CACHED_READS are answered from the cache. Signatures are unchanged,
+    and every other function is passed through untouched.
+    """
+
+    def __init__(self, layer):
+        self._layer = layer
+
+    def __getattr__(self, name):
+        func = getattr(self._layer, name)
+        if not REFERENCE_CACHE or name not in CACHED_READS:
+            return func
+        namespace = CACHED_READS[name]
+
+        async def call(db, key):
+            hit, value, generation = _lookup(namespace, key)
+            if hit:
+                return value
+            value = await func(db, key)
+            # A miss is not cached: unknown usernames would pile up.
+            if value is not None:
+                _detach(db, value)
+                _store(namespace, key, value, generation)
+            return value
+
+        return call
+
+
+def _listen():
+    conninfo = psycopg.conninfo.make_conninfo(
+        host=database.PG_HOST, port=database.PG_PORT, dbname=database.PG_DB_NAME,
+        user=database.PG_USER, password=database.PG_PASSWORD,
+    )
+    while True:
+        try:
+            with psycopg.connect(conninfo, autocommit=True) as connection:
+                connection.execute(f"LISTEN {database.NOTIFY_CHANNEL}")
+                _set_listening(True)
+                _count("connects")
+                while True:
+                    for notify in connection.notifies(timeout=HEARTBEAT_SECONDS):
+                        _count("notifications")
+                        invalidate(notify.payload)
+                    # A quiet spell: make sure the connection is still there.
+                    connection.execute("SELECT 1")
+        except Exception as e:
+            print(f"Reference cache listener disconnected: {e}")
+        _set_listening(False)
+        time.sleep(RECONNECT_SECONDS)
+
+
+def start():
+    """Starts the listener thread; the cache serves hits once it is listening."""
+    global _started
+    with _lock:
+        if _started or not REFERENCE_CACHE:
+            return
+        _started = True
+    threading.Thread(target=_listen, daemon=True, name="reference-cache-listener").start()
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(
+            stats, enabled=REFERENCE_CACHE, listening=_listening,
+            size={namespace: len(entries) for namespace, entries in _entries.items()}, max_size=REFERENCE_CACHE_SIZE,
+        )
@@ -0,0 +1,155 @@
+"""
+PostgreSQL search over found items (items) and lost items (lost_items).
+
+Each table has a stored generated tsvector column, search_vector, that
+weights name above description, with a GIN index for full-text matches.
+models.py declares both, so a new database gets them from create_all().
+Typo-tolerant matches on name use the pg_trgm extension and a trigram GIN
+index, which create_trigram_search() adds at startup. pg_trgm ships in
+PostgreSQL's contrib package, which some installs leave out. Without it,
+search matches full text only. An existing database is upgraded with
+`python search.py --migrate`:
+
+- Adding the generated column rewrites the table once. The ALTER runs with
+  a lock_timeout, so it gives up instead of queueing behind a long
+  transaction and stalling every writer behind it.
+- The indexes are built with CREATE INDEX CONCURRENTLY, which does not block
+  writes. A build that failed half-way leaves an invalid index; it is
+  dropped and rebuilt on the next run.
+- The B-tree index on description is dropped concurrently. It only served
+  exact matches, and every write had to maintain it.
+"""
+import sys
+from html import escape
+
+from sqlalchemy import text
+
+SEARCHABLE_TABLES = ("items", "lost_items")
+TEXT_SEARCH_CONFIG = "english"
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+MIGRATION_LOCK_TIMEOUT = "5s"
+# Whether the pg_trgm extension is installed; set by create_trigram_search().
+trigram_search = False
+# Control characters never occur in item text, so they are safe headline
+# markers to swap for <mark> after HTML-escaping the snippet.
+_MARK_START, _MARK_END = "\x02", "\x03"
+_HEADLINE_OPTIONS = f"StartSel={_MARK_START}, StopSel={_MARK_END}, MinWords=8, MaxWords=20"
+
+
+def search_statement(table: str):
+    """
+    Rows matching the query as a web-search phrase ("black leather wallet",
+    -case, "exact phrase") or, with trigram_search, whose name is close to it
+    by trigram word similarity. Best first: full-text rank plus name
+    similarity.
+    """
+    if table not in SEARCHABLE_TABLES:
+        raise ValueError(f"'{table}' is not searchable")
+    match, rank = "search_vector @@ query", "ts_rank_cd(search_vector, query)"
+    if trigram_search:
+        match, rank = f"{match} OR :query <% name", f"{rank} + word_similarity(:query, name)"
+    return text(f"""
+        SELECT id, name, description,
+               ts_headline('{TEXT_SEARCH_CONFIG}', coalesce(description, ''), query, :headline_options)
+        FROM {table}, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS query
+        WHERE {match}
+        ORDER BY {rank} DESC, id
+        LIMIT :limit OFFSET :offset
+    """)
+
+
+def search_params(query: str, limit: int, offset: int) -> dict:
+    return {"query": query, "headline_options": _HEADLINE_OPTIONS, "limit": limit, "offset": offset}
+
+
+def search_results(rows) -> list:
+    """(id, name, description, snippet_html) per row."""
+    return [
+        (item_id, name, description,
+         escape(snippet or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+        for item_id, name, description, snippet in rows
+    ]
+
+
+def _index_is_valid(connection, name: str):
+    """True or False for an existing index, None if there is none."""
+    return connection.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+
+def _create_index_concurrently(connection, name: str, definition: str):
+    if _index_is_valid(connection, name) is False:
+        print(f"  Dropping invalid index {name} left by an interrupted build")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+
+
+def _trigram_available(connection) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar() is not None
+
+
+def create_trigram_search(engine) -> bool:
+    """
+    Installs pg_trgm and the trigram indexes on name if the server has the
+    extension, and sets trigram_search to whether it is installed. Never
+    raises: search works without it. Several workers may run this at once;
+    the indexes are built concurrently so startup never blocks writers.
+    """
+    global trigram_search
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if _trigram_available(connection):
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for table in SEARCHABLE_TABLES:
+                    connection.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_name_trgm "
+                        f"ON {table} USING gin (name gin_trgm_ops)"))
+    except Exception as e:
+        print(f"Could not set up trigram search: {e}")
+    with engine.connect() as connection:
+        trigram_search = connection.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).scalar() is not None
+    if not trigram_search:
+        print("pg_trgm is not installed: search matches full text only, without typo tolerance.")
+    return trigram_search
+
+
+def migrate(engine):
+    """Adds search columns and indexes to existing tables; safe to re-run."""
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        trigram = _trigram_available(connection)
+        if trigram:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        else:
+            print("pg_trgm is not available on this server; skipping the trigram indexes")
+        for table in SEARCHABLE_TABLES:
+            print(f"Migrating {table}")
+            connection.execute(text(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+            connection.execute(text(f"""
+                ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"""))
+            connection.execute(text("RESET lock_timeout"))
+            _create_index_concurrently(connection, f"ix_{table}_search_vector", f"ON {table} USING gin (search_vector)")
+            if trigram:
+                _create_index_concurrently(
+                    connection, f"ix_{table}_name_trgm", f"ON {table} USING gin (name gin_trgm_ops)")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_description"))
+            connection.execute(text(f"ANALYZE {table}"))
+
+
+if __name__ == "__main__":
+    import database
+
+    if "--migrate" in sys.argv:
+        migrate(database.engine)
+        print("Search columns and indexes are in place.")
+    else:
+        print("Usage: python search.py --migrate")
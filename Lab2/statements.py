@@ -0,0 +1,40 @@
+"""
+Prebuilt statements for the hot crud lookups, shared by crud.py and
+async_crud.py. Building a query per call (db.query(Model).filter(...))
+costs a new construct and a cache-key walk before SQLAlchemy can find the
+compiled SQL in its cache. These are built once at import and take their
+values as bound parameters. Their cache keys are memoized on the object,
+so executing one goes straight to the cached compiled form. The SQL text
+is also the same on every call, which lets psycopg 3 prepare it on the
+server (see database.PREPARE_THRESHOLD).
+"""
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import joinedload, selectinload
+
+import models
+
+
+def _by_id(model):
+    return select(model).where(model.id == bindparam("id"))
+
+
+def _page(model):
+    return select(model).offset(bindparam("skip")).limit(bindparam("limit"))
+
+
+ITEM_BY_ID = _by_id(models.Item)
+ITEMS_PAGE = _page(models.Item)
+LOST_ITEM_BY_ID = _by_id(models.LostItem)
+LOST_ITEMS_PAGE = _page(models.LostItem)
+ROLE_BY_ID = _by_id(models.Role)
+ROLES_PAGE = _page(models.Role)
+USER_BY_ID = _by_id(models.User)
+USERS_PAGE = _page(models.User)
+# Callers read user.role, and an AsyncSession cannot lazy-load it. A
+# many-to-one join costs no extra round trip.
+USER_WITH_ROLE_BY_ID = USER_BY_ID.options(joinedload(models.User.role))
+USER_WITH_ROLE_BY_USERNAME = (
+    select(models.User).options(joinedload(models.User.role)).where(models.User.username == bindparam("username"))
+)
+USERS_WITH_ROLE_PAGE = USERS_PAGE.options(selectinload(models.User.role))
+TABLE_VERSION = select(models.TableVersion.version).where(models.TableVersion.name == bindparam("name"))
@@ -0,0 +1,46 @@
+"""
+Post-migration check for migrate.py: compares per-table row counts and
+per-id-range content hashes between the SQLite source and PostgreSQL.
+Hashes are computed next to the data (a SQL aggregate on each side), one
+thread per table and side, and only mismatching id ranges are reported.
+"""
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from database import PG_USER, PG_PASSWORD, PG_HOST, PG_PORT, PG_DB_NAME
+from migrate import SQLITE_DB_PATH
+from verify_chunks import CHUNK_SIZE, TABLE_COLUMNS, compare, pg_chunk_hashes, row_hash
+
+PG_PARAMS = {"user": PG_USER, "password": PG_PASSWORD, "host": PG_HOST, "port": PG_PORT, "dbname": PG_DB_NAME}
+
+
+def sqlite_chunk_hashes(table: str, columns: tuple) -> dict:
+    conn = sqlite3.connect(SQLITE_DB_PATH)
+    conn.create_function("row_hash", -1, row_hash, deterministic=True)
+    try:
+        cursor = conn.execute(
+            f"SELECT id / ?, count(*), sum(row_hash({', '.join(columns)})) FROM {table} GROUP BY 1",
+            (CHUNK_SIZE,),
+        )
+        return {chunk: (count, int(total)) for chunk, count, total in cursor}
+    finally:
+        conn.close()
+
+
+def verify_migration() -> bool:
+    with ThreadPoolExecutor(max_workers=2 * len(TABLE_COLUMNS)) as executor:
+        futures = {
+            table: (executor.submit(sqlite_chunk_hashes, table, columns),
+                    executor.submit(pg_chunk_hashes, PG_PARAMS, table, columns))
+            for table, columns in TABLE_COLUMNS.items()
+        }
+        results = [
+            compare(table, source.result(), target.result(), ("sqlite", "rows"), ("postgres", "rows"))
+            for table, (source, target) in futures.items()
+        ]
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_migration() else 1)
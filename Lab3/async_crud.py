@@ -0,0 +1,342 @@
+"""
+Async mirror of crud.py for PyMongo's AsyncMongoClient. Every function has
+the same name, arguments and return value as its crud.py counterpart but
+awaits the driver, so concurrent requests overlap their database I/O
+instead of blocking the event loop.
+"""
+import asyncio
+from typing import List, Optional, Tuple, Union
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+import schemas
+from crud import (
+    CHANGE_STREAM_HISTORY_LOST,
+    ROLE_WATCH_PIPELINE,
+    ROLE_WATCH_RETRY_SECONDS,
+    _USER_PROJECTION,
+    _doc_to_schema,
+    _docs_to_schemas,
+    _page_query,
+    _page_result,
+    _role_object_id,
+)
+
+
+async def _get_page(
+        collection: AsyncCollection,
+        schema_class,
+        limit: int,
+        cursor: Optional[str],
+        sort_field: str,
+) -> Tuple[List, Optional[str], Optional[str]]:
+    query, sort, payload = _page_query(cursor, sort_field)
+    docs = await collection.find(query).sort(sort).limit(limit + 1).to_list()
+    return _page_result(docs, schema_class, limit, sort_field, payload)
+
+
+async def create_item(
+        db: AsyncDatabase, item: schemas.ItemCreate, write_only: bool = False
+) -> Union[schemas.Item, str]:
+    items_collection = db.items
+    item_dict = item.model_dump()
+    result = await items_collection.insert_one(item_dict)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(item_dict, schemas.Item)
+
+
+async def get_items(db: AsyncDatabase, skip: int = 0, limit: int = 100) -> List[schemas.Item]:
+    items_collection = db.items
+    docs = await items_collection.find().skip(skip).limit(limit).to_list()
+    return _docs_to_schemas(docs, schemas.Item)
+
+
+async def get_items_page(
+        db: AsyncDatabase, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.Item], Optional[str], Optional[str]]:
+    return await _get_page(db.items, schemas.Item, limit, cursor, sort_field)
+
+
+async def get_item(db: AsyncDatabase, item_id: str) -> Optional[schemas.Item]:
+    items_collection = db.items
+    try:
+        item_doc = await items_collection.find_one({"_id": ObjectId(item_id)})
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+    return _doc_to_schema(item_doc, schemas.Item)
+
+
+async def update_item(
+        db: AsyncDatabase, item_id: str, item: schemas.ItemCreate, write_only: bool = False
+) -> Union[schemas.Item, bool, None]:
+    items_collection = db.items
+    try:
+        if write_only:
+            result = await items_collection.update_one(
+                {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+            )
+            return result.matched_count > 0
+        updated_item_doc = await items_collection.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            {"$set": item.model_dump()},
+            return_document=ReturnDocument.AFTER,
+        )
+        return _doc_to_schema(updated_item_doc, schemas.Item)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+
+
+async def delete_item(db: AsyncDatabase, item_id: str) -> Optional[schemas.Item]:
+    items_collection = db.items
+    try:
+        deleted_item_doc = await items_collection.find_one_and_delete({"_id": ObjectId(item_id)})
+        return _doc_to_schema(deleted_item_doc, schemas.Item)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+
+
+async def create_lost_item(
+        db: AsyncDatabase, item: schemas.LostItemCreate, write_only: bool = False
+) -> Union[schemas.LostItem, str]:
+    lost_items_collection = db.lost_items
+    item_dict = item.model_dump()
+    result = await lost_items_collection.insert_one(item_dict)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(item_dict, schemas.LostItem)
+
+
+async def get_lost_items(db: AsyncDatabase, skip: int = 0, limit: int = 100) -> List[schemas.LostItem]:
+    lost_items_collection = db.lost_items
+    docs = await lost_items_collection.find().skip(skip).limit(limit).to_list()
+    return _docs_to_schemas(docs, schemas.LostItem)
+
+
+async def get_lost_items_page(
+        db: AsyncDatabase, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.LostItem], Optional[str], Optional[str]]:
+    return await _get_page(db.lost_items, schemas.LostItem, limit, cursor, sort_field)
+
+
+async def get_lost_item(db: AsyncDatabase, item_id: str) -> Optional[schemas.LostItem]:
+    lost_items_collection = db.lost_items
+    try:
+        item_doc = await lost_items_collection.find_one({"_id": ObjectId(item_id)})
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+    return _doc_to_schema(item_doc, schemas.LostItem)
+
+
+async def update_lost_item(
+        db: AsyncDatabase, item_id: str, item: schemas.LostItemCreate, write_only: bool = False
+) -> Union[schemas.LostItem, bool, None]:
+    lost_items_collection = db.lost_items
+    try:
+        if write_only:
+            result = await lost_items_collection.update_one(
+                {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+            )
+            return result.matched_count > 0
+        updated_item_doc = await lost_items_collection.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            {"$set": item.model_dump()},
+            return_document=ReturnDocument.AFTER,
+        )
+        return _doc_to_schema(updated_item_doc, schemas.LostItem)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+
+
+async def delete_lost_item(db: AsyncDatabase, item_id: str) -> Optional[schemas.LostItem]:
+    lost_items_collection = db.lost_items
+    try:
+        deleted_item_doc = await lost_items_collection.find_one_and_delete(
+            {"_id": ObjectId(item_id)})
+        return _doc_to_schema(deleted_item_doc, schemas.LostItem)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid item ID")
+
+
+async def _embedded_role(db: AsyncDatabase, role_id: ObjectId, role_name: Optional[str]) -> dict:
+    if role_name is not None:
+        return {"_id": role_id, "name": role_name}
+    role = await db.roles.find_one({"_id": role_id}, {"_id": 1, "name": 1})
+    if role is None:
+        raise HTTPException(status_code=404, detail="Role not found")
+    return role
+
+
+async def create_user(
+        db: AsyncDatabase, user: schemas.UserCreate, write_only: bool = False, role_name: Optional[str] = None
+) -> Union[schemas.User, str]:
+    users_collection = db.users
+    user_dict = user.model_dump()
+
+    user_dict["password"] = user.password
+    user_dict["role_id"] = _role_object_id(user.role_id)
+    user_dict["role"] = await _embedded_role(db, user_dict["role_id"], role_name)
+    result = await users_collection.insert_one(user_dict)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(user_dict, schemas.User)
+
+
+async def get_users(db: AsyncDatabase, skip: int = 0, limit: int = 100) -> List[schemas.User]:
+    users_collection = db.users
+    user_docs = await users_collection.find({}, _USER_PROJECTION).skip(skip).limit(limit).to_list()
+    return _docs_to_schemas(user_docs, schemas.User)
+
+
+async def get_user(db: AsyncDatabase, user_id: str) -> Optional[schemas.User]:
+    users_collection = db.users
+    try:
+        user_doc = await users_collection.find_one({"_id": ObjectId(user_id)}, _USER_PROJECTION)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    return _doc_to_schema(user_doc, schemas.User)
+
+
+async def get_user_by_username(db: AsyncDatabase, username: str) -> Optional[schemas.User]:
+    users_collection = db.users
+    user_doc = await users_collection.find_one({"username": username}, _USER_PROJECTION)
+    return _doc_to_schema(user_doc, schemas.User)
+
+
+async def update_user(
+        db: AsyncDatabase, user_id: str, user: schemas.UserCreate, write_only: bool = False,
+        role_name: Optional[str] = None,
+) -> Union[schemas.User, bool, None]:
+    users_collection = db.users
+    user_dict = user.model_dump()
+    del user_dict["password"]
+    user_dict["role_id"] = _role_object_id(user.role_id)
+    user_dict["role"] = await _embedded_role(db, user_dict["role_id"], role_name)
+    try:
+        if write_only:
+            result = await users_collection.update_one(
+                {"_id": ObjectId(user_id)}, {"$set": user_dict}
+            )
+            return result.matched_count > 0
+        updated_user_doc = await users_collection.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": user_dict},
+            projection=_USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        return _doc_to_schema(updated_user_doc, schemas.User)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
+
+async def delete_user(db: AsyncDatabase, user_id: str) -> Optional[schemas.User]:
+    users_collection = db.users
+    try:
+        deleted_user_doc = await users_collection.find_one_and_delete(
+            {"_id": ObjectId(user_id)})
+        return _doc_to_schema(deleted_user_doc, schemas.User)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
+
+async def create_role(
+        db: AsyncDatabase, role: schemas.RoleCreate, write_only: bool = False
+) -> Union[schemas.Role, str]:
+    roles_collection = db.roles
+    role_dict = role.model_dump()
+    result = await roles_collection.insert_one(role_dict)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(role_dict, schemas.Role)
+
+
+async def get_roles(db: AsyncDatabase, skip: int = 0, limit: int = 100) -> List[schemas.Role]:
+    roles_collection = db.roles
+    docs = await roles_collection.find().skip(skip).limit(limit).to_list()
+    return _docs_to_schemas(docs, schemas.Role)
+
+
+async def get_roles_page(
+        db: AsyncDatabase, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.Role], Optional[str], Optional[str]]:
+    return await _get_page(db.roles, schemas.Role, limit, cursor, sort_field)
+
+
+async def update_role(db: AsyncDatabase, role_id: str, role: schemas.RoleCreate) -> Optional[schemas.Role]:
+    roles_collection = db.roles
+    try:
+        updated_role_doc = await roles_collection.find_one_and_update(
+            {"_id": ObjectId(role_id)},
+            {"$set": role.model_dump()},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid role ID")
+    if updated_role_doc:
+        await fan_out_role_name(db, updated_role_doc["_id"], updated_role_doc["name"])
+    return _doc_to_schema(updated_role_doc, schemas.Role)
+
+
+async def fan_out_role_name(db: AsyncDatabase, role_id: ObjectId, name: str) -> int:
+    result = await db.users.update_many(
+        {
+            "role_id": {"$in": [role_id, str(role_id)]},
+            "$or": [
+                {"role_id": str(role_id)},
+                {"role._id": {"$ne": role_id}},
+                {"role.name": {"$ne": name}},
+            ],
+        },
+        {"$set": {"role_id": role_id, "role": {"_id": role_id, "name": name}}},
+    )
+    return result.modified_count
+
+
+async def sync_embedded_roles(db: AsyncDatabase) -> int:
+    changed = 0
+    async for role_doc in db.roles.find({}, {"_id": 1, "name": 1}):
+        changed += await fan_out_role_name(db, role_doc["_id"], role_doc["name"])
+    return changed
+
+
+async def watch_role_renames(db: AsyncDatabase):
+    """Runs until cancelled."""
+    resume_token = None
+    while True:
+        try:
+            async with await db.roles.watch(
+                ROLE_WATCH_PIPELINE, full_document="updateLookup", resume_after=resume_token
+            ) as stream:
+                async for change in stream:
+                    role_doc = change.get("fullDocument")
+                    if role_doc:
+                        await fan_out_role_name(db, role_doc["_id"], role_doc["name"])
+                    resume_token = stream.resume_token
+        except OperationFailure as e:
+            print(f"Role rename watcher failed: {e}")
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                resume_token = None
+                await sync_embedded_roles(db)
+        except PyMongoError as e:
+            print(f"Role rename watcher lost its change stream: {e}")
+        await asyncio.sleep(ROLE_WATCH_RETRY_SECONDS)
+
+
+async def get_role(db: AsyncDatabase, role_id: str) -> Optional[schemas.Role]:
+    roles_collection = db.roles
+    try:
+        role_doc = await roles_collection.find_one({"_id": ObjectId(role_id)})
+        return _doc_to_schema(role_doc, schemas.Role)
+    except Exception:
+        return None
+
+
+async def get_role_by_name(db: AsyncDatabase, name: str) -> Optional[schemas.Role]:
+    roles_collection = db.roles
+    role_doc = await roles_collection.find_one({"name": name})
+    return _doc_to_schema(role_doc, schemas.Role)
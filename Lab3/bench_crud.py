@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+
+import crud
+import schemas
+from database import MONGO_CONNECTION_STRING, MONGO_DB_NAME
+
+BENCH_DB_NAME = f"{MONGO_DB_NAME}_bench"
+ITERATIONS = 2000
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands (network round trips) the client sends."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def legacy_create_item(db, item):
+    """The previous insert + find_one pattern, kept here as the baseline."""
+    result = db.items.insert_one(item.model_dump())
+    doc = db.items.find_one({"_id": result.inserted_id})
+    return crud._doc_to_schema(doc, schemas.Item)
+
+
+def legacy_update_item(db, item_id, item):
+    result = db.items.update_one({"_id": ObjectId(item_id)}, {"$set": item.model_dump()})
+    if result.matched_count == 0:
+        return None
+    doc = db.items.find_one({"_id": ObjectId(item_id)})
+    return crud._doc_to_schema(doc, schemas.Item)
+
+
+def run(label, counter, operation):
+    latencies = []
+    start_count = counter.count
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        operation(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    round_trips = (counter.count - start_count) / ITERATIONS
+    latencies.sort()
+    print(
+        f"{label:<32} round trips/op: {round_trips:.2f}  "
+        f"mean: {statistics.mean(latencies):.3f} ms  "
+        f"p50: {latencies[len(latencies) // 2]:.3f} ms  "
+        f"p99: {latencies[int(len(latencies) * 0.99)]:.3f} ms"
+    )
+
+
+def main():
+    counter = CommandCounter()
+    client = MongoClient(MONGO_CONNECTION_STRING, event_listeners=[counter])
+    client.drop_database(BENCH_DB_NAME)
+    db = client[BENCH_DB_NAME]
+
+    item = schemas.ItemCreate(name="Umbrella", description="Black, folding")
+    seed_id = str(db.items.insert_one(item.model_dump()).inserted_id)
+
+    print(f"--- {ITERATIONS} operations per row against {MONGO_CONNECTION_STRING} ---")
+    run("create_item (before)", counter, lambda i: legacy_create_item(db, item))
+    run("create_item (after)", counter, lambda i: crud.create_item(db, item))
+    run("create_item (write-only)", counter, lambda i: crud.create_item(db, item, write_only=True))
+    run("update_item (before)", counter, lambda i: legacy_update_item(db, seed_id, item))
+    run("update_item (after)", counter, lambda i: crud.update_item(db, seed_id, item))
+    run("update_item (write-only)", counter, lambda i: crud.update_item(db, seed_id, item, write_only=True))
+
+    client.drop_database(BENCH_DB_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
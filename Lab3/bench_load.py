@@ -0,0 +1,62 @@
+"""
+Load test for the Lab3 app. Start the server in the mode to measure, e.g.
+
+    LAB3_MONGO_DRIVER=sync  uvicorn main:app --port 8000
+    LAB3_MONGO_DRIVER=async uvicorn main:app --port 8000
+
+then run `python bench_load.py [base_url] [path]` against each and compare.
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+CONCURRENCY_LEVELS = (1, 10, 100)
+DURATION_SECONDS = 10
+
+
+async def worker(client: httpx.AsyncClient, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_level(url: str, concurrency: int):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + DURATION_SECONDS
+        await asyncio.gather(
+            *(worker(client, url, deadline, latencies, errors) for _ in range(concurrency))
+        )
+
+    latencies.sort()
+    throughput = len(latencies) / DURATION_SECONDS
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    print(
+        f"clients: {concurrency:>3}  req/s: {throughput:8.1f}  "
+        f"p50: {p50:7.2f} ms  p99: {p99:7.2f} ms  errors: {len(errors)}"
+    )
+
+
+async def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8000"
+    path = sys.argv[2] if len(sys.argv) > 2 else "/items-found"
+    url = base_url.rstrip("/") + path
+    print(f"--- GET {url}, {DURATION_SECONDS}s per level ---")
+    for concurrency in CONCURRENCY_LEVELS:
+        await run_level(url, concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,20 @@
-from typing import List, Optional
+import base64
+import threading
+from typing import List, Optional, Tuple, Union
 
-from bson import ObjectId
+from bson import ObjectId, json_util
 from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.collection import Collection
 from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
 
 import schemas
 
+# Fields a listing may be keyset-paginated on. Each must be indexed (together
+# with `_id` as the tie-breaker) for a page to cost the same as the first one.
+PAGINATION_SORT_FIELDS = ("_id", "name")
+
 
 def _doc_to_schema(doc: dict, schema_class: type[schemas.BaseModel]):
     """
@@ -32,12 +41,108 @@ def _docs_to_schemas(docs: List[dict], schema_class) -> List:
     return [_doc_to_schema(doc, schema_class) for doc in docs if doc]
 
 
-def create_item(db: Database, item: schemas.ItemCreate) -> schemas.Item:
+def encode_cursor(doc: dict, sort_field: str, direction: str) -> str:
+    """Builds an opaque pagination token pointing at `doc`."""
+    payload = {"s": sort_field, "d": direction, "id": doc["_id"]}
+    if sort_field != "_id":
+        payload["v"] = doc.get(sort_field)
+    raw = json_util.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json_util.loads(raw)
+        if payload["s"] != sort_field or payload["d"] not in ("next", "prev"):
+            raise ValueError
+        if not isinstance(payload["id"], ObjectId):
+            raise ValueError
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return payload
+
+
+def _keyset_filter(sort_field: str, payload: dict, op: str) -> dict:
+    if sort_field == "_id":
+        return {"_id": {op: payload["id"]}}
+    return {
+        "$or": [
+            {sort_field: {op: payload.get("v")}},
+            {sort_field: payload.get("v"), "_id": {op: payload["id"]}},
+        ]
+    }
+
+
+def _page_query(cursor: Optional[str], sort_field: str) -> Tuple[dict, list, Optional[dict]]:
+    """Returns the (filter, sort, decoded cursor) to run for one page."""
+    if sort_field not in PAGINATION_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail="Invalid sort field")
+
+    payload = decode_cursor(cursor, sort_field) if cursor else None
+    backwards = payload is not None and payload["d"] == "prev"
+
+    query = {}
+    if payload is not None:
+        query = _keyset_filter(sort_field, payload, "$lt" if backwards else "$gt")
+
+    order = DESCENDING if backwards else ASCENDING
+    sort = [("_id", order)] if sort_field == "_id" else [(sort_field, order), ("_id", order)]
+    return query, sort, payload
+
+
+def _page_result(
+        docs: List[dict], schema_class, limit: int, sort_field: str, payload: Optional[dict]
+) -> Tuple[List, Optional[str], Optional[str]]:
+    """Turns the `limit + 1` fetched documents into (items, next_cursor, prev_cursor)."""
+    backwards = payload is not None and payload["d"] == "prev"
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if backwards:
+        docs.reverse()
+
+    next_cursor = prev_cursor = None
+    if docs:
+        if has_more or backwards:
+            next_cursor = encode_cursor(docs[-1], sort_field, "next")
+        if (has_more and backwards) or (payload is not None and not backwards):
+            prev_cursor = encode_cursor(docs[0], sort_field, "prev")
+    return _docs_to_schemas(docs, schema_class), next_cursor, prev_cursor
+
+
+def _get_page(
+        collection: Collection,
+        schema_class,
+        limit: int,
+        cursor: Optional[str],
+        sort_field: str,
+) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    Keyset pagination over `collection` ordered by (sort_field, _id).
+    Instead of skipping documents, each page resumes from the boundary
+    document encoded in `cursor`, so every page is a single index range scan.
+    Returns (items, next_cursor, prev_cursor).
+    """
+    query, sort, payload = _page_query(cursor, sort_field)
+    docs = list(collection.find(query).sort(sort).limit(limit + 1))
+    return _page_result(docs, schema_class, limit, sort_field, payload)
+
+
+# Mutations take `write_only`: callers that discard the result (redirecting
+# HTML routes) get back just the inserted id, or whether an update matched,
+# and skip building the response model from the stored document.
+
+
+def create_item(
+        db: Database, item: schemas.ItemCreate, write_only: bool = False
+) -> Union[schemas.Item, str]:
     items_collection = db.items
     item_dict = item.model_dump()
     result = items_collection.insert_one(item_dict)
-    new_item_doc = items_collection.find_one({"_id": result.inserted_id})
-    return _doc_to_schema(new_item_doc, schemas.Item)
+    if write_only:
+        return str(result.inserted_id)
+    # insert_one sets '_id' on the dict it was given, so it already is the stored document.
+    return _doc_to_schema(item_dict, schemas.Item)
 
 
 def get_items(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.Item]:
@@ -46,6 +151,12 @@ def get_items(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.Ite
     return _docs_to_schemas(docs, schemas.Item)
 
 
+def get_items_page(
+        db: Database, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.Item], Optional[str], Optional[str]]:
+    return _get_page(db.items, schemas.Item, limit, cursor, sort_field)
+
+
 def get_item(db: Database, item_id: str) -> Optional[schemas.Item]:
     items_collection = db.items
     try:
@@ -55,15 +166,21 @@ def get_item(db: Database, item_id: str) -> Optional[schemas.Item]:
     return _doc_to_schema(item_doc, schemas.Item)
 
 
-def update_item(db: Database, item_id: str, item: schemas.ItemCreate) -> Optional[schemas.Item]:
+def update_item(
+        db: Database, item_id: str, item: schemas.ItemCreate, write_only: bool = False
+) -> Union[schemas.Item, bool, None]:
     items_collection = db.items
     try:
-        result = items_collection.update_one(
-            {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+        if write_only:
+            result = items_collection.update_one(
+                {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+            )
+            return result.matched_count > 0
+        updated_item_doc = items_collection.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            {"$set": item.model_dump()},
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
-            return None
-        updated_item_doc = items_collection.find_one({"_id": ObjectId(item_id)})
         return _doc_to_schema(updated_item_doc, schemas.Item)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid item ID")
@@ -78,12 +195,15 @@ def delete_item(db: Database, item_id: str) -> Optional[schemas.Item]:
         raise HTTPException(status_code=400, detail="Invalid item ID")
 
 
-def create_lost_item(db: Database, item: schemas.LostItemCreate) -> schemas.LostItem:
+def create_lost_item(
+        db: Database, item: schemas.LostItemCreate, write_only: bool = False
+) -> Union[schemas.LostItem, str]:
     lost_items_collection = db.lost_items
     item_dict = item.model_dump()
     result = lost_items_collection.insert_one(item_dict)
-    new_item_doc = lost_items_collection.find_one({"_id": result.inserted_id})
-    return _doc_to_schema(new_item_doc, schemas.LostItem)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(item_dict, schemas.LostItem)
 
 
 def get_lost_items(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.LostItem]:
@@ -92,6 +212,12 @@ def get_lost_items(db: Database, skip: int = 0, limit: int = 100) -> List[schema
     return _docs_to_schemas(docs, schemas.LostItem)
 
 
+def get_lost_items_page(
+        db: Database, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.LostItem], Optional[str], Optional[str]]:
+    return _get_page(db.lost_items, schemas.LostItem, limit, cursor, sort_field)
+
+
 def get_lost_item(db: Database, item_id: str) -> Optional[schemas.LostItem]:
     lost_items_collection = db.lost_items
     try:
@@ -102,16 +228,20 @@ def get_lost_item(db: Database, item_id: str) -> Optional[schemas.LostItem]:
 
 
 def update_lost_item(
-        db: Database, item_id: str, item: schemas.LostItemCreate
-) -> Optional[schemas.LostItem]:
+        db: Database, item_id: str, item: schemas.LostItemCreate, write_only: bool = False
+) -> Union[schemas.LostItem, bool, None]:
     lost_items_collection = db.lost_items
     try:
-        result = lost_items_collection.update_one(
-            {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+        if write_only:
+            result = lost_items_collection.update_one(
+                {"_id": ObjectId(item_id)}, {"$set": item.model_dump()}
+            )
+            return result.matched_count > 0
+        updated_item_doc = lost_items_collection.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            {"$set": item.model_dump()},
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
-            return None
-        updated_item_doc = lost_items_collection.find_one({"_id": ObjectId(item_id)})
         return _doc_to_schema(updated_item_doc, schemas.LostItem)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid item ID")
@@ -127,78 +257,108 @@ def delete_lost_item(db: Database, item_id: str) -> Optional[schemas.LostItem]:
         raise HTTPException(status_code=400, detail="Invalid item ID")
 
 
-def create_user(db: Database, user: schemas.UserCreate) -> schemas.User:
+def _role_object_id(role_id: str) -> ObjectId:
+    try:
+        return ObjectId(role_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid role ID")
+
+
+def _embedded_role(db: Database, role_id: ObjectId, role_name: Optional[str]) -> dict:
+    """
+    The {"_id", "name"} copy of a role that is stored inside user documents.
+    Routes pass the name they already looked up; otherwise it costs a read.
+    """
+    if role_name is not None:
+        return {"_id": role_id, "name": role_name}
+    role = db.roles.find_one({"_id": role_id}, {"_id": 1, "name": 1})
+    if role is None:
+        raise HTTPException(status_code=404, detail="Role not found")
+    return role
+
+
+def create_user(
+        db: Database, user: schemas.UserCreate, write_only: bool = False, role_name: Optional[str] = None
+) -> Union[schemas.User, str]:
     users_collection = db.users
     user_dict = user.model_dump()
 
     user_dict["password"] = user.password
+    user_dict["role_id"] = _role_object_id(user.role_id)
+    user_dict["role"] = _embedded_role(db, user_dict["role_id"], role_name)
     result = users_collection.insert_one(user_dict)
-    new_user_doc = users_collection.find_one({"_id": result.inserted_id})
-    return _doc_to_schema(new_user_doc, schemas.User)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(user_dict, schemas.User)
+
+
+# Users carry a denormalized copy of their role ({"_id", "name"}) written by
+# create_user/update_user and kept current by fan_out_role_name, so reads are
+# a plain find on users.
+_USER_PROJECTION = {"_id": 1, "username": 1, "email": 1, "password": 1, "role": 1}
 
 
 def get_users(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.User]:
     users_collection = db.users
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "roles",
-                "localField": "role_id",
-                "foreignField": "_id",
-                "as": "role",
-            }
+    user_docs = list(users_collection.find({}, _USER_PROJECTION).skip(skip).limit(limit))
+    return _docs_to_schemas(user_docs, schemas.User)
+
+
+def get_user(db: Database, user_id: str) -> Optional[schemas.User]:
+    users_collection = db.users
+    try:
+        user_doc = users_collection.find_one({"_id": ObjectId(user_id)}, _USER_PROJECTION)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    return _doc_to_schema(user_doc, schemas.User)
+
+
+def get_user_by_username(db: Database, username: str) -> Optional[schemas.User]:
+    users_collection = db.users
+    user_doc = users_collection.find_one({"username": username}, _USER_PROJECTION)
+    return _doc_to_schema(user_doc, schemas.User)
+
+
+# $lookup + $unwind + $project stages that attach {"_id", "name"} of the
+# user's role as `role`. The *_with_lookup readers below join against
+# `roles` on every call; they are kept to verify the embedded copies.
+_USER_ROLE_STAGES = [
+    {
+        "$lookup": {
+            "from": "roles",
+            "localField": "role_id",
+            "foreignField": "_id",
+            "as": "role",
+        }
+    },
+    {"$unwind": {
+        "path": "$role",
+        "preserveNullAndEmptyArrays": True
+    }},
+    {"$project": {
+        "_id": 1,
+        "username": 1,
+        "email": 1,
+        "password": 1,
+        "role": {
+            "_id": "$role._id",
+            "name": "$role.name"
         },
-        {"$unwind": {
-            "path": "$role",
-            "preserveNullAndEmptyArrays": True
-        }},
-        {"$project": {
-            "_id": 1,
-            "username": 1,
-            "email": 1,
-            "password": 1,
-            "role": {
-                "_id": "$role._id",
-                "name": "$role.name"
-            },
-        }},
-        {"$skip": skip},
-        {"$limit": limit},
-    ]
+    }},
+]
+
+
+def get_users_with_lookup(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.User]:
+    users_collection = db.users
+    pipeline = [*_USER_ROLE_STAGES, {"$skip": skip}, {"$limit": limit}]
     user_docs = list(users_collection.aggregate(pipeline))
     return _docs_to_schemas(user_docs, schemas.User)
 
 
-def get_user(db: Database, user_id: str) -> Optional[schemas.User]:
+def get_user_with_lookup(db: Database, user_id: str) -> Optional[schemas.User]:
     users_collection = db.users
     try:
-        pipeline = [
-            {"$match": {"_id": ObjectId(user_id)}},
-            {
-                "$lookup": {
-                    "from": "roles",
-                    "localField": "role_id",
-                    "foreignField": "_id",
-                    "as": "role",
-                }
-            },
-            {
-                "$unwind": {
-                    "path": "$role",
-                    "preserveNullAndEmptyArrays": True
-                }
-            },
-            {"$project": {
-                "_id": 1,
-                "username": 1,
-                "email": 1,
-                "password": 1,
-                "role": {
-                    "_id": "$role._id",
-                    "name": "$role.name"
-                },
-            }},
-        ]
+        pipeline = [{"$match": {"_id": ObjectId(user_id)}}, *_USER_ROLE_STAGES]
         user_doc = next(users_collection.aggregate(pipeline), None)
 
     except Exception:
@@ -206,54 +366,53 @@ def get_user(db: Database, user_id: str) -> Optional[schemas.User]:
     return _doc_to_schema(user_doc, schemas.User)
 
 
-def get_user_by_username(db: Database, username: str) -> Optional[schemas.User]:
+def get_user_by_username_with_lookup(db: Database, username: str) -> Optional[schemas.User]:
     users_collection = db.users
-    pipeline = [
-        {"$match": {"username": username}},
-        {
-            "$lookup": {
-                "from": "roles",
-                "localField": "role_id",
-                "foreignField": "_id",
-                "as": "role",
-            },
-        },
-        {
-            "$unwind": {
-                "path": "$role",
-                "preserveNullAndEmptyArrays": True,
-            },
-        },
-        {
-            "$project": {
-                "_id": 1,
-                "username": 1,
-                "email": 1,
-                "password": 1,
-                "role": {
-                    "_id": "$role._id",
-                    "name": "$role.name",
-                },
-            },
-        },
-    ]
+    pipeline = [{"$match": {"username": username}}, *_USER_ROLE_STAGES]
     user_doc = next(users_collection.aggregate(pipeline), None)
     return _doc_to_schema(user_doc, schemas.User)
 
 
+def find_stale_embedded_roles(db: Database) -> List[str]:
+    """Ids of users whose embedded role differs from what the $lookup join returns."""
+    pipeline = [
+        {"$lookup": {
+            "from": "roles",
+            "localField": "role_id",
+            "foreignField": "_id",
+            "as": "joined",
+        }},
+        {"$unwind": {"path": "$joined", "preserveNullAndEmptyArrays": True}},
+        {"$match": {"$expr": {"$or": [
+            {"$ne": [{"$ifNull": ["$role._id", None]}, {"$ifNull": ["$joined._id", None]}]},
+            {"$ne": [{"$ifNull": ["$role.name", None]}, {"$ifNull": ["$joined.name", None]}]},
+        ]}}},
+        {"$project": {"_id": 1}},
+    ]
+    return [str(doc["_id"]) for doc in db.users.aggregate(pipeline)]
+
+
 def update_user(
-        db: Database, user_id: str, user: schemas.UserCreate
-) -> Optional[schemas.User]:
+        db: Database, user_id: str, user: schemas.UserCreate, write_only: bool = False,
+        role_name: Optional[str] = None,
+) -> Union[schemas.User, bool, None]:
     users_collection = db.users
     user_dict = user.model_dump()
     del user_dict["password"]
+    user_dict["role_id"] = _role_object_id(user.role_id)
+    user_dict["role"] = _embedded_role(db, user_dict["role_id"], role_name)
     try:
-        result = users_collection.update_one(
-            {"_id": ObjectId(user_id)}, {"$set": user_dict}
+        if write_only:
+            result = users_collection.update_one(
+                {"_id": ObjectId(user_id)}, {"$set": user_dict}
+            )
+            return result.matched_count > 0
+        updated_user_doc = users_collection.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": user_dict},
+            projection=_USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
         )
-        if result.matched_count == 0:
-            return None
-        updated_user_doc = users_collection.find_one({"_id": ObjectId(user_id)})
         return _doc_to_schema(updated_user_doc, schemas.User)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user ID")
@@ -269,12 +428,15 @@ def delete_user(db: Database, user_id: str) -> Optional[schemas.User]:
         raise HTTPException(status_code=400, detail="Invalid user ID")
 
 
-def create_role(db: Database, role: schemas.RoleCreate) -> schemas.Role:
+def create_role(
+        db: Database, role: schemas.RoleCreate, write_only: bool = False
+) -> Union[schemas.Role, str]:
     roles_collection = db.roles
     role_dict = role.model_dump()
     result = roles_collection.insert_one(role_dict)
-    new_role_doc = roles_collection.find_one({"_id": result.inserted_id})
-    return _doc_to_schema(new_role_doc, schemas.Role)
+    if write_only:
+        return str(result.inserted_id)
+    return _doc_to_schema(role_dict, schemas.Role)
 
 
 def get_roles(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.Role]:
@@ -283,6 +445,89 @@ def get_roles(db: Database, skip: int = 0, limit: int = 100) -> List[schemas.Rol
     return _docs_to_schemas(docs, schemas.Role)
 
 
+def get_roles_page(
+        db: Database, limit: int = 20, cursor: Optional[str] = None, sort_field: str = "_id"
+) -> Tuple[List[schemas.Role], Optional[str], Optional[str]]:
+    return _get_page(db.roles, schemas.Role, limit, cursor, sort_field)
+
+
+def update_role(db: Database, role_id: str, role: schemas.RoleCreate) -> Optional[schemas.Role]:
+    roles_collection = db.roles
+    try:
+        updated_role_doc = roles_collection.find_one_and_update(
+            {"_id": ObjectId(role_id)},
+            {"$set": role.model_dump()},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid role ID")
+    if updated_role_doc:
+        fan_out_role_name(db, updated_role_doc["_id"], updated_role_doc["name"])
+    return _doc_to_schema(updated_role_doc, schemas.Role)
+
+
+def fan_out_role_name(db: Database, role_id: ObjectId, name: str) -> int:
+    """Rewrites the embedded role copy of every user holding `role_id`."""
+    result = db.users.update_many(
+        {
+            # Users written before roles were embedded may hold role_id as a string.
+            "role_id": {"$in": [role_id, str(role_id)]},
+            "$or": [
+                {"role_id": str(role_id)},
+                {"role._id": {"$ne": role_id}},
+                {"role.name": {"$ne": name}},
+            ],
+        },
+        {"$set": {"role_id": role_id, "role": {"_id": role_id, "name": name}}},
+    )
+    return result.modified_count
+
+
+def sync_embedded_roles(db: Database) -> int:
+    """Brings every user's embedded role in line with `roles`; returns users changed."""
+    return sum(
+        fan_out_role_name(db, role_doc["_id"], role_doc["name"])
+        for role_doc in db.roles.find({}, {"_id": 1, "name": 1})
+    )
+
+
+ROLE_WATCH_PIPELINE = [{"$match": {"operationType": {"$in": ["update", "replace"]}}}]
+ROLE_WATCH_RETRY_SECONDS = 5
+# The resume token is older than the oplog still holds.
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def watch_role_renames(db: Database, stop: threading.Event):
+    """
+    Follows a change stream over `roles` until `stop` is set and fans out
+    every rename, so embedded copies follow renames made outside update_role
+    (shell, other services). Change streams need a replica set or sharded
+    cluster. A broken stream is reopened from its resume token. If the
+    token has fallen off the oplog, all users are re-synced instead.
+    """
+    resume_token = None
+    while not stop.is_set():
+        try:
+            with db.roles.watch(
+                ROLE_WATCH_PIPELINE, full_document="updateLookup", resume_after=resume_token,
+                max_await_time_ms=1000,
+            ) as stream:
+                while stream.alive and not stop.is_set():
+                    change = stream.try_next()
+                    if change and change.get("fullDocument"):
+                        role_doc = change["fullDocument"]
+                        fan_out_role_name(db, role_doc["_id"], role_doc["name"])
+                    resume_token = stream.resume_token
+        except OperationFailure as e:
+            print(f"Role rename watcher failed: {e}")
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                resume_token = None
+                sync_embedded_roles(db)
+        except PyMongoError as e:
+            print(f"Role rename watcher lost its change stream: {e}")
+        stop.wait(ROLE_WATCH_RETRY_SECONDS)
+
+
 def get_role(db: Database, role_id: str) -> Optional[schemas.Role]:
     roles_collection = db.roles
     try:
@@ -1,10 +1,24 @@
-from pymongo import MongoClient
+import os
+from typing import Union
+
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
 from pymongo.errors import ConnectionFailure
 
 MONGO_CONNECTION_STRING = "mongodb://localhost:27017/"
 MONGO_DB_NAME = "web_lab_db"
+# "sync" serves routes through the blocking MongoClient, "async" through
+# AsyncMongoClient so concurrent requests overlap their I/O.
+MONGO_DRIVER_MODE = os.getenv("LAB3_MONGO_DRIVER", "sync")
 
 client: MongoClient = None
+db: Database = None
+
+async_client: AsyncMongoClient = None
+async_db: AsyncDatabase = None
+
+AnyDatabase = Union[Database, AsyncDatabase]
 
 
 def connect_to_mongo():
@@ -35,3 +49,33 @@ def get_database():
     if db is None:
         connect_to_mongo()
     yield db
+
+
+async def connect_to_mongo_async():
+    """Establishes the AsyncMongoClient connection and sets global async_client/async_db objects."""
+    global async_client, async_db
+    try:
+        async_client = AsyncMongoClient(MONGO_CONNECTION_STRING)
+        await async_client.admin.command('ping')
+        async_db = async_client[MONGO_DB_NAME]
+        print(f"Successfully connected to MongoDB database '{MONGO_DB_NAME}' (async)")
+    except ConnectionFailure as e:
+        print(f"Could not connect to MongoDB: {e}")
+
+        raise
+
+
+async def close_mongo_connection_async():
+    """Closes the AsyncMongoClient connection."""
+    global async_client
+    if async_client:
+        await async_client.close()
+        print("MongoDB async connection closed.")
+
+
+async def get_async_database():
+    """Dependency to yield the MongoDB AsyncDatabase object."""
+
+    if async_db is None:
+        await connect_to_mongo_async()
+    yield async_db
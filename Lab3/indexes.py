@@ -0,0 +1,156 @@
+import sys
+
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from database import MONGO_CONNECTION_STRING, MONGO_DB_NAME
+
+# Every index the app relies on, per collection. Applied idempotently by
+# ensure_indexes() on startup; create_indexes is a no-op for indexes that
+# already exist with the same spec.
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # fan_out_role_name rewrites embedded roles by role_id.
+        IndexModel([("role_id", ASCENDING)], name="role_id"),
+    ],
+    "roles": [
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+    ],
+    "items": [
+        # Keyset pagination sorted by name uses (name, _id) as its key.
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+    ],
+    "lost_items": [
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+    ],
+}
+# Indexes earlier versions created that no query uses any more; dropped on
+# startup so writes stop paying for them. Nothing issues $text queries.
+RETIRED_INDEXES = {
+    "items": ["name_description_text"],
+    "lost_items": ["name_description_text"],
+}
+
+
+def ensure_indexes(db: Database):
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                db[collection_name].drop_index(name)
+                print(f"Dropped unused index '{name}' on '{collection_name}'")
+    # One at a time, so an index that cannot be built does not skip the rest.
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. a unique index over existing duplicates, or an index with the
+                # same name but different options created by hand.
+                print(f"Could not create index '{model.document['name']}' on '{collection_name}': {e}")
+        print(f"Indexes on '{collection_name}': {', '.join(db[collection_name].index_information())}")
+
+
+async def ensure_indexes_async(db: AsyncDatabase):
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection_name].drop_index(name)
+                print(f"Dropped unused index '{name}' on '{collection_name}'")
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                print(f"Could not create index '{model.document['name']}' on '{collection_name}': {e}")
+        print(f"Indexes on '{collection_name}': {', '.join(await db[collection_name].index_information())}")
+
+
+def _sample(db: Database, collection_name: str, field: str, default):
+    doc = db[collection_name].find_one({field: {"$exists": True}}, {field: 1})
+    return doc[field] if doc else default
+
+
+def query_shapes(db: Database) -> list:
+    """(label, explain command body) for each query shape issued by crud.py."""
+    username = _sample(db, "users", "username", "")
+    user_id = _sample(db, "users", "_id", None)
+    role_id = _sample(db, "roles", "_id", None)
+    item_id = _sample(db, "items", "_id", None)
+    item_name = _sample(db, "items", "name", "")
+    lost_item_id = _sample(db, "lost_items", "_id", None)
+    return [
+        ("get_user_by_username", {"find": "users", "filter": {"username": username}, "limit": 1}),
+        ("get_user", {"find": "users", "filter": {"_id": user_id}, "limit": 1}),
+        ("get_users", {"find": "users", "filter": {}, "limit": 100}),
+        ("get_role_by_name", {"find": "roles", "filter": {"name": "user"}, "limit": 1}),
+        ("get_role", {"find": "roles", "filter": {"_id": role_id}, "limit": 1}),
+        ("fan_out_role_name", {"find": "users", "filter": {"role_id": {"$in": [role_id, str(role_id)]}}}),
+        ("get_item", {"find": "items", "filter": {"_id": item_id}, "limit": 1}),
+        ("get_items_page (_id)", {
+            "find": "items", "filter": {"_id": {"$gt": item_id}}, "sort": {"_id": 1}, "limit": 21,
+        }),
+        ("get_items_page (name)", {
+            "find": "items",
+            "filter": {"$or": [{"name": {"$gt": item_name}}, {"name": item_name, "_id": {"$gt": item_id}}]},
+            "sort": {"name": 1, "_id": 1},
+            "limit": 21,
+        }),
+        ("get_lost_item", {"find": "lost_items", "filter": {"_id": lost_item_id}, "limit": 1}),
+        ("get_lost_items_page (_id)", {
+            "find": "lost_items", "filter": {"_id": {"$gt": lost_item_id}}, "sort": {"_id": 1}, "limit": 21,
+        }),
+    ]
+
+
+def _plan_stages(plan) -> set:
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages |= _plan_stages(value)
+    return stages
+
+
+def advise(db: Database):
+    """Runs explain() on every query shape and flags collection scans and wasteful plans."""
+    print(f"{'query':<28} {'plan':<28} {'returned':>9} {'keys':>9} {'docs':>9} {'docs/ret':>9}")
+    for label, command in query_shapes(db):
+        try:
+            explain = db.command({"explain": command, "verbosity": "executionStats"})
+        except OperationFailure as e:
+            print(f"{label:<28} explain failed: {e}")
+            continue
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        stats = explain["executionStats"]
+        returned = stats["nReturned"]
+        docs = stats["totalDocsExamined"]
+        ratio = docs / max(returned, 1)
+        plan = "COLLSCAN" if "COLLSCAN" in stages else "+".join(sorted(stages))
+        warning = ""
+        if "COLLSCAN" in stages and command.get("filter"):
+            warning = "  <-- collection scan"
+        elif ratio > 10:
+            warning = "  <-- examines many docs per result"
+        print(
+            f"{label:<28} {plan[:28]:<28} {returned:>9} {stats['totalKeysExamined']:>9} "
+            f"{docs:>9} {ratio:>9.1f}{warning}"
+        )
+
+
+if __name__ == "__main__":
+    client = MongoClient(MONGO_CONNECTION_STRING)
+    mongo_db = client[MONGO_DB_NAME]
+    if "--advise-only" not in sys.argv:
+        ensure_indexes(mongo_db)
+    advise(mongo_db)
+    client.close()
@@ -1,35 +1,119 @@
-from typing import List, Union
+import asyncio
+import os
+import threading
+from typing import List, Optional, Union
+from urllib.parse import urlencode
 
-from fastapi import FastAPI, Depends, Form, status, HTTPException
+from fastapi import FastAPI, Depends, Form, Query, status, HTTPException
 from fastapi.responses import HTMLResponse
-from fastapi.security import HTTPBasic
-from pymongo.database import Database
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import RedirectResponse
 
+import admission
+import async_crud
 import crud
 import schemas
-from database import connect_to_mongo, close_mongo_connection, get_database
+from database import (
+    AnyDatabase,
+    MONGO_DRIVER_MODE,
+    close_mongo_connection,
+    close_mongo_connection_async,
+    connect_to_mongo,
+    connect_to_mongo_async,
+    get_async_database,
+    get_database,
+)
+from indexes import ensure_indexes, ensure_indexes_async
+from single_flight import CoalescingCrud, SingleFlight
 
 app = FastAPI()
+if admission.ADMISSION_CONTROL:
+    app.add_middleware(admission.AdmissionMiddleware)
 security = HTTPBasic()
 
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+# HTML routes that redirect after a mutation never read the returned object,
+# so they can ask crud for a bare acknowledgement instead of the full document.
+WRITE_ONLY_MUTATIONS = os.getenv("LAB3_WRITE_ONLY_MUTATIONS", "0") == "1"
+# Fan out role renames made outside the app (requires a replica set).
+WATCH_ROLE_RENAMES = os.getenv("LAB3_WATCH_ROLE_RENAMES", "0") == "1"
+
+
+class ThreadpoolCrud:
+    """Exposes the synchronous crud module as coroutines run in the threadpool."""
+
+    def __getattr__(self, name):
+        func = getattr(crud, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(func, *args, **kwargs)
+
+        return call
+
+
+if MONGO_DRIVER_MODE == "async":
+    crud_layer = async_crud
+    get_db = get_async_database
+else:
+    crud_layer = ThreadpoolCrud()
+    get_db = get_database
+
+# Concurrent identical reads share one database call.
+read_flights = SingleFlight()
+crud_layer = CoalescingCrud(crud_layer, read_flights)
+
 
 @app.on_event("startup")
 async def startup_event():
-    connect_to_mongo()
-    print("MongoDB connection established on startup.")
-    db = next(get_database())
-    if not crud.get_role_by_name(db, "admin"):
-        crud.create_role(db, schemas.RoleCreate(name="admin"))
+    if MONGO_DRIVER_MODE == "async":
+        await connect_to_mongo_async()
+        db = await anext(get_async_database())
+    else:
+        connect_to_mongo()
+        db = next(get_database())
+    print(f"MongoDB connection established on startup ({MONGO_DRIVER_MODE} driver).")
+    if MONGO_DRIVER_MODE == "async":
+        await ensure_indexes_async(db)
+    else:
+        await run_in_threadpool(ensure_indexes, db)
+    if not await crud_layer.get_role_by_name(db, "admin"):
+        await crud_layer.create_role(db, schemas.RoleCreate(name="admin"))
         print("Default 'admin' role created.")
-    if not crud.get_role_by_name(db, "user"):
-        crud.create_role(db, schemas.RoleCreate(name="user"))
+    if not await crud_layer.get_role_by_name(db, "user"):
+        await crud_layer.create_role(db, schemas.RoleCreate(name="user"))
         print("Default 'user' role created.")
+    synced = await crud_layer.sync_embedded_roles(db)
+    if synced:
+        print(f"Refreshed the embedded role of {synced} user(s).")
+    if WATCH_ROLE_RENAMES:
+        if MONGO_DRIVER_MODE == "async":
+            app.state.role_watcher = asyncio.create_task(async_crud.watch_role_renames(db))
+        else:
+            app.state.role_watcher_stop = threading.Event()
+            threading.Thread(
+                target=crud.watch_role_renames, args=(db, app.state.role_watcher_stop), daemon=True
+            ).start()
+        print("Watching 'roles' for renames.")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    close_mongo_connection()
+    role_watcher = getattr(app.state, "role_watcher", None)
+    if role_watcher is not None:
+        role_watcher.cancel()
+        try:
+            await role_watcher
+        except asyncio.CancelledError:
+            pass
+    if getattr(app.state, "role_watcher_stop", None) is not None:
+        app.state.role_watcher_stop.set()
+    if MONGO_DRIVER_MODE == "async":
+        await close_mongo_connection_async()
+    else:
+        close_mongo_connection()
     print("MongoDB connection closed on shutdown.")
 
 
@@ -60,9 +144,9 @@ async def login_page():
 async def login_user(
         username: str = Form(...),
         password: str = Form(...),
-        db: Database = Depends(get_database),
+        db: AnyDatabase = Depends(get_db),
 ):
-    user = crud.get_user_by_username(db, username)
+    user = await crud_layer.get_user_by_username(db, username)
     if not user or user.password != password:
         return HTMLResponse(
             content="""
@@ -117,9 +201,9 @@ async def register_user(
         username: str = Form(...),
         email: str = Form(...),
         password: str = Form(...),
-        db: Database = Depends(get_database),
+        db: AnyDatabase = Depends(get_db),
 ):
-    existing_user = crud.get_user_by_username(db, username)
+    existing_user = await crud_layer.get_user_by_username(db, username)
     if existing_user:
         return HTMLResponse(
             content="""
@@ -135,7 +219,7 @@ async def register_user(
             status_code=400,
         )
 
-    user_role = crud.get_role_by_name(db, "user")
+    user_role = await crud_layer.get_role_by_name(db, "user")
     if not user_role:
         return HTMLResponse(
             content="""
@@ -154,7 +238,25 @@ async def register_user(
     user_create = schemas.UserCreate(
         username=username, email=email, password=password, role_id=str(user_role.id)
     )
-    created_user = crud.create_user(db, user_create)
+    try:
+        created_user = await crud_layer.create_user(
+            db, user_create, write_only=WRITE_ONLY_MUTATIONS, role_name=user_role.name
+        )
+    except DuplicateKeyError:
+        # The unique username/email indexes catch what the check above races with.
+        return HTMLResponse(
+            content="""
+            <html>
+                <head><title>Registration Failed</title></head>
+                <body>
+                    <h1>Registration Failed</h1>
+                    <p>Username or email already taken.</p>
+                    <a href="/register">Back to Register</a>
+                </body>
+            </html>
+            """,
+            status_code=400,
+        )
     return HTMLResponse(
         content="""
         <html>
@@ -181,15 +283,15 @@ def get_html_user_list(users: List[schemas.User]):
 
 
 @app.get("/users/", response_class=HTMLResponse)
-async def read_users(db: Database = Depends(get_database)):
-    users = crud.get_users(db)
+async def read_users(db: AnyDatabase = Depends(get_db)):
+    users = await crud_layer.get_users(db)
     user_list_html = get_html_user_list(users)
     return HTMLResponse(content=f"<h1>Users</h1>{user_list_html}<a href='/'>Back to Login</a>")
 
 
 @app.get("/users/{user_id}", response_class=HTMLResponse)
-async def read_user(user_id: str, db: Database = Depends(get_database)):
-    user = crud.get_user(db, user_id)
+async def read_user(user_id: str, db: AnyDatabase = Depends(get_db)):
+    user = await crud_layer.get_user(db, user_id)
     if user:
         role_name = user.role.name if user.role else "N/A"
         return HTMLResponse(
@@ -242,11 +344,11 @@ def get_edit_user_html(user: schemas.User, roles: List[schemas.Role]):
 
 
 @app.get("/users/{user_id}/edit", response_class=HTMLResponse)
-async def edit_user_form(user_id: str, db: Database = Depends(get_database)):
-    user = crud.get_user(db, user_id)
+async def edit_user_form(user_id: str, db: AnyDatabase = Depends(get_db)):
+    user = await crud_layer.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    roles = crud.get_roles(db)
+    roles = await crud_layer.get_roles(db)
     return HTMLResponse(content=get_edit_user_html(user, roles))
 
 
@@ -256,28 +358,30 @@ async def update_user_route(
         username: str = Form(...),
         email: str = Form(...),
         role_name: str = Form(...),
-        db: Database = Depends(get_database),
+        db: AnyDatabase = Depends(get_db),
 ):
-    role = crud.get_role_by_name(db, role_name)
+    role = await crud_layer.get_role_by_name(db, role_name)
     if not role:
         raise HTTPException(status_code=400, detail="Invalid role name provided")
 
-    existing_user = crud.get_user(db, user_id)
+    existing_user = await crud_layer.get_user(db, user_id)
     if not existing_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user_update = schemas.UserCreate(
         username=username, email=email, password=existing_user.password, role_id=str(role.id)
     )
-    updated_user = crud.update_user(db, user_id, user_update)
+    updated_user = await crud_layer.update_user(
+        db, user_id, user_update, write_only=WRITE_ONLY_MUTATIONS, role_name=role.name
+    )
     if not updated_user:
         raise HTTPException(status_code=500, detail="Failed to update user")
     return RedirectResponse(url=f"/users/{user_id}", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.post("/users/{user_id}/delete", response_class=HTMLResponse)
-async def delete_user_route(user_id: str, db: Database = Depends(get_database)):
-    deleted_user = crud.delete_user(db, user_id)
+async def delete_user_route(user_id: str, db: AnyDatabase = Depends(get_db)):
+    deleted_user = await crud_layer.delete_user(db, user_id)
     if not deleted_user:
         raise HTTPException(status_code=404, detail="User not found")
     return RedirectResponse(url="/users/", status_code=status.HTTP_303_SEE_OTHER)
@@ -329,17 +433,58 @@ def get_html_item_list(items: List[schemas.Item]):
     return item_list_html
 
 
+def get_html_pagination(base_url: str, limit: int, sort: str,
+                        next_cursor: Optional[str], prev_cursor: Optional[str]):
+    links = []
+    if prev_cursor:
+        query = urlencode({"cursor": prev_cursor, "limit": limit, "sort": sort})
+        links.append(f"<a href='{base_url}?{query}'>&laquo; Previous</a>")
+    if next_cursor:
+        query = urlencode({"cursor": next_cursor, "limit": limit, "sort": sort})
+        links.append(f"<a href='{base_url}?{query}'>Next &raquo;</a>")
+    return f"<p>{' | '.join(links)}</p>" if links else ""
+
+
+async def get_admin_user(credentials: HTTPBasicCredentials = Depends(security), db: AnyDatabase = Depends(get_db)):
+    user = await crud_layer.get_user_by_username(db, credentials.username)
+    if not user or user.password != credentials.password:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    if not user.role or user.role.name != "admin":
+        raise HTTPException(status_code=403, detail="You do not have access to this resource")
+    return user
+
+
+@app.get("/single-flight/stats")
+async def single_flight_stats(user: schemas.User = Depends(get_admin_user)):
+    return read_flights.snapshot()
+
+
+@app.get("/admission/stats")
+async def admission_stats(user: schemas.User = Depends(get_admin_user)):
+    return admission.snapshot()
+
+
 @app.get("/items-found", response_class=HTMLResponse)
-async def read_items(db: Database = Depends(get_database)):
-    items = crud.get_items(db)
+async def read_items(
+        cursor: Optional[str] = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        sort: str = "_id",
+        db: AnyDatabase = Depends(get_db),
+):
+    items, next_cursor, prev_cursor = await crud_layer.get_items_page(db, limit=limit, cursor=cursor, sort_field=sort)
     items_list_html = get_html_item_list(items)
+    pagination_html = get_html_pagination("/items-found", limit, sort, next_cursor, prev_cursor)
     return HTMLResponse(
-        content=f"<h1>Found Items</h1>{items_list_html}<p><a href='/create-item-form'>Add New Item</a></p><a href='/'>Back to Login</a>")
+        content=f"<h1>Found Items</h1>{items_list_html}{pagination_html}<p><a href='/create-item-form'>Add New Item</a></p><a href='/'>Back to Login</a>")
 
 
 @app.get("/items-found/{item_id}", response_class=HTMLResponse)
-async def read_item(item_id: str, db: Database = Depends(get_database)):
-    item = crud.get_item(db, item_id)
+async def read_item(item_id: str, db: AnyDatabase = Depends(get_db)):
+    item = await crud_layer.get_item(db, item_id)
     if item:
         return HTMLResponse(
             content=f"""
@@ -384,9 +529,9 @@ async def create_item_form():
 
 
 @app.post("/create-item", response_class=HTMLResponse)
-async def create_item_route(name: str = Form(...), description: str = Form(...), db: Database = Depends(get_database)):
+async def create_item_route(name: str = Form(...), description: str = Form(...), db: AnyDatabase = Depends(get_db)):
     new_item = schemas.ItemCreate(name=name, description=description)
-    created_item = crud.create_item(db, new_item)
+    created_item = await crud_layer.create_item(db, new_item, write_only=WRITE_ONLY_MUTATIONS)
     return RedirectResponse(url="/items-found", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -412,8 +557,8 @@ def get_edit_item_html(item: Union[schemas.Item, schemas.LostItem], action_url:
 
 
 @app.get("/items-found/{item_id}/edit", response_class=HTMLResponse)
-async def edit_item_form(item_id: str, db: Database = Depends(get_database)):
-    item = crud.get_item(db, item_id)
+async def edit_item_form(item_id: str, db: AnyDatabase = Depends(get_db)):
+    item = await crud_layer.get_item(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     return HTMLResponse(content=get_edit_item_html(item, f"/items-found/{item_id}/edit"))
@@ -424,18 +569,18 @@ async def update_item_route(
         item_id: str,
         name: str = Form(...),
         description: str = Form(...),
-        db: Database = Depends(get_database)
+        db: AnyDatabase = Depends(get_db)
 ):
     item_update = schemas.ItemCreate(name=name, description=description)
-    updated_item = crud.update_item(db, item_id, item_update)
+    updated_item = await crud_layer.update_item(db, item_id, item_update, write_only=WRITE_ONLY_MUTATIONS)
     if not updated_item:
         raise HTTPException(status_code=500, detail="Failed to update item")
     return RedirectResponse(url="/items-found", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.post("/items-found/{item_id}/delete", response_class=HTMLResponse)
-async def delete_item_route(item_id: str, db: Database = Depends(get_database)):
-    deleted_item = crud.delete_item(db, item_id)
+async def delete_item_route(item_id: str, db: AnyDatabase = Depends(get_db)):
+    deleted_item = await crud_layer.delete_item(db, item_id)
     if not deleted_item:
         raise HTTPException(status_code=404, detail="Item not found")
     return RedirectResponse(url="/items-found", status_code=status.HTTP_303_SEE_OTHER)
@@ -488,16 +633,23 @@ def get_html_lost_item_list(items: List[schemas.LostItem]):
 
 
 @app.get("/items-lost", response_class=HTMLResponse)
-async def read_lost_items(db: Database = Depends(get_database)):
-    lost_items = crud.get_lost_items(db)
+async def read_lost_items(
+        cursor: Optional[str] = None,
+        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        sort: str = "_id",
+        db: AnyDatabase = Depends(get_db),
+):
+    lost_items, next_cursor, prev_cursor = await crud_layer.get_lost_items_page(
+        db, limit=limit, cursor=cursor, sort_field=sort)
     lost_items_list_html = get_html_lost_item_list(lost_items)
+    pagination_html = get_html_pagination("/items-lost", limit, sort, next_cursor, prev_cursor)
     return HTMLResponse(
-        content=f"<h1>Lost Items</h1>{lost_items_list_html}<p><a href='/create-lost-item-form'>Add New Lost Item</a></p><a href='/'>Back to Login</a>")
+        content=f"<h1>Lost Items</h1>{lost_items_list_html}{pagination_html}<p><a href='/create-lost-item-form'>Add New Lost Item</a></p><a href='/'>Back to Login</a>")
 
 
 @app.get("/items-lost/{item_id}", response_class=HTMLResponse)
-async def read_lost_item(item_id: str, db: Database = Depends(get_database)):
-    item = crud.get_lost_item(db, item_id)
+async def read_lost_item(item_id: str, db: AnyDatabase = Depends(get_db)):
+    item = await crud_layer.get_lost_item(db, item_id)
     if item:
         return HTMLResponse(
             content=f"""
@@ -522,15 +674,15 @@ async def create_lost_item_form():
 
 @app.post("/create-lost-item", response_class=HTMLResponse)
 async def create_lost_item_route(name: str = Form(...), description: str = Form(...),
-                                 db: Database = Depends(get_database)):
+                                 db: AnyDatabase = Depends(get_db)):
     new_item = schemas.LostItemCreate(name=name, description=description)
-    created_item = crud.create_lost_item(db, new_item)
+    created_item = await crud_layer.create_lost_item(db, new_item, write_only=WRITE_ONLY_MUTATIONS)
     return RedirectResponse(url="/items-lost", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.get("/items-lost/{item_id}/edit", response_class=HTMLResponse)
-async def edit_lost_item_form(item_id: str, db: Database = Depends(get_database)):
-    item = crud.get_lost_item(db, item_id)
+async def edit_lost_item_form(item_id: str, db: AnyDatabase = Depends(get_db)):
+    item = await crud_layer.get_lost_item(db, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     return HTMLResponse(content=get_edit_item_html(item, f"/items-lost/{item_id}/edit"))
@@ -541,18 +693,18 @@ async def update_lost_item_route(
         item_id: str,
         name: str = Form(...),
         description: str = Form(...),
-        db: Database = Depends(get_database)
+        db: AnyDatabase = Depends(get_db)
 ):
     lost_item_update = schemas.LostItemCreate(name=name, description=description)
-    updated_item = crud.update_lost_item(db, item_id, lost_item_update)
+    updated_item = await crud_layer.update_lost_item(db, item_id, lost_item_update, write_only=WRITE_ONLY_MUTATIONS)
     if not updated_item:
         raise HTTPException(status_code=500, detail="Failed to update lost item")
     return RedirectResponse(url="/items-lost", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.post("/delete-lost-item/{item_id}", response_class=HTMLResponse)
-async def delete_lost_item_route(item_id: str, db: Database = Depends(get_database)):
-    deleted_item = crud.delete_lost_item(db, item_id)
+async def delete_lost_item_route(item_id: str, db: AnyDatabase = Depends(get_db)):
+    deleted_item = await crud_layer.delete_lost_item(db, item_id)
     if not deleted_item:
         raise HTTPException(status_code=404, detail="Lost Item not found")
     return RedirectResponse(url="/items-lost", status_code=status.HTTP_303_SEE_OTHER)
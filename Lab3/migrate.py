@@ -1,8 +1,13 @@
 import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timezone
 
 import psycopg2
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import DeleteMany, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
 
 PG_USER = "postgres"
 PG_PASSWORD = "6497"
@@ -13,6 +18,20 @@ PG_DB_NAME = "WEBPython"
 MONGO_DB_URL = "mongodb://localhost:27017/"
 MONGO_DB_NAME = "web_lab_db"
 
+# Rows fetched from PostgreSQL and inserted into MongoDB per round trip.
+BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", "5000"))
+# A table is copied as ranges of this many primary-key values, RANGE_WORKERS
+# ranges at a time, each on its own PostgreSQL connection.
+RANGE_SIZE = int(os.getenv("MIGRATE_RANGE_SIZE", "100000"))
+RANGE_WORKERS = int(os.getenv("MIGRATE_RANGE_WORKERS", "2"))
+# One document per table, {"_id": table, "ranges", "last_id", "rows", "done"},
+# and one per range, {"_id": "table:start", "table", "last_id", "rows", "done"}.
+CHECKPOINT_COLLECTION = "migration_checkpoints"
+DUPLICATE_KEY_ERROR = 11000
+MIGRATED_TABLES = ("roles", "users", "items", "lost_items")
+# Optional PostgreSQL table fed by triggers (see install_changelog).
+CHANGELOG_TABLE = "migration_changelog"
+
 
 def get_pg_connection():
     """Establishes and returns a PostgreSQL database connection."""
@@ -44,7 +63,387 @@ def get_mongo_client():
         return None
 
 
-def migrate_data():
+def stream_rows(pg_conn, cursor_name: str, query: str, params: tuple, batch_size: int):
+    """
+    Yields lists of up to `batch_size` rows from a server-side (named) cursor,
+    so only one batch is held in memory however large the table is.
+    """
+    with pg_conn.cursor(name=cursor_name) as pg_cursor:
+        pg_cursor.itersize = batch_size
+        pg_cursor.execute(query, params)
+        while True:
+            rows = pg_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def _is_pg_id_duplicate(error: dict) -> bool:
+    if error["code"] != DUPLICATE_KEY_ERROR:
+        return False
+    key_pattern = error.get("keyPattern")
+    if key_pattern is not None:
+        return list(key_pattern) == ["pg_id"]
+    # Servers before 4.2 only name the index in the message.
+    return "pg_id_unique" in error.get("errmsg", "")
+
+
+def insert_batch(collection, docs: list):
+    """
+    Unordered insert_many that tolerates rows already copied. After a crash
+    between an insert and its checkpoint, the first resumed batch is re-sent
+    and its duplicates are rejected by the unique pg_id index. Any other
+    error, including a duplicate on another unique index such as
+    users.username, is raised: those rows were not copied.
+    """
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if not all(_is_pg_id_duplicate(error) for error in e.details["writeErrors"]):
+            raise
+
+
+def copy_range(
+        pg_conn, mongo_db, table: str, columns: str, label: str, to_doc, batch_size: int, first_id: int, last_id: int
+) -> int:
+    """
+    Streams the rows of `table` with first_id <= id <= last_id into the Mongo
+    collection of the same name, in primary-key order, one unordered
+    insert_many per batch. After every batch it records the last copied id in
+    the range's checkpoint, and resumes after that id if the range was
+    started before. Returns the rows the range holds in MongoDB.
+    """
+    collection = mongo_db[table]
+    checkpoints = mongo_db[CHECKPOINT_COLLECTION]
+    checkpoint_id = f"{table}:{first_id}"
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        return checkpoint["rows"]
+    after_id, total = (checkpoint["last_id"], checkpoint["rows"]) if checkpoint else (first_id - 1, 0)
+    copied = 0
+
+    query = f"SELECT {columns} FROM {table} WHERE id > %s AND id <= %s ORDER BY id"
+    cursor_name = f"migrate_{table}_{first_id}"
+    start = time.perf_counter()
+    for rows in stream_rows(pg_conn, cursor_name, query, (after_id, last_id), batch_size):
+        docs = [doc for doc in map(to_doc, rows) if doc is not None]
+        if docs:
+            insert_batch(collection, docs)
+        total += len(docs)
+        copied += len(docs)
+        checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"table": table, "last_id": rows[-1][0], "rows": total, "done": False,
+                      "updated_at": time.time()}},
+            upsert=True,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"  {label}: PG ids {rows[0][0]}-{rows[-1][0]} of range {first_id}-{last_id}, {total} in range, "
+              f"{copied / elapsed if elapsed else 0:.0f} rows/sec")
+    checkpoints.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"table": table, "last_id": last_id, "rows": total, "done": True, "updated_at": time.time()}},
+        upsert=True,
+    )
+    print(f"  {label}: PG ids {first_id}-{last_id} done, {total} rows in {time.perf_counter() - start:.1f}s")
+    return total
+
+
+def plan_ranges(pg_conn, table: str, after_id: int) -> list:
+    """[first_id, last_id] ranges of RANGE_SIZE ids covering the rows of `table` after `after_id`."""
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"SELECT min(id), max(id) FROM {table} WHERE id > %s", (after_id,))
+        low, high = pg_cursor.fetchone()
+    pg_conn.rollback()
+    if low is None:
+        return []
+    return [[first, min(first + RANGE_SIZE - 1, high)] for first in range(low, high + 1, RANGE_SIZE)]
+
+
+def copy_table(
+        pg_conn, mongo_db, table: str, columns: str, label: str, to_doc, batch_size: int, marks: dict
+) -> int:
+    """
+    Copies `table` into the Mongo collection of the same name as primary-key
+    ranges (see copy_range), RANGE_WORKERS at a time. The ranges are planned
+    once and stored in the table's checkpoint. A table with a checkpoint
+    resumes every unfinished range where it stopped. A table without one is
+    wiped and copied from the start. Rows inserted after the planning are
+    left to the delta sync. `to_doc` maps a row (id first) to a document, or
+    to None to skip the row. `marks` (see sync_marks) are stored with a new
+    checkpoint as the point the first delta sync continues from.
+    """
+    collection = mongo_db[table]
+    checkpoints = mongo_db[CHECKPOINT_COLLECTION]
+    checkpoint = checkpoints.find_one({"_id": table})
+
+    if checkpoint and checkpoint.get("done"):
+        print(f"--- {label}: already migrated ({checkpoint['rows']} rows), skipping ---")
+        return checkpoint["rows"]
+    if checkpoint and "ranges" in checkpoint:
+        ranges, rows_before = checkpoint["ranges"], checkpoint.get("rows_before_ranges", 0)
+        print(f"--- {label}: resuming {len(ranges)} PG id ranges ---")
+    else:
+        if checkpoint:
+            # Written by a version that copied the table as one range.
+            after_id, rows_before = checkpoint["last_id"], checkpoint["rows"]
+        else:
+            after_id, rows_before = 0, 0
+            collection.delete_many({})
+            checkpoints.delete_many({"table": table})
+        ranges = plan_ranges(pg_conn, table, after_id)
+        checkpoints.update_one(
+            {"_id": table},
+            {"$set": {"ranges": ranges, "rows_before_ranges": rows_before, "done": False,
+                      "updated_at": time.time()},
+             "$setOnInsert": {"last_id": after_id, "rows": rows_before, **marks}},
+            upsert=True,
+        )
+        print(f"--- {label}: copying {len(ranges)} PG id ranges ---")
+    collection.create_index(
+        "pg_id", name="pg_id_unique", unique=True, partialFilterExpression={"pg_id": {"$exists": True}}
+    )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=RANGE_WORKERS) as executor:
+        range_rows = list(executor.map(
+            lambda bounds: table_worker(copy_range, mongo_db, table, columns, label, to_doc, batch_size, *bounds),
+            ranges,
+        ))
+    total = rows_before + sum(range_rows)
+    last_id = ranges[-1][1] if ranges else checkpoints.find_one({"_id": table})["last_id"]
+    checkpoints.update_one(
+        {"_id": table},
+        {"$set": {"last_id": last_id, "rows": total, "done": True, "updated_at": time.time()}},
+    )
+    print(f"--- {label} Migration Complete: {total} rows in {time.perf_counter() - start:.1f}s ---")
+    return total
+
+
+def changelog_installed(pg_conn) -> bool:
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (CHANGELOG_TABLE,))
+        return pg_cursor.fetchone()[0]
+
+
+def install_changelog(pg_conn):
+    """
+    Creates CHANGELOG_TABLE and row triggers that log every insert, update and
+    delete on the migrated tables, so delta syncs also see deletes and updates
+    to tables without an updated_at column. Install it before the full
+    migration so no change falls between the copy and the first delta.
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHANGELOG_TABLE} (
+                id BIGSERIAL PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                op CHAR(1) NOT NULL,
+                changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            CREATE INDEX IF NOT EXISTS {CHANGELOG_TABLE}_table_id ON {CHANGELOG_TABLE} (table_name, id);
+            CREATE OR REPLACE FUNCTION {CHANGELOG_TABLE}_log() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    INSERT INTO {CHANGELOG_TABLE} (table_name, row_id, op) VALUES (TG_TABLE_NAME, OLD.id, 'D');
+                    RETURN OLD;
+                END IF;
+                INSERT INTO {CHANGELOG_TABLE} (table_name, row_id, op) VALUES (TG_TABLE_NAME, NEW.id, left(TG_OP, 1));
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        for table in MIGRATED_TABLES:
+            pg_cursor.execute(f"""
+                DROP TRIGGER IF EXISTS {table}_changelog ON {table};
+                CREATE TRIGGER {table}_changelog AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION {CHANGELOG_TABLE}_log();
+            """)
+    pg_conn.commit()
+    print(f"Change log '{CHANGELOG_TABLE}' and triggers installed on: {', '.join(MIGRATED_TABLES)}")
+
+
+def sync_marks(pg_conn) -> dict:
+    """
+    PostgreSQL's clock and change log position, read before a copy or sync
+    reads any rows, so whatever commits meanwhile is picked up next time.
+    """
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute("SELECT now()")
+        marks = {"synced_at": pg_cursor.fetchone()[0], "last_change_id": None}
+        if changelog_installed(pg_conn):
+            pg_cursor.execute(f"SELECT coalesce(max(id), 0) FROM {CHANGELOG_TABLE}")
+            marks["last_change_id"] = pg_cursor.fetchone()[0]
+    pg_conn.rollback()
+    return marks
+
+
+def has_updated_at(pg_conn, table: str) -> bool:
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'updated_at'",
+            (table,),
+        )
+        return pg_cursor.fetchone() is not None
+
+
+def upsert_batch(collection, docs: list, deleted_pg_ids: list = ()) -> tuple:
+    """
+    One unordered bulk_write of upserts keyed on pg_id, plus deletes.
+    Returns (inserted, updated, deleted) counts.
+    """
+    requests = [UpdateOne({"pg_id": doc["pg_id"]}, {"$set": doc}, upsert=True) for doc in docs]
+    if deleted_pg_ids:
+        requests.append(DeleteMany({"pg_id": {"$in": list(deleted_pg_ids)}}))
+    if not requests:
+        return 0, 0, 0
+    result = collection.bulk_write(requests, ordered=False)
+    return result.upserted_count, result.modified_count, result.deleted_count
+
+
+def sync_table(
+        pg_conn, mongo_db, table: str, columns: str, label: str, to_doc, batch_size: int, marks: dict
+) -> int:
+    """
+    Copies only what changed in `table` since the last full copy or sync and
+    upserts it by pg_id. Uses, in order of preference: the change log (new,
+    updated and deleted rows), the updated_at column (new and updated rows),
+    or the id high-water mark alone (new rows).
+    """
+    collection = mongo_db[table]
+    checkpoints = mongo_db[CHECKPOINT_COLLECTION]
+    state = checkpoints.find_one({"_id": table})
+    if not state or not state.get("done"):
+        print(f"--- {label}: no completed full migration, run without --delta first ---")
+        return 0
+
+    last_id = state.get("last_id", 0)
+    inserted = updated = deleted = 0
+    start = time.perf_counter()
+
+    if state.get("last_change_id") is not None and marks["last_change_id"] is not None:
+        mode = "change log"
+        query = (f"SELECT DISTINCT row_id FROM {CHANGELOG_TABLE} "
+                 f"WHERE table_name = %s AND id > %s AND id <= %s ORDER BY row_id")
+        params = (table, state["last_change_id"], marks["last_change_id"])
+        for id_rows in stream_rows(pg_conn, f"sync_{table}_changes", query, params, batch_size):
+            pg_ids = [row[0] for row in id_rows]
+            with pg_conn.cursor() as pg_cursor:
+                pg_cursor.execute(f"SELECT {columns} FROM {table} WHERE id = ANY(%s)", (pg_ids,))
+                rows = pg_cursor.fetchall()
+            # Rows logged as changed but gone from the table were deleted.
+            present = {row[0] for row in rows}
+            docs = [doc for doc in map(to_doc, rows) if doc is not None]
+            batch_inserted, batch_updated, batch_deleted = upsert_batch(
+                collection, docs, [pg_id for pg_id in pg_ids if pg_id not in present])
+            inserted += batch_inserted
+            updated += batch_updated
+            deleted += batch_deleted
+            last_id = max([last_id, *present])
+    else:
+        if has_updated_at(pg_conn, table) and state.get("synced_at"):
+            mode = "updated_at"
+            query = f"SELECT {columns} FROM {table} WHERE id > %s OR updated_at >= %s ORDER BY id"
+            # pymongo hands datetimes back as naive UTC.
+            params = (last_id, state["synced_at"].replace(tzinfo=timezone.utc))
+        else:
+            mode = "id high-water mark"
+            query = f"SELECT {columns} FROM {table} WHERE id > %s ORDER BY id"
+            params = (last_id,)
+        for rows in stream_rows(pg_conn, f"sync_{table}", query, params, batch_size):
+            docs = [doc for doc in map(to_doc, rows) if doc is not None]
+            batch_inserted, batch_updated, _ = upsert_batch(collection, docs)
+            inserted += batch_inserted
+            updated += batch_updated
+            last_id = max(last_id, rows[-1][0])
+
+    checkpoints.update_one(
+        {"_id": table},
+        {
+            "$set": {"last_id": last_id, "updated_at": time.time(), **marks},
+            "$inc": {"rows": inserted - deleted},
+        },
+    )
+    print(f"--- {label}: {inserted} inserted, {updated} updated, {deleted} deleted via {mode} "
+          f"in {time.perf_counter() - start:.1f}s ---")
+    return inserted + updated + deleted
+
+
+def role_to_doc(row):
+    pg_id, name = row
+    return {"pg_id": pg_id, "name": name}
+
+
+def make_user_to_doc(roles_by_pg_id: dict):
+    def user_to_doc(row):
+        pg_id, username, email, password_hash, pg_role_id = row
+        role = roles_by_pg_id.get(pg_role_id)
+        if not role:
+            print(f"Warning: Role ID {pg_role_id} not found in map for user '{username}'. Skipping user.")
+            return None
+        return {
+            "pg_id": pg_id,
+            "username": username,
+            "email": email,
+            "password": password_hash,
+            "role_id": role["_id"],
+            "role": {"_id": role["_id"], "name": role["name"]},
+        }
+
+    return user_to_doc
+
+
+def item_to_doc(row):
+    pg_id, name, description = row
+    return {"pg_id": pg_id, "name": name, "description": description}
+
+
+def table_worker(copy_function, mongo_db, *args) -> int:
+    """
+    Runs copy_table, copy_range or sync_table on its own PostgreSQL
+    connection (psycopg2 connections are not shared across threads).
+    """
+    pg_conn = get_pg_connection()
+    if not pg_conn:
+        raise RuntimeError("No PostgreSQL connection")
+    try:
+        return copy_function(pg_conn, mongo_db, *args)
+    finally:
+        pg_conn.close()
+
+
+def run_tables_in_parallel(copy_function, mongo_db, tables: list, batch_size: int, marks: dict) -> list:
+    """Runs `copy_function` for every (table, columns, label, to_doc) concurrently; returns failed labels."""
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+        futures = {
+            executor.submit(table_worker, copy_function, mongo_db, table, columns, label, to_doc,
+                            batch_size, marks): label
+            for table, columns, label, to_doc in tables
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                print(f"\nAn error occurred while migrating {futures[future]}: {e}")
+    return failed
+
+
+def dependent_tables(roles_by_pg_id: dict) -> list:
+    return [
+        ("users", "id, username, email, password, role_id", "Users", make_user_to_doc(roles_by_pg_id)),
+        ("items", "id, name, description", "Found Items", item_to_doc),
+        ("lost_items", "id, name, description", "Lost Items", item_to_doc),
+    ]
+
+
+def migrated_roles(mongo_db) -> dict:
+    return {doc["pg_id"]: doc for doc in mongo_db.roles.find({"pg_id": {"$exists": True}})}
+
+
+def migrate_data(batch_size: int = BATCH_SIZE, restart: bool = False):
     pg_conn = None
     mongo_client = None
     try:
@@ -59,96 +458,87 @@ def migrate_data():
             return
 
         mongo_db = mongo_client[MONGO_DB_NAME]
+        if restart:
+            mongo_db[CHECKPOINT_COLLECTION].drop()
+            print("Checkpoints cleared, copying everything from scratch.")
+
+        marks = sync_marks(pg_conn)
 
+        # Users reference roles by Mongo id, so roles go first, on their own.
         print("\n--- Migrating Roles ---")
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute("SELECT id, name FROM roles ORDER BY id")
-        pg_roles = pg_cursor.fetchall()
-        pg_cursor.close()
-
-        mongo_roles_collection = mongo_db.roles
-        mongo_roles_collection.delete_many({})
-
-        role_id_map = {}
-        for pg_id, name in pg_roles:
-            role_doc = {"name": name}
-            result = mongo_roles_collection.insert_one(role_doc)
-            role_id_map[pg_id] = result.inserted_id
-            print(f"Migrated Role: '{name}' (PG ID: {pg_id}) to Mongo ID: {result.inserted_id}")
-
-        print("\n--- Roles Migration Complete ---")
+        copy_table(pg_conn, mongo_db, "roles", "id, name", "Roles", role_to_doc, batch_size, marks)
+        roles_by_pg_id = migrated_roles(mongo_db)
+        role_id_map = {pg_id: doc["_id"] for pg_id, doc in roles_by_pg_id.items()}
         print(f"Role ID Map: {json.dumps({k: str(v) for k, v in role_id_map.items()}, indent=2)}")
 
-        print("\n--- Migrating Users ---")
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute("SELECT id, username, email, password, role_id FROM users ORDER BY id")
-        pg_users = pg_cursor.fetchall()
-        pg_cursor.close()
-
-        mongo_users_collection = mongo_db.users
-        mongo_users_collection.delete_many({})
-
-        for pg_id, username, email, password_hash, pg_role_id in pg_users:
-            mongo_role_id = role_id_map.get(pg_role_id)
-            if not mongo_role_id:
-                print(f"Warning: Role ID {pg_role_id} not found in map for user '{username}'. Skipping user.")
-                continue
-
-            user_doc = {
-                "username": username,
-                "email": email,
-                "password": password_hash,
-                "role_id": mongo_role_id
-            }
-            result = mongo_users_collection.insert_one(user_doc)
-            print(f"Migrated User: '{username}' (PG ID: {pg_id}) to Mongo ID: {result.inserted_id}")
-
-        print("\n--- Users Migration Complete ---")
-
-        print("\n--- Migrating Found Items ---")
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute("SELECT id, name, description FROM items ORDER BY id")
-        pg_items = pg_cursor.fetchall()
-        pg_cursor.close()
-
-        mongo_items_collection = mongo_db.items
-        mongo_items_collection.delete_many({})
+        print("\n--- Migrating Users, Found Items and Lost Items in parallel ---")
+        failed = run_tables_in_parallel(
+            copy_table, mongo_db, dependent_tables(roles_by_pg_id), batch_size, marks)
 
-        for pg_id, name, description in pg_items:
-            item_doc = {"name": name, "description": description}
-            result = mongo_items_collection.insert_one(item_doc)
-            print(f"Migrated Found Item: '{name}' (PG ID: {pg_id}) to Mongo ID: {result.inserted_id}")
+        if failed:
+            print(f"\n--- Migration incomplete ({', '.join(failed)}); re-run to resume from the checkpoints ---")
+        else:
+            print("\n--- All Data Migration Finished Successfully! ---")
 
-        print("\n--- Found Items Migration Complete ---")
-
-        print("\n--- Migrating Lost Items ---")
-        pg_cursor = pg_conn.cursor()
-        pg_cursor.execute("SELECT id, name, description FROM lost_items ORDER BY id")
-        pg_lost_items = pg_cursor.fetchall()
-        pg_cursor.close()
-
-        mongo_lost_items_collection = mongo_db.lost_items
-        mongo_lost_items_collection.delete_many({})
+    except Exception as e:
+        print(f"\nAn error occurred during migration: {e}")
+    finally:
+        if pg_conn:
+            pg_conn.close()
+            print("PostgreSQL connection closed.")
+        if mongo_client:
+            mongo_client.close()
+            print("MongoDB connection closed.")
 
-        for pg_id, name, description in pg_lost_items:
-            lost_item_doc = {"name": name, "description": description}
-            result = mongo_lost_items_collection.insert_one(lost_item_doc)
-            print(f"Migrated Lost Item: '{name}' (PG ID: {pg_id}) to Mongo ID: {result.inserted_id}")
 
-        print("\n--- Lost Items Migration Complete ---")
+def sync_data(batch_size: int = BATCH_SIZE):
+    """Incremental mode: copies only rows added, changed or deleted since the last run."""
+    pg_conn = None
+    mongo_client = None
+    try:
+        pg_conn = get_pg_connection()
+        mongo_client = get_mongo_client()
+        if not pg_conn or not mongo_client:
+            print("Aborting sync due to a connection error.")
+            return
 
-        print("\n--- All Data Migration Finished Successfully! ---")
+        mongo_db = mongo_client[MONGO_DB_NAME]
+        marks = sync_marks(pg_conn)
+
+        print("\n--- Syncing Roles ---")
+        sync_table(pg_conn, mongo_db, "roles", "id, name", "Roles", role_to_doc, batch_size, marks)
+        roles_by_pg_id = migrated_roles(mongo_db)
+        for role in roles_by_pg_id.values():
+            # Keep the role copies embedded in users in step with renames.
+            mongo_db.users.update_many(
+                {"role_id": role["_id"], "role.name": {"$ne": role["name"]}},
+                {"$set": {"role": {"_id": role["_id"], "name": role["name"]}}},
+            )
+
+        print("\n--- Syncing Users, Found Items and Lost Items in parallel ---")
+        failed = run_tables_in_parallel(
+            sync_table, mongo_db, dependent_tables(roles_by_pg_id), batch_size, marks)
+        if failed:
+            print(f"\n--- Sync incomplete ({', '.join(failed)}); re-run to retry ---")
+        else:
+            print("\n--- Delta Sync Finished Successfully! ---")
 
     except Exception as e:
-        print(f"\nAn error occurred during migration: {e}")
+        print(f"\nAn error occurred during sync: {e}")
     finally:
         if pg_conn:
             pg_conn.close()
-            print("PostgreSQL connection closed.")
         if mongo_client:
             mongo_client.close()
-            print("MongoDB connection closed.")
 
 
 if __name__ == "__main__":
-    migrate_data()
+    if "--install-changelog" in sys.argv:
+        conn = get_pg_connection()
+        if conn:
+            install_changelog(conn)
+            conn.close()
+    elif "--delta" in sys.argv:
+        sync_data()
+    else:
+        migrate_data(restart="--restart" in sys.argv)
@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing for read-only crud calls.
+
+While a read is in flight, identical calls (same function and arguments,
+ignoring the database handle) await the same task instead of issuing their
+own query, so a burst of requests for a just-invalidated listing costs one
+round trip. A caller can get a result computed from a query that started
+shortly before it arrived. That is the same staleness window a read already
+has, so only reads are coalesced.
+"""
+import asyncio
+
+# crud functions that only read and return values that are safe to share.
+COALESCED_READS = {
+    "get_items",
+    "get_items_page",
+    "get_item",
+    "get_lost_items",
+    "get_lost_items_page",
+    "get_lost_item",
+    "get_users",
+    "get_user",
+    "get_user_by_username",
+    "get_roles",
+    "get_roles_page",
+    "get_role",
+    "get_role_by_name",
+}
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def do(self, key, call):
+        """Awaits call() once per key at a time; concurrent callers share its result."""
+        self.stats["calls"] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats["executed"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        # A cancelled caller (client disconnect) must not cancel the shared task.
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, in_flight=len(self._in_flight))
+
+
+class CoalescingCrud:
+    """
+    Wraps a crud layer (async_crud or ThreadpoolCrud) so that the functions in
+    COALESCED_READS go through a SingleFlight. Signatures are unchanged, and
+    every other function is passed through untouched.
+    """
+
+    def __init__(self, layer, flights: SingleFlight):
+        self._layer = layer
+        self.flights = flights
+
+    def __getattr__(self, name):
+        func = getattr(self._layer, name)
+        if name not in COALESCED_READS:
+            return func
+
+        async def call(db, *args, **kwargs):
+            try:
+                key = (name, args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                return await func(db, *args, **kwargs)
+            return await self.flights.do(key, lambda: func(db, *args, **kwargs))
+
+        return call
@@ -0,0 +1,63 @@
+"""
+Post-migration check for migrate.py: compares per-table row counts and
+per-pg_id-range content hashes between PostgreSQL and MongoDB. PostgreSQL
+hashes its chunks in SQL; MongoDB documents are streamed with a projection
+and hashed the same way. Tables run in parallel and only mismatching id
+ranges are reported. Documents created by the app (no pg_id) are ignored.
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient
+
+from migrate import BATCH_SIZE, MONGO_DB_NAME, MONGO_DB_URL, PG_DB_NAME, PG_HOST, PG_PASSWORD, PG_PORT, PG_USER
+from verify_chunks import CHUNK_SIZE, TABLE_COLUMNS, compare, pg_chunk_hashes, row_hash
+
+PG_PARAMS = {"user": PG_USER, "password": PG_PASSWORD, "host": PG_HOST, "port": PG_PORT, "dbname": PG_DB_NAME}
+
+
+def mongo_chunk_hashes(mongo_db, table: str, columns: tuple, role_pg_ids: dict) -> dict:
+    """
+    The fields are the PostgreSQL columns with id -> pg_id, and users.role_id
+    mapped back to the role's pg_id.
+    """
+    fields = ["pg_id" if column == "id" else column for column in columns]
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    chunks = {}
+    docs = mongo_db[table].find({"pg_id": {"$exists": True}}, projection).batch_size(BATCH_SIZE)
+    for doc in docs:
+        values = [doc.get(field) for field in fields]
+        if table == "users":
+            values[-1] = role_pg_ids.get(doc.get("role_id"))
+        chunk = doc["pg_id"] // CHUNK_SIZE
+        count, total = chunks.get(chunk, (0, 0))
+        chunks[chunk] = (count + 1, total + row_hash(*values))
+    return chunks
+
+
+def verify_migration() -> bool:
+    mongo_client = MongoClient(MONGO_DB_URL)
+    mongo_db = mongo_client[MONGO_DB_NAME]
+    try:
+        role_pg_ids = {
+            doc["_id"]: doc["pg_id"]
+            for doc in mongo_db.roles.find({"pg_id": {"$exists": True}}, {"pg_id": 1})
+        }
+        with ThreadPoolExecutor(max_workers=2 * len(TABLE_COLUMNS)) as executor:
+            futures = {
+                table: (executor.submit(pg_chunk_hashes, PG_PARAMS, table, columns),
+                        executor.submit(mongo_chunk_hashes, mongo_db, table, columns, role_pg_ids))
+                for table, columns in TABLE_COLUMNS.items()
+            }
+            results = [
+                compare(table, source.result(), target.result(), ("postgres", "rows"), ("mongo", "docs"), "pg_ids")
+                for table, (source, target) in futures.items()
+            ]
+    finally:
+        mongo_client.close()
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_migration() else 1)
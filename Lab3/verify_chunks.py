@@ -0,0 +1,64 @@
+"""
+Chunked content hashes for verify.py. A table is split into ranges of
+CHUNK_SIZE PostgreSQL ids, and each range is summarised as (row count, sum
+of 48-bit row hashes). The hashes match Lab2's, so a database checked
+against SQLite there hashes to the same chunks here.
+"""
+import hashlib
+
+import psycopg2
+
+# Rows per compared id range. Row hashes are 48-bit, so a chunk's sum stays
+# well inside 64-bit integers (SQLite, PostgreSQL bigint).
+CHUNK_SIZE = 10000
+TABLE_COLUMNS = {
+    "roles": ("id", "name"),
+    "users": ("id", "username", "email", "password", "role_id"),
+    "items": ("id", "name", "description"),
+    "lost_items": ("id", "name", "description"),
+}
+NULL = "\\N"
+SEPARATOR = "\x1f"
+
+
+def row_hash(*values) -> int:
+    """48-bit hash of a row, identical to the expression in pg_chunk_hashes."""
+    text = SEPARATOR.join(NULL if value is None else str(value) for value in values)
+    return int(hashlib.md5(text.encode()).hexdigest()[:12], 16)
+
+
+def pg_chunk_hashes(pg_params: dict, table: str, columns: tuple) -> dict:
+    """{chunk: (count, hash sum)} computed in PostgreSQL; pg_params go to psycopg2.connect."""
+    row_text = ", ".join(f"coalesce({column}::text, %(null)s)" for column in columns)
+    query = (
+        f"SELECT id / %(chunk)s, count(*), "
+        f"sum(('x' || substr(md5(concat_ws(%(sep)s, {row_text})), 1, 12))::bit(48)::bigint) "
+        f"FROM {table} GROUP BY 1"
+    )
+    conn = psycopg2.connect(**pg_params)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, {"chunk": CHUNK_SIZE, "sep": SEPARATOR, "null": NULL})
+            return {chunk: (count, int(total)) for chunk, count, total in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def compare(table: str, source: dict, target: dict, source_name: tuple, target_name: tuple,
+            id_name: str = "ids") -> bool:
+    """
+    Prints the row totals and every mismatching range of one table. The names
+    are (store, unit) pairs such as ("postgres", "rows").
+    """
+    source_rows = sum(count for count, _ in source.values())
+    target_rows = sum(count for count, _ in target.values())
+    mismatches = sorted(chunk for chunk in source.keys() | target.keys() if source.get(chunk) != target.get(chunk))
+    status = "OK" if not mismatches else f"{len(mismatches)} mismatching range(s)"
+    print(f"{table:<12} {' '.join(source_name)}: {source_rows:>10}  "
+          f"{' '.join(target_name)}: {target_rows:>10}  {status}")
+    for chunk in mismatches:
+        source_count = source.get(chunk, (0, 0))[0]
+        target_count = target.get(chunk, (0, 0))[0]
+        print(f"    {id_name} {chunk * CHUNK_SIZE}-{(chunk + 1) * CHUNK_SIZE - 1}: "
+              f"{source_name[0]} {source_count} {source_name[1]}, {target_name[0]} {target_count} {target_name[1]}")
+    return not mismatches